@@ -0,0 +1,87 @@
+# apply a brush script to many .ub files without a window, run with `python batch.py script.json layouts/ -o out/`
+
+import os
+import sys
+import json
+import random
+import argparse
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+from src import ubfile
+from src.grid import Grid
+from src.brush import replay
+
+BASE_X, BASE_Y, LOT_SIZE = 3, 3, 40
+PREVIEW_PIXELS = 1 << 20 # 2d previews are scaled down to thumbnails of at most this many pixels
+
+def process(job: tuple) -> tuple:
+    # load, replay and save one layout, failures are reported instead of stopping the batch
+    source, target, script, seed, preview, previewPixels = job
+    start = perf_counter()
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        infoDict = ubfile.read(source)
+        rows, cols = infoDict['lots'].shape
+        grid = Grid(rows, cols, BASE_X, BASE_Y, LOT_SIZE)
+        grid.load(infoDict)
+        # seed per file so a result does not depend on which worker ran it
+        random.seed(f'{seed}:{os.path.basename(source)}')
+        change = replay(grid, script)
+        ubfile.write(target, grid.dump())
+        if preview:
+            from src.raster import render2d, render3d
+            raster = render3d(grid) if preview == '3d' else render2d(grid, maxPixels=previewPixels)
+            raster.save(os.path.splitext(target)[0] + '.png')
+        return (source, f'{len(change.lots)} lots, {len(change.edges)} edges', perf_counter() - start, None)
+    except Exception as error:
+        return (source, '', perf_counter() - start, f'{type(error).__name__}: {error}')
+
+def collect(paths: list) -> list:
+    # files as given, directories contribute their .ub files
+    sources = list()
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.ub')))
+        else:
+            sources.append(path)
+    return sources
+
+def targets(sources: list, output: str) -> list:
+    # outputs keep their path below the deepest folder holding every source, so equal names from different folders stay apart
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(source)) for source in sources]) if sources else ''
+    return [os.path.join(output, os.path.relpath(os.path.abspath(source), root)) for source in sources]
+
+def main(argv: list=None) -> int:
+    parser = argparse.ArgumentParser(description='apply a brush script to .ub layouts in parallel')
+    parser.add_argument('script', help='json list of brush steps, see src/brush.py')
+    parser.add_argument('inputs', nargs='+', help='.ub files or directories holding them')
+    parser.add_argument('-o', '--output', required=True, help='directory for the edited layouts')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes (default: cpu count)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random road styles of the connect brush')
+    parser.add_argument('--preview', choices=('2d', '3d'), help='also save a png preview next to every layout')
+    parser.add_argument('--preview-pixels', type=int, default=PREVIEW_PIXELS, help=f'most pixels of a 2d preview (default: {PREVIEW_PIXELS})')
+    args = parser.parse_args(argv)
+
+    with open(args.script) as f:
+        script = json.load(f)
+    sources = collect(args.inputs)
+    outputs = targets(sources, args.output)
+    repeated = sorted({target for target in outputs if outputs.count(target) > 1})
+    if repeated: parser.error(f'more than one input would be written to {", ".join(repeated)}')
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(source, target, script, args.seed, args.preview, args.preview_pixels) for source, target in zip(sources, outputs)]
+
+    start, failed = perf_counter(), 0
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        for source, summary, elapsed, error in executor.map(process, jobs, chunksize=max(len(jobs) // (4 * max(args.jobs, 1)), 1)):
+            if error:
+                failed += 1
+                print(f'{source}: failed, {error}', file=sys.stderr)
+            else:
+                print(f'{source}: {summary} in {elapsed:.3f}s')
+    print(f'{len(jobs) - failed}/{len(jobs)} layouts done in {perf_counter() - start:.1f}s')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
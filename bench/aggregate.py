@@ -0,0 +1,81 @@
+# check and benchmark of the population aggregates against summing the lots a query returns, run with `python -m bench.aggregate`
+
+import random
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.brush import applyStep
+from src.aggregate import PopulationIndex
+
+LOT_SIZE = 40
+CHECK_SIZES, CHECK_QUERIES = (7, 20, 33), 300
+BENCH_SIZES, BENCH_RADII, BENCH_QUERIES = (100, 500, 2000), (3, 10, 40, 200), 20
+
+def randomQuery(rng: random.Random, size: int) -> tuple:
+    # lot centers, points between them and anywhere, with radii on whole lots to hit ties
+    if rng.random() < 0.5:
+        base = (3 + LOT_SIZE * rng.randrange(-2, size + 2) + LOT_SIZE // 2 * rng.randrange(1, 3), 3 + LOT_SIZE * rng.randrange(-2, size + 2) + LOT_SIZE // 2)
+    else:
+        base = (rng.uniform(-50, size * LOT_SIZE + 50), rng.uniform(-50, size * LOT_SIZE + 50))
+    minDis = LOT_SIZE * rng.choice((0, 0.5, 1, 2, 3, rng.uniform(0, 4)))
+    return (base, minDis, minDis + LOT_SIZE * rng.choice((1, 2, 3, rng.uniform(0, 5))))
+
+def scanSum(grid: Grid, base: tuple, minDis: float, maxDis: float) -> tuple:
+    rows, cols = grid.getLotIdsByDistance(base, minDis, maxDis)
+    return (int(grid.population[rows, cols].astype(np.int64).sum()), len(rows))
+
+def check() -> None:
+    for size in CHECK_SIZES:
+        random.seed(size)
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        grid.randomize(seed=size)
+        index, rng = PopulationIndex(grid), random.Random(size)
+        for query in range(CHECK_QUERIES):
+            if query % 10 == 0:
+                pos = lambda: [rng.uniform(0, size), rng.uniform(0, size)]
+                applyStep(grid, {'brush': rng.choice(('repulse', 'attract', 'drag')), 'at': pos(), 'from': pos(), 'inner': 2, 'outer': 5, 'amount': 60})
+            base, minDis, maxDis = randomQuery(rng, size)
+            assert index.regionSum(base, minDis, maxDis) == scanSum(grid, base, minDis, maxDis), f'query {query} differs'
+            # the targets of a drag from another spot leave out the lots of its source
+            source, radius = randomQuery(rng, size)[::2]
+            sourceIds, targetIds = grid.getLotIdsByDistance(source, 0, radius), grid.getLotIdsByDistance(base, 0, maxDis)
+            outside = ~np.isin(targetIds[0] * size + targetIds[1], sourceIds[0] * size + sourceIds[1])
+            targets = (int(grid.population[targetIds[0][outside], targetIds[1][outside]].astype(np.int64).sum()), int(outside.sum()))
+            region, shared = index.regionSum(base, 0, maxDis), index.overlapSum(source, radius, base, maxDis)
+            assert (region[0] - shared[0], region[1] - shared[1]) == targets, f'drag query {query} differs'
+        population = grid.population.astype(np.int64)
+        for _ in range(100):
+            row0, row1 = sorted(rng.sample(range(-2, size + 3), 2))
+            col0, col1 = sorted(rng.sample(range(-2, size + 3), 2))
+            assert index.rectSum(row0, row1, col0, col1) == population[max(row0, 0):max(row1, 0), max(col0, 0):max(col1, 0)].sum()
+        assert index.districtSums().sum() == population.sum()
+    print('aggregates match the scanned lots')
+
+def perQuery(func, queries: list) -> float:
+    start = perf_counter()
+    for query in queries: func(*query)
+    return (perf_counter() - start) / len(queries) * 1000
+
+def run() -> None:
+    check()
+    print(f'{"grid":>11} {"radius":>7} {"scan ms":>9} {"index ms":>9} {"update ms":>10}')
+    for size in BENCH_SIZES:
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        grid.population[:] = np.random.default_rng(size).integers(0, 256, grid.shape)
+        index, rng = PopulationIndex(grid), random.Random(size)
+        grid.listeners.remove(index.gridChanged)
+        for radius in BENCH_RADII:
+            queries = [((rng.uniform(0, size * LOT_SIZE), rng.uniform(0, size * LOT_SIZE)), radius * LOT_SIZE / 2, radius * LOT_SIZE) for _ in range(BENCH_QUERIES)]
+            scanMs, indexMs = perQuery(lambda *query: scanSum(grid, *query), queries), perQuery(index.regionSum, queries)
+            # the index's share of a repulse step
+            updateMs = 0
+            for base, _, _ in queries[:5]:
+                change = grid.repulseLots(base, radius * LOT_SIZE / 2, radius * LOT_SIZE, 50)
+                start = perf_counter()
+                index.gridChanged(change)
+                updateMs += (perf_counter() - start) / 5 * 1000
+            print(f'{size:>5}x{size:<5} {radius:>7} {scanMs:>9.3f} {indexMs:>9.3f} {updateMs:>10.3f}')
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,50 @@
+# check and benchmark of the procedural generators and their vectorized consistency pass, run with `python -m bench.generate`
+
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.generate import GENERATORS, blockRoads, generate, pruneDeadEnds
+
+LOT_SIZE = 40
+CHECK_SIZES, CHECK_SEEDS = (1, 2, 5, 17, 40, (9, 31)), 20
+BENCH_SIZES = (1000, 2000, 3000, 5000)
+
+def check() -> None:
+    for size in CHECK_SIZES:
+        rows, cols = size if isinstance(size, tuple) else (size, size)
+        for generator, func in GENERATORS.items():
+            for seed in range(CHECK_SEEDS):
+                # the front by front pass blocks the same roads as the worklist of keepRoadsConsistent
+                population, hor, ver = func(np.random.default_rng(seed), rows, cols)
+                assert population.shape == (rows, cols) and population.dtype == np.uint8, f'{generator} population is {population.shape} {population.dtype}'
+                grid = Grid(rows, cols, 3, 3, LOT_SIZE)
+                grid.roads[:] = roads = blockRoads(rows, cols, hor, ver)
+                grid.keepRoadsConsistent()
+                pruneDeadEnds(roads)
+                assert (grid.roads == roads).all(), f'{generator} pass differs on {rows}x{cols}, seed {seed}'
+                assert not grid.keepRoadsConsistent(), f'{generator} layout left inconsistent on {rows}x{cols}, seed {seed}'
+                # a seed always gives the same layout
+                first, second = generate(rows, cols, generator, seed), generate(rows, cols, generator, seed)
+                assert all((first[key] == second[key]).all() for key in first), f'{generator} differs between runs of seed {seed}'
+    print(f'generators match the worklist pass on {len(CHECK_SIZES) * len(GENERATORS) * CHECK_SEEDS} random layouts')
+
+def run() -> None:
+    check()
+    print(f'{"grid":>11} {"generator":<9} {"generate ms":>12} {"randomize ms":>13} {"mean pop":>9} {"roads":>6}')
+    for size in BENCH_SIZES:
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        for generator in GENERATORS:
+            start = perf_counter()
+            layout = generate(size, size, generator, size)
+            generateMs = (perf_counter() - start) * 1000
+            start = perf_counter()
+            grid.randomize(generator, size)
+            randomizeMs = (perf_counter() - start) * 1000
+            # share of inner lot sides left as roads
+            roads = grid.roadStates(*(ids.ravel() for ids in np.indices(grid.shape)))
+            share = roads[:, 1:3].mean()
+            print(f'{size:>5}x{size:<5} {generator:<9} {generateMs:>12.1f} {randomizeMs:>13.1f} {layout["lots"].mean():>9.1f} {share:>6.2f}')
+
+if __name__ == '__main__':
+    run()
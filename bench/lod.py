@@ -0,0 +1,102 @@
+# check and benchmark of the level of detail pyramid, run with `python -m bench.lod`
+
+import random
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.brush import BRUSHES, applyStep
+from src.lod import LodPyramid
+from src.scene import Camera, cullSurfaces, eyePosition
+
+LOT_SIZE = 20
+CHECK_SHAPES, CHECK_SEEDS, CHECK_STEPS = ((1, 1), (1, 6), (5, 3), (9, 17), (33, 20), (64, 64)), 4, 40
+ORDER_SHAPES, ORDER_PARTITIONS = ((6, 6), (13, 21), (40, 37)), 30
+BENCH_SIZES = (300, 1000, 2000)
+
+def same(pyramid: LodPyramid, other: LodPyramid) -> bool:
+    return pyramid.shapes == other.shapes and all(
+        (a == b).all() for arrays, others in ((pyramid.sums, other.sums), (pyramid.hor, other.hor), (pyramid.ver, other.ver)) for a, b in zip(arrays, others)
+    )
+
+def checkUpdates() -> None:
+    # the level by level update after every brush matches a pyramid built from scratch, shapes far from powers of two included
+    for rows, cols in CHECK_SHAPES:
+        for seed in range(CHECK_SEEDS):
+            grid = Grid(rows, cols, 3, 3, LOT_SIZE)
+            grid.randomize(seed=seed)
+            pyramid, rng = LodPyramid(grid), random.Random(seed)
+            for index in range(CHECK_STEPS):
+                pos = lambda: [rng.uniform(-1, cols + 1), rng.uniform(-1, rows + 1)]
+                step = {'brush': rng.choice(BRUSHES), 'at': pos(), 'from': pos(), 'inner': rng.randrange(1, 4), 'outer': rng.randrange(4, 7), 'amount': rng.randrange(101)}
+                if rng.random() < 0.3: step['marks'] = [pos()]
+                applyStep(grid, step)
+                if rng.random() < 0.05: grid.randomize(seed=rng.randrange(1 << 30))
+                assert same(pyramid, LodPyramid(grid, listen=False)), f'step {index} differs from a rebuild on {rows}x{cols}, seed {seed}'
+    print(f'incremental pyramid matches a rebuild on {len(CHECK_SHAPES) * CHECK_SEEDS} random scripts')
+
+def randomPartition(pyramid: LodPyramid, rng: random.Random) -> list:
+    # blocks that split no block of one another, as select picks them, split at random from the top
+    k, picked = LodPyramid.BLOCK, list()
+    rows, cols = np.zeros(1, dtype=int), np.zeros(1, dtype=int)
+    for level in range(len(pyramid.shapes) - 1, 0, -1):
+        split = np.array([rng.random() < 0.7 for _ in rows], dtype=bool)
+        picked.append((level, rows[~split], cols[~split]))
+        lowRows, lowCols = pyramid.shapes[level - 1]
+        rows, cols = (ids.reshape(-1) for ids in np.broadcast_arrays(
+            (rows[split, None] * k + np.arange(k))[:, :, None], (cols[split, None] * k + np.arange(k))[:, None, :]
+        ))
+        inside = (rows < lowRows) & (cols < lowCols)
+        rows, cols = rows[inside], cols[inside]
+    picked.append((0, rows, cols))
+    return picked
+
+def mayCover(near: tuple, far: tuple, eye: np.ndarray) -> np.ndarray:
+    # whether each block of near may hide part of each block of far: near is on the eye side of every line apart from far
+    nx0, ny0, nx1, ny1 = (value[:, None] for value in near)
+    fx0, fy0, fx1, fy1 = (value[None, :] for value in far)
+    blocked = ((nx1 <= fx0) & (eye[0] > nx1)) | ((fx1 <= nx0) & (eye[0] < nx0))
+    blocked |= ((ny1 <= fy0) & (eye[1] > ny1)) | ((fy1 <= ny0) & (eye[1] < ny0))
+    apart = (nx1 <= fx0) | (fx1 <= nx0) | (ny1 <= fy0) | (fy1 <= ny0)
+    return apart & ~blocked
+
+def checkOrder() -> None:
+    # no block is drawn before a block it may hide, from eyes anywhere around the grid, across blocks of different levels
+    rng = random.Random(0)
+    for rows, cols in ORDER_SHAPES:
+        grid = Grid(rows, cols, 3, 3, LOT_SIZE)
+        pyramid = LodPyramid(grid, listen=False)
+        for index in range(ORDER_PARTITIONS):
+            camera = Camera(viewAngle=rng.uniform(0, 2 * np.pi), near=rng.uniform(200, 4000))
+            picked, eye = randomPartition(pyramid, rng), eyePosition(camera)
+            footprints = [np.concatenate(values) for values in zip(*(pyramid.footprints(level, rows, cols) for level, rows, cols in picked))]
+            ranks = np.concatenate([pyramid.ranks(level, rows, cols, camera) for level, rows, cols in picked])
+            covers = mayCover(footprints, footprints, eye)
+            early = ranks[:, None] <= ranks[None, :]
+            np.fill_diagonal(early, False)
+            assert not (covers & early).any(), f'a block is drawn before a block it may hide on {rows}x{cols}, partition {index}'
+    print(f'blocks are drawn back to front on {len(ORDER_SHAPES) * ORDER_PARTITIONS} random partitions')
+
+def bench() -> None:
+    print(f'{"grid":>11} {"rebuild ms":>11} {"select ms":>10} {"surfaces ms":>12} {"blocks":>7} {"lots":>6} {"drawn":>7}')
+    camera = Camera()
+    for size in BENCH_SIZES:
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        grid.randomize(seed=size)
+        start = perf_counter()
+        pyramid = LodPyramid(grid, listen=False)
+        rebuildMs = (perf_counter() - start) * 1000
+        start = perf_counter()
+        picked = pyramid.select(camera)
+        selectMs = (perf_counter() - start) * 1000
+        start = perf_counter()
+        surfaces, populations, owners, kinds, ranks = pyramid.surfaces(picked, True, True, camera)
+        kept = cullSurfaces(surfaces, kinds, camera)[0]
+        surfacesMs = (perf_counter() - start) * 1000
+        blocks, lots = sum(len(rows) for level, rows, _ in picked if level), sum(len(rows) for level, rows, _ in picked if not level)
+        print(f'{size:>5}x{size:<5} {rebuildMs:>11.1f} {selectMs:>10.1f} {surfacesMs:>12.1f} {blocks:>7} {lots:>6} {int(kept.sum()):>7}')
+
+if __name__ == '__main__':
+    checkUpdates()
+    checkOrder()
+    bench()
@@ -0,0 +1,54 @@
+# check and benchmark of the analytic depth order against sorting the depths, run with `python -m bench.order`
+
+import random
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.raster import Raster, greys, BLACK
+from src.scene import Camera, DepthOrder, MeshCache, projectSurfaces
+
+SIZES = (20, 100, 300)
+ANGLES = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+REPEATS = 5
+LOT_SIZE = 40
+
+def paint(points: np.ndarray, populations: np.ndarray, order: np.ndarray, camera: Camera) -> np.ndarray:
+    raster = Raster(camera.width, camera.height)
+    raster.fillPolygons(points[order], greys(populations[order]), np.broadcast_to(BLACK, (len(order), 3)))
+    return raster.pixels
+
+def timed(func) -> float:
+    start = perf_counter()
+    for _ in range(REPEATS): func()
+    return (perf_counter() - start) / REPEATS * 1000
+
+def run() -> None:
+    print(f'{"grid":>9} {"surfaces":>9} {"sort ms":>9} {"cold ms":>9} {"cached ms":>10} {"pixels off":>11}')
+    for size in SIZES:
+        random.seed(size)
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        grid.randomize(seed=size)
+        surfaces, populations, owners, kinds = MeshCache().build(grid, True, True)
+        sortMs = coldMs = cachedMs = 0
+        differing = 0
+        for angle in ANGLES:
+            camera = Camera(viewAngle=angle)
+            points, depths = projectSurfaces(surfaces, camera)
+            depthOrder = DepthOrder()
+            sort = lambda: np.argsort(depths, kind='stable')
+            analytic = lambda: depthOrder.order(grid, owners, kinds, populations, depths, camera)
+            coldMs += timed(lambda: (depthOrder.cache.clear(), analytic()))
+            cachedMs += timed(analytic)
+            sortMs += timed(sort)
+            order = analytic()
+            assert depthOrder.sorted == 0, 'the eye should be above every roof'
+            assert np.array_equal(np.sort(order), np.arange(len(surfaces))), 'every surface is drawn exactly once'
+            # both orders are approximations of the true visibility, so only the size of the disagreement is reported
+            if size == SIZES[0]: differing += int(np.any(paint(points, populations, sort(), camera) != paint(points, populations, order, camera), axis=-1).sum())
+        count = len(ANGLES)
+        pixels = f'{differing / count:>11.0f}' if size == SIZES[0] else f'{"-":>11}'
+        print(f'{size:>4}x{size:<4} {len(surfaces):>9} {sortMs / count:>9.2f} {coldMs / count:>9.2f} {cachedMs / count:>10.2f} {pixels}')
+
+if __name__ == '__main__':
+    run()
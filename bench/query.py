@@ -0,0 +1,64 @@
+# benchmark of the grid distance queries, run with `python -m bench.query`
+
+from collections import deque
+from itertools import chain
+from random import Random
+from time import perf_counter
+
+from src.util import distance
+from src.grid import Grid
+
+SIZES = (20, 50, 100, 200, 400)
+QUERIES = 50
+LOT_SIZE = 40
+
+# the full scans the spatial index replaces, kept as the reference results
+def scanLots(grid: Grid, base: tuple, minDis: float, maxDis: float) -> deque:
+    lotList = [(lot, d) for lot in chain(*grid.lots) if minDis < (d := distance(base, lot.center)) < maxDis]
+    lotList.sort(key=lambda x: x[1])
+    return deque([x[0] for x in lotList])
+
+def scanNearestLot(grid: Grid, base: tuple):
+    return min([(lot, distance(base, lot.center)) for lot in chain(*grid.lots)], key=lambda x: x[1])[0]
+
+def scanSecs(grid: Grid, base: tuple, dis: float) -> list:
+    return [sec for sec in chain(*grid.secs) if distance(base, sec.pos) < dis]
+
+def buildQueries(grid: Grid, seed: int) -> list:
+    rng = Random(seed)
+    rows, cols = grid.shape
+    return [(
+        (rng.randrange(cols * LOT_SIZE + 6), rng.randrange(rows * LOT_SIZE + 6)),
+        rng.randrange(1, 8) * LOT_SIZE,
+        rng.randrange(8, 16) * LOT_SIZE
+    ) for _ in range(QUERIES)]
+
+def ids(items) -> list:
+    return [item.info.id for item in items]
+
+def check(grid: Grid, queries: list) -> None:
+    for base, innerRadius, outerRadius in queries:
+        assert ids(grid.getLotsByDistance(base, 0, innerRadius)) == ids(scanLots(grid, base, 0, innerRadius))
+        assert ids(grid.getLotsByDistance(base, innerRadius, outerRadius)) == ids(scanLots(grid, base, innerRadius, outerRadius))
+        assert ids(grid.getSecsByDistance(base, innerRadius)) == ids(scanSecs(grid, base, innerRadius))
+        assert grid.getNearestLot(base).info.id == scanNearestLot(grid, base).info.id
+
+def perQuery(func, queries: list) -> float:
+    start = perf_counter()
+    for query in queries: func(*query)
+    return (perf_counter() - start) / len(queries) * 1000
+
+def run() -> None:
+    print(f'{"grid":>9} {"scan ms":>10} {"index ms":>10} {"speedup":>8}')
+    for size in SIZES:
+        grid = Grid(size, size, 3, 3, LOT_SIZE)
+        grid.randomize()
+        queries = buildQueries(grid, size)
+        if size <= 100: check(grid, queries)
+        scanQuery = lambda base, inner, outer: (scanLots(grid, base, inner, outer), scanNearestLot(grid, base))
+        indexQuery = lambda base, inner, outer: (grid.getLotsByDistance(base, inner, outer), grid.getNearestLot(base))
+        scanMs, indexMs = perQuery(scanQuery, queries[:5]), perQuery(indexQuery, queries)
+        print(f'{size:>4}x{size:<4} {scanMs:>10.3f} {indexMs:>10.3f} {scanMs / indexMs:>7.1f}x')
+
+if __name__ == '__main__':
+    run()
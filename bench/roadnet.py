@@ -0,0 +1,98 @@
+# check and benchmark of the incremental road network, run with `python -m bench.roadnet`
+
+import random
+from collections import deque
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.brush import applyStep
+from src.roadnet import RoadNetwork
+
+LOT_SIZE = 40
+CHECK_SIZES, CHECK_SEEDS, CHECK_STEPS = (5, 12, 25), 4, 60
+BENCH_SIZE, BENCH_STEPS, BENCH_ROUTES = 2000, 40, (50, 500, 1500)
+
+def randomStep(rng: random.Random, size: int) -> dict:
+    # mostly road brushes, whose changes the network has to follow
+    pos = lambda: [rng.uniform(-0.5, size + 0.5), rng.uniform(-0.5, size + 0.5)]
+    step = {'brush': rng.choice(('break', 'connect', 'break', 'repulse')), 'at': pos(), 'from': pos(), 'inner': rng.randrange(1, 4), 'outer': rng.randrange(4, 8), 'amount': 50}
+    if rng.random() < 0.3: step['marks'] = [pos()]
+    return step
+
+def samePartition(labelsA: np.ndarray, labelsB: np.ndarray) -> bool:
+    pairs = np.unique(np.stack((labelsA.ravel(), labelsB.ravel()), axis=1), axis=0)
+    return len(pairs) == len(np.unique(labelsA)) == len(np.unique(labelsB))
+
+def scanDistance(network: RoadNetwork, start: tuple, goal: tuple) -> int:
+    distances, queue = {start: 0}, deque([start])
+    while queue:
+        node = queue.popleft()
+        for nextNode in network.neighbours(*node):
+            if nextNode not in distances:
+                distances[nextNode] = distances[node] + 1
+                queue.append(nextNode)
+    return distances.get(goal)
+
+def check() -> None:
+    for size in CHECK_SIZES:
+        for seed in range(CHECK_SEEDS):
+            random.seed(seed)
+            grid = Grid(size, size, 3, 3, LOT_SIZE)
+            grid.randomize(seed=seed)
+            network, rng = RoadNetwork(grid), random.Random(seed)
+            for index in range(CHECK_STEPS):
+                applyStep(grid, randomStep(rng, size))
+                if rng.random() < 0.05: grid.randomize(seed=rng.randrange(1 << 30))
+                network.current()
+                fresh = RoadNetwork(grid).current()
+                assert samePartition(network.labels, fresh.labels), f'step {index} components differ'
+                assert (network.networks, network.cutOff) == (fresh.networks, fresh.cutOff), f'step {index} counts differ'
+                assert (network.served == fresh.served).all(), f'step {index} served lots differ'
+                source, target = ((rng.uniform(0, size * LOT_SIZE), rng.uniform(0, size * LOT_SIZE)) for _ in range(2))
+                start, goal = network.nearestSec(source), network.nearestSec(target)
+                expected = None if start is None or goal is None else scanDistance(network, start, goal)
+                assert network.roadDistance(source, target) == expected, f'step {index} road distance differs'
+    print('incremental network matches a full rebuild')
+
+def randomGrid(size: int, seed: int) -> Grid:
+    # blocks roads in bulk as randomize does one by one, then applies the consistency pass
+    grid = Grid(size, size, 3, 3, LOT_SIZE)
+    rng = np.random.default_rng(seed)
+    grid.population[:] = rng.integers(0, 256, grid.shape)
+    hor, ver = rng.random((size - 1, size)) < 0.3, rng.random((size, size - 1)) < 0.3
+    grid.roads[1:size, :-1, 0][hor] = grid.roads[1:size, 1:, 2][hor] = 0
+    grid.roads[:-1, 1:size, 3][ver] = grid.roads[1:, 1:size, 1][ver] = 0
+    grid.keepRoadsConsistent()
+    return grid
+
+def run() -> None:
+    check()
+    grid = randomGrid(BENCH_SIZE, 0)
+    start = perf_counter()
+    network = RoadNetwork(grid).current()
+    print(f'{BENCH_SIZE}x{BENCH_SIZE} full labelling {perf_counter() - start:.2f}s, {network}')
+    # time the network's share of each brush step apart from the brush itself
+    grid.listeners.remove(network.gridChanged)
+    rng = random.Random(0)
+    for brush in ('break', 'connect'):
+        times = list()
+        for _ in range(BENCH_STEPS):
+            change = applyStep(grid, {'brush': brush, 'at': [rng.uniform(0, BENCH_SIZE), rng.uniform(0, BENCH_SIZE)], 'inner': 3, 'outer': 6})
+            start = perf_counter()
+            network.gridChanged(change)
+            times.append(perf_counter() - start)
+        print(f'{brush:>8} update  mean {np.mean(times) * 1000:.2f}ms  max {np.max(times) * 1000:.2f}ms')
+    for length in BENCH_ROUTES:
+        source = (3 + 100 * LOT_SIZE, 3 + 100 * LOT_SIZE)
+        target = (3 + (100 + length) * LOT_SIZE, 3 + (100 + length // 2) * LOT_SIZE)
+        network.field = None
+        start = perf_counter()
+        distance = network.roadDistance(source, target)
+        first = perf_counter() - start
+        start = perf_counter()
+        network.roadDistance(source, (target[0] - LOT_SIZE, target[1]))
+        print(f'route over {length:>5} lots: {distance} roads, first {first * 1000:.1f}ms, moved target {(perf_counter() - start) * 1000:.2f}ms')
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,125 @@
+# check and benchmark of the road consistency solver, run with `python -m bench.roads`
+
+import sys
+import random
+from time import perf_counter
+import numpy as np
+
+from src.sec import Sec
+from src.grid import Grid
+
+LOT_SIZE = 40
+CHECK_SIZES, CHECK_SEEDS, CHECK_STEPS = (4, 8, 16, 24), 25, 30
+BENCH_SIZES = (50, 100, 200)
+
+# the recursive full-grid solver the worklist replaces, kept as the reference results
+def referenceKeepSecsConsistent(grid: Grid) -> None:
+    rows, cols = grid.shape
+    for row, col in ((i, j) for i in range(1, rows) for j in range(1, cols)):
+        sec = grid.sec(row, col)
+        if sec.e: Sec.set2(sec, grid.sec(row, col + 1), Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
+        if sec.n: Sec.set2(grid.sec(row - 1, col), sec, Sec.ACTIVE, connection=Sec.VER_CONNECTED)
+        if sec.w: Sec.set2(grid.sec(row, col - 1), sec, Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
+        if sec.s: Sec.set2(sec, grid.sec(row + 1, col), Sec.ACTIVE, connection=Sec.VER_CONNECTED)
+
+def referenceKeepRoadsConsistent(grid: Grid) -> None:
+    valid = True
+    rows, cols = grid.shape
+    for row in range(rows):
+        Sec.set2(grid.sec(row, 0), grid.sec(row + 1, 0), Sec.ACTIVE, connection=Sec.VER_CONNECTED)
+        Sec.set2(grid.sec(row, cols), grid.sec(row + 1, cols), Sec.ACTIVE, connection=Sec.VER_CONNECTED)
+    for col in range(cols):
+        Sec.set2(grid.sec(0, col), grid.sec(0, col + 1), Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
+        Sec.set2(grid.sec(rows, col), grid.sec(rows, col + 1), Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
+    for row, col in ((i, j) for i in range(1, rows) for j in range(1, cols)):
+        sec = grid.sec(row, col)
+        if int(sec) != 1: continue
+        if sec.e: Sec.set2(sec, grid.sec(row, col + 1), Sec.BLOCKED, connection=Sec.HOR_CONNECTED)
+        if sec.n: Sec.set2(grid.sec(row - 1, col), sec, Sec.BLOCKED, connection=Sec.VER_CONNECTED)
+        if sec.w: Sec.set2(grid.sec(row, col - 1), sec, Sec.BLOCKED, connection=Sec.HOR_CONNECTED)
+        if sec.s: Sec.set2(sec, grid.sec(row + 1, col), Sec.BLOCKED, connection=Sec.VER_CONNECTED)
+        valid = False
+    if not valid: referenceKeepRoadsConsistent(grid)
+
+def referenceBreakRoads(grid: Grid, base: tuple, radius: int, roadList: list) -> None:
+    roadList = roadList or grid.getRoadsByDistance(base, radius)
+    for secA, secB in roadList:
+        Sec.set2(secA, secB, Sec.BLOCKED)
+    referenceKeepRoadsConsistent(grid)
+
+def referenceConnectRoads(grid: Grid, base: tuple, innerRadius: int, outerRadius: int, roadList: list) -> None:
+    if roadList:
+        for secA, secB in roadList:
+            Sec.set2(secA, secB, Sec.ACTIVE)
+    else:
+        styleList = [sec.get() for sec in grid.getSecsByDistance(base, outerRadius)]
+        for sec in grid.getSecsByDistance(base, innerRadius):
+            sec.set(*random.choice(styleList))
+        referenceKeepSecsConsistent(grid)
+    referenceKeepRoadsConsistent(grid)
+
+def randomLayout(size: int, seed: int) -> tuple:
+    # two grids with the same unchecked random road layout, both ends of a road agree as after any grid edit
+    rng = np.random.default_rng(seed)
+    grids = (Grid(size, size, 3, 3, LOT_SIZE), Grid(size, size, 3, 3, LOT_SIZE))
+    roads = np.where(rng.random((size + 1, size + 1, 4)) < 0.35, Sec.BLOCKED, Sec.ACTIVE).astype(np.uint8)
+    roads[:, 1:, Sec.W] = roads[:, :-1, Sec.E]
+    roads[1:, :, Sec.N] = roads[:-1, :, Sec.S]
+    for grid in grids: grid.roads[:] = roads
+    return grids
+
+def randomStep(rng: random.Random, size: int) -> tuple:
+    extent = size * LOT_SIZE + 6
+    base = (rng.randrange(extent), rng.randrange(extent))
+    # marks also land off the grid, where no road is near enough to mark
+    mark = (rng.randrange(-extent, 2 * extent), rng.randrange(-extent, 2 * extent)) if rng.random() < 0.3 else None
+    return (rng.randrange(2), base, mark, rng.randrange(1, 4) * LOT_SIZE, rng.randrange(4, 8) * LOT_SIZE, rng.randrange(1 << 30))
+
+def applyStep(grid: Grid, step: tuple, reference: bool) -> None:
+    op, base, mark, innerRadius, outerRadius, seed = step
+    roadList = grid.markRoads(mark) if mark else []
+    random.seed(seed)
+    if op == 0 and reference:
+        referenceBreakRoads(grid, base, innerRadius, roadList)
+    elif op == 0:
+        grid.breakRoads(base, innerRadius, roadList)
+    elif reference:
+        referenceConnectRoads(grid, base, innerRadius, outerRadius, roadList)
+    else:
+        grid.connectRoads(base, innerRadius, outerRadius, roadList)
+
+def check() -> None:
+    for size in CHECK_SIZES:
+        for seed in range(CHECK_SEEDS):
+            reference, grid = randomLayout(size, seed)
+            referenceKeepRoadsConsistent(reference)
+            grid.keepRoadsConsistent()
+            assert (reference.roads == grid.roads).all(), f'full pass differs on {size}x{size}, seed {seed}'
+            rng = random.Random(seed)
+            for index in range(CHECK_STEPS):
+                step = randomStep(rng, size)
+                applyStep(reference, step, True)
+                applyStep(grid, step, False)
+                assert (reference.roads == grid.roads).all(), f'step {index} differs on {size}x{size}, seed {seed}'
+    print(f'worklist solver matches the reference on {len(CHECK_SIZES) * CHECK_SEEDS} random layouts')
+
+def bench() -> None:
+    sys.setrecursionlimit(100000)
+    print(f'{"grid":>9} {"reference ms":>13} {"worklist ms":>12}')
+    for size in BENCH_SIZES:
+        reference, grid = randomLayout(size, size)
+        referenceKeepRoadsConsistent(reference)
+        grid.keepRoadsConsistent()
+        base, radius = (size * LOT_SIZE // 2, size * LOT_SIZE // 2), 3 * LOT_SIZE
+        start = perf_counter()
+        referenceBreakRoads(reference, base, radius, [])
+        referenceMs = (perf_counter() - start) * 1000
+        start = perf_counter()
+        grid.breakRoads(base, radius, [])
+        worklistMs = (perf_counter() - start) * 1000
+        assert (reference.roads == grid.roads).all()
+        print(f'{size:>4}x{size:<4} {referenceMs:>13.2f} {worklistMs:>12.2f}')
+
+if __name__ == '__main__':
+    check()
+    bench()
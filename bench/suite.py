@@ -0,0 +1,166 @@
+# scaling benchmark of the grid operations and the scene preparation, run with `python -m bench.suite`,
+# results go to a json file, and a file from another commit given with --compare is printed side by side
+
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.brush import BRUSHES, applyStep
+from src.lod import LodPyramid, blockOrder
+from src.scene import Camera, DepthOrder, MeshCache, buildRects, cullSurfaces
+
+LOT_SIZE = 40
+SIZES = (20, 100, 500, 1000, 2000)
+SCENE_LOTS = 500 * 500 # the scenes hold python lists or quads of every lot, over 3KB a lot at their peak
+MIN_TIME, MAX_RUNS = 0.2, 50 # seconds a job is repeated for at least, and at most this many times
+BRUSH_STEP = {'inner': 3, 'outer': 6, 'amount': 20}
+
+def measure(job, runs: int=MAX_RUNS) -> dict:
+    # wall time over repeated runs, then the peak of memory allocated during one more run traced apart
+    times = list()
+    while len(times) < runs and (not times or sum(times) < MIN_TIME):
+        start = perf_counter()
+        job()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    job()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'mean_ms': float(np.mean(times)) * 1000, 'min_ms': min(times) * 1000, 'runs': len(times), 'peak_kb': peak / 1024}
+
+def brushJob(grid: Grid, brush: str, rng: random.Random):
+    # one step of the brush at a fresh spot every run
+    rows, cols = grid.shape
+    pos = lambda: [rng.uniform(0, cols), rng.uniform(0, rows)]
+    return lambda: applyStep(grid, dict(BRUSH_STEP, brush=brush, at=pos(), **({'from': pos()} if brush == 'drag' else {})))
+
+def queryJobs(grid: Grid, rng: random.Random) -> dict:
+    rows, cols = grid.shape
+    pos = lambda: (3 + rng.uniform(0, cols * LOT_SIZE), 3 + rng.uniform(0, rows * LOT_SIZE))
+    inner, outer = BRUSH_STEP['inner'] * LOT_SIZE, BRUSH_STEP['outer'] * LOT_SIZE
+    return {
+        'getSecIdsByDistance': lambda: grid.getSecIdsByDistance(pos(), inner),
+        'getLotIdsByDistance': lambda: grid.getLotIdsByDistance(pos(), inner, outer),
+        'getNearestLot': lambda: grid.getNearestLot(pos())
+    }
+
+def scene2d(grid: Grid) -> None:
+    # what View2d.createItems computes before handing the rectangles to the canvas
+    rows, cols = (ids.ravel() for ids in np.indices(grid.shape))
+    bodyRects, roadRects = (rects.tolist() for rects in buildRects(grid, rows, cols))
+    grid.roadStates(rows, cols).tolist()
+
+def scene3d(grid: Grid, meshCache: MeshCache, depthOrder: DepthOrder, camera: Camera) -> None:
+    # what View3d.render and View3d.buildMeshes compute before drawing
+    surfaces, populations, owners, kinds = meshCache.build(grid, True, True)
+    kept, points, depths = cullSurfaces(surfaces, kinds, camera)
+    populations = populations[kept]
+    order = depthOrder.order(grid, owners[kept], kinds[kept], populations, depths, camera)
+    list(zip(points[order].reshape(-1, 8).tolist(), populations[order].tolist()))
+
+def scene3dLod(pyramid: LodPyramid, camera: Camera) -> None:
+    # what View3d prepares when distant lots are merged into blocks, run at every size as it grows with the canvas
+    picked = pyramid.select(camera)
+    if picked is None: picked = [(0, *(ids.ravel() for ids in np.indices(pyramid.shapes[0])))]
+    surfaces, populations, owners, kinds, ranks = pyramid.surfaces(picked, True, True, camera)
+    kept, points, depths = cullSurfaces(surfaces, kinds, camera)
+    order = blockOrder(owners[kept], kinds[kept], ranks)
+    list(zip(points[order].reshape(-1, 8).tolist(), populations[kept][order].tolist()))
+
+def sceneJobs(grid: Grid, rng: random.Random) -> dict:
+    # the 3d scene from nothing, and again after a brush step rebuilt a few lots
+    camera, step = Camera(), brushJob(grid, 'repulse', rng)
+    cold = lambda: scene3d(grid, MeshCache(), DepthOrder(), camera)
+    meshCache, depthOrder = MeshCache(), DepthOrder()
+    scene3d(grid, meshCache, depthOrder, camera)
+    return {
+        'scene2d': lambda: scene2d(grid),
+        'scene3d': cold,
+        'scene3d.afterBrush': lambda: (step(), scene3d(grid, meshCache, depthOrder, camera))
+    }
+
+def benchSize(size: int, seed: int, sceneLots: int) -> list:
+    results = list()
+    def record(op: str, stats: dict) -> None:
+        results.append(dict(size=size, op=op, **stats))
+        if 'skipped' in stats:
+            print(f'{size:>5}x{size:<5} {op:<22} skipped, {stats["skipped"]}')
+        else:
+            print(f'{size:>5}x{size:<5} {op:<22} {stats["mean_ms"]:>10.3f}ms {stats["min_ms"]:>10.3f}ms {stats["runs"]:>4} {stats["peak_kb"]:>11.0f}KB')
+    # the grid itself, the same layout every run, the global seed is for the road styles the connect brush picks
+    grid = Grid(size, size, 3, 3, LOT_SIZE)
+    random.seed(seed)
+    stats = measure(lambda: grid.randomize(seed=seed))
+    stats['arrays_kb'] = (grid.population.nbytes + grid.roads.nbytes) / 1024
+    record('randomize', stats)
+    rng = random.Random(seed)
+    for brush in BRUSHES:
+        record(brush, measure(brushJob(grid, brush, rng)))
+    for op, job in queryJobs(grid, rng).items():
+        record(op, measure(job))
+    record('keepRoadsConsistent', measure(grid.keepRoadsConsistent))
+    infoDict = grid.dump()
+    record('dump', measure(grid.dump))
+    record('load', measure(lambda: grid.load(infoDict)))
+    if size * size > sceneLots:
+        for op in ('scene2d', 'scene3d', 'scene3d.afterBrush'):
+            record(op, {'skipped': f'over {sceneLots} lots, see --scene-lots'})
+    else:
+        for op, job in sceneJobs(grid, rng).items():
+            record(op, measure(job, runs=MAX_RUNS if op != 'scene3d' else 3))
+    record('lod.rebuild', measure(lambda: LodPyramid(grid, listen=False), runs=3))
+    pyramid = LodPyramid(grid)
+    record('scene3d.lod', measure(lambda: scene3dLod(pyramid, Camera()), runs=10))
+    step = brushJob(grid, 'repulse', rng)
+    record('scene3d.lod.afterBrush', measure(lambda: (step(), scene3dLod(pyramid, Camera())), runs=10))
+    return results
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list, filename: str) -> None:
+    # mean times of the ops both runs measured, and how many times slower this one is
+    with open(filename) as f:
+        other = json.load(f)
+    before = {(row['size'], row['op']): row.get('mean_ms') for row in other['results']}
+    print(f'\ncompared with {other.get("commit")} ({filename})')
+    print(f'{"grid":>11} {"op":<22} {"before ms":>11} {"now ms":>11} {"ratio":>7}')
+    for row in results:
+        old, new = before.get((row['size'], row['op'])), row.get('mean_ms')
+        if old and new:
+            print(f'{row["size"]:>5}x{row["size"]:<5} {row["op"]:<22} {old:>11.3f} {new:>11.3f} {new / old:>7.2f}')
+
+def main(argv: list=None) -> int:
+    parser = argparse.ArgumentParser(description='time the grid operations and scene preparation at growing grid sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help=f'grid sizes in lots per side (default: {" ".join(map(str, SIZES))})')
+    parser.add_argument('--seed', type=int, default=0, help='seed for randomize and the brush positions')
+    parser.add_argument('--scene-lots', type=int, default=SCENE_LOTS, help=f'largest grid in lots whose scenes are prepared (default: {SCENE_LOTS})')
+    parser.add_argument('-o', '--output', default='bench-suite.json', help='json file for the results (default: bench-suite.json)')
+    parser.add_argument('--compare', help='results of an earlier run to print next to these')
+    args = parser.parse_args(argv)
+
+    print(f'{"grid":>11} {"op":<22} {"mean":>12} {"min":>12} {"runs":>4} {"peak":>13}')
+    results = list()
+    for size in args.sizes:
+        results.extend(benchSize(size, args.seed, args.scene_lots))
+    with open(args.output, 'w') as f:
+        json.dump({
+            'commit': commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.platform(), 'seed': args.seed, 'results': results
+        }, f, indent=1)
+    print(f'results written to {args.output}')
+    if args.compare: compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# check and benchmark of the batched population transfer, run with `python -m bench.transfer`
+
+import random
+from collections import deque
+from time import perf_counter
+import numpy as np
+
+from src.lot import Lot
+from src.grid import Grid
+from src.transfer import roundRobin, transfer
+
+LOT_SIZE = 40
+CHECK_SIZES, CHECK_SEEDS, CHECK_STEPS = (3, 10, 30), 20, 40
+CHECK_QUEUES = 3000
+BENCH_RADII = ((3, 6), (10, 20), (30, 60))
+
+# the deque pairing of the original brushes, kept as the reference results
+def referenceTransfer(population: np.ndarray, srcIds: tuple, tarIds: tuple, amount: int) -> None:
+    buffers = dict()
+    for lot in zip(*(ids.tolist() for ids in srcIds)):
+        buffers[lot] = int(population[lot]) * amount // 100
+        population[lot] -= buffers[lot]
+    srcLots, tarLots = deque(buffers), deque(zip(*(ids.tolist() for ids in tarIds)))
+    while len(srcLots) and len(tarLots):
+        srcLot, tarLot = srcLots.popleft(), tarLots.popleft()
+        delta = min(buffers[srcLot], Lot.POPULATION_MAX - int(population[tarLot]))
+        buffers[srcLot] -= delta
+        population[tarLot] += delta
+        if buffers[srcLot]: srcLots.append(srcLot)
+        if population[tarLot] != Lot.POPULATION_MAX: tarLots.append(tarLot)
+    for lot in srcLots: population[lot] += buffers[lot]
+
+def referenceRoundRobin(buffers: list, capacities: list) -> tuple:
+    srcIds, tarIds = deque(range(len(buffers))), deque(range(len(capacities)))
+    while len(srcIds) and len(tarIds):
+        src, tar = srcIds.popleft(), tarIds.popleft()
+        delta = min(buffers[src], capacities[tar])
+        buffers[src] -= delta
+        capacities[tar] -= delta
+        if buffers[src]: srcIds.append(src)
+        if capacities[tar]: tarIds.append(tar)
+    return (buffers, capacities)
+
+def randomAmounts(rng: random.Random) -> list:
+    # lopsided queues, empty and full lots and small amounts all make the rounds break early
+    size, high = rng.choice((0, 1, 2, 5, 40)) if rng.random() < 0.5 else rng.randrange(300), rng.choice((1, 3, 255))
+    return [0 if rng.random() < 0.2 else rng.randint(0, high) for _ in range(size)]
+
+def randomStep(rng: random.Random, size: int) -> tuple:
+    pos = lambda: (rng.uniform(-1, size + 1) * LOT_SIZE, rng.uniform(-1, size + 1) * LOT_SIZE)
+    inner = rng.randrange(1, 4) * LOT_SIZE
+    return (rng.choice(('repulse', 'attract', 'drag')), pos(), pos(), inner, inner + rng.randrange(1, 5) * LOT_SIZE, rng.randrange(101))
+
+def regions(grid: Grid, step: tuple) -> tuple:
+    # sources and targets as the brushes of Grid pick them
+    brush, at, start, inner, outer, amount = step
+    if brush == 'drag':
+        innerIds, outerIds = grid.getLotIdsByDistance(start, 0, inner), grid.getLotIdsByDistance(at, 0, outer)
+        outside = ~np.isin(outerIds[0] * grid.shape[1] + outerIds[1], innerIds[0] * grid.shape[1] + innerIds[1])
+        return (innerIds, (outerIds[0][outside], outerIds[1][outside]))
+    innerIds, outerIds = grid.getLotIdsByDistance(at, 0, inner), grid.getLotIdsByDistance(at, inner, outer)
+    return (innerIds, outerIds) if brush == 'repulse' else (outerIds, innerIds)
+
+def check() -> None:
+    rng = random.Random(0)
+    for _ in range(CHECK_QUEUES):
+        buffers, capacities = randomAmounts(rng), randomAmounts(rng)
+        left, room = np.array(buffers, dtype=np.int64), np.array(capacities, dtype=np.int64)
+        roundRobin(left, room)
+        expected = referenceRoundRobin(buffers, capacities)
+        assert left.tolist() == expected[0] and room.tolist() == expected[1], f'pairing differs for {buffers} into {capacities}'
+    for size in CHECK_SIZES:
+        for seed in range(CHECK_SEEDS):
+            grid = Grid(size, size, 3, 3, LOT_SIZE)
+            grid.randomize(seed=seed)
+            reference, rng = grid.population.copy(), random.Random(seed)
+            for index in range(CHECK_STEPS):
+                step = randomStep(rng, size)
+                brush, at, start, inner, outer, amount = step
+                srcIds, tarIds = regions(grid, step)
+                referenceTransfer(reference, srcIds, tarIds, amount)
+                if brush == 'repulse': grid.repulseLots(at, inner, outer, amount)
+                elif brush == 'attract': grid.attractLots(at, inner, outer, amount)
+                else: grid.dragLots(start, at, inner, outer, amount)
+                assert (grid.population == reference).all(), f'step {index} differs from the deque on {size}x{size}, seed {seed}'
+    print(f'transfer matches the deque on {CHECK_QUEUES} random queues and {len(CHECK_SIZES) * CHECK_SEEDS} random scripts')
+
+def bench() -> None:
+    print(f'{"radii":>9} {"lots":>6} {"batched ms":>11} {"deque ms":>9}')
+    size = 2 * BENCH_RADII[-1][1] + 10
+    grid = Grid(size, size, 3, 3, LOT_SIZE)
+    grid.randomize(seed=0)
+    at = (size * LOT_SIZE / 2, size * LOT_SIZE / 2)
+    for inner, outer in BENCH_RADII:
+        srcIds, tarIds = regions(grid, ('repulse', at, at, inner * LOT_SIZE, outer * LOT_SIZE, 50))
+        population = grid.population.copy()
+        start = perf_counter()
+        transfer(grid.population, srcIds, tarIds, 50)
+        batchedMs = (perf_counter() - start) * 1000
+        start = perf_counter()
+        referenceTransfer(population, srcIds, tarIds, 50)
+        dequeMs = (perf_counter() - start) * 1000
+        assert (grid.population == population).all(), f'radii {inner}, {outer} differ from the deque'
+        print(f'{inner:>4},{outer:<4} {len(srcIds[0]) + len(tarIds[0]):>6} {batchedMs:>11.2f} {dequeMs:>9.2f}')
+
+if __name__ == '__main__':
+    check()
+    bench()
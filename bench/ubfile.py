@@ -0,0 +1,68 @@
+# benchmark of the binary .ub format against the legacy pickle of nested lists, run with `python -m bench.ubfile`
+
+import os
+import pickle
+import tempfile
+from time import perf_counter
+import numpy as np
+
+from src import ubfile
+from src.grid import Grid
+
+LOT_SIZE = 40
+BENCH_SIZES = (20, 200, 1000, 2000)
+
+def randomGrid(size: int) -> Grid:
+    rng = np.random.default_rng(size)
+    grid = Grid(size, size, 3, 3, LOT_SIZE)
+    grid.population[:] = rng.integers(0, 256, grid.population.shape)
+    grid.roads[:] = rng.integers(0, 2, grid.roads.shape)
+    return grid
+
+# the format ubfile replaces, as App wrote and read it
+def legacyWrite(filename: str, grid: Grid) -> None:
+    infoDict = {'lots': grid.population.tolist(), 'secs': [[tuple(dir) for dir in info] for info in grid.roads.tolist()]}
+    with open(filename, 'wb') as f:
+        pickle.dump(infoDict, f)
+
+def legacyRead(filename: str, grid: Grid) -> None:
+    with open(filename, 'rb') as f:
+        grid.load(pickle.load(f))
+
+def timed(job) -> float:
+    start = perf_counter()
+    job()
+    return (perf_counter() - start) * 1000
+
+def check() -> None:
+    # legacy files may hold populations over the maximum, which load capped
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'over.ub')
+        grid = randomGrid(4)
+        with open(filename, 'wb') as f:
+            pickle.dump({'lots': [[300] + row[1:] for row in grid.population.tolist()], 'secs': grid.roads.tolist()}, f)
+        lots = ubfile.read(filename)['lots']
+        assert (lots[:, 0] == 255).all() and (lots[:, 1:] == grid.population[:, 1:]).all(), 'legacy populations over the maximum are not capped'
+    print('legacy files over the population maximum load capped')
+
+def bench() -> None:
+    check()
+    print(f'{"grid":>9} {"pickle KB":>10} {"binary KB":>10} {"pickle save ms":>15} {"binary save ms":>15} {"pickle load ms":>15} {"binary load ms":>15} {"mmap load ms":>13}')
+    with tempfile.TemporaryDirectory() as folder:
+        legacyName, binaryName = os.path.join(folder, 'legacy.ub'), os.path.join(folder, 'binary.ub')
+        for size in BENCH_SIZES:
+            grid = randomGrid(size)
+            loaded = Grid(size, size, 3, 3, LOT_SIZE)
+            pickleSave = timed(lambda: legacyWrite(legacyName, grid))
+            binarySave = timed(lambda: ubfile.write(binaryName, grid.dump()))
+            pickleLoad = timed(lambda: legacyRead(legacyName, loaded))
+            binaryLoad = timed(lambda: loaded.load(ubfile.read(binaryName)))
+            mmapLoad = timed(lambda: loaded.load(ubfile.read(binaryName, mmap=True)))
+            assert (loaded.population == grid.population).all() and (loaded.roads == grid.roads).all()
+            # old files still load through the restricted unpickler
+            assert (ubfile.read(legacyName)['secs'] == grid.roads).all()
+            legacyKb, binaryKb = os.path.getsize(legacyName) / 1024, os.path.getsize(binaryName) / 1024
+            print(f'{size:>4}x{size:<4} {legacyKb:>10.1f} {binaryKb:>10.1f} {pickleSave:>15.2f} {binarySave:>15.2f} {pickleLoad:>15.2f} {binaryLoad:>15.2f} {mmapLoad:>13.2f}')
+
+if __name__ == '__main__':
+    bench()
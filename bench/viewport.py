@@ -0,0 +1,196 @@
+# check of the 2d viewport and the items View2d keeps for its window, and timings of the app at a large grid size,
+# run with `python -m bench.viewport`
+
+import random
+from time import perf_counter
+import numpy as np
+
+from src.grid import Grid
+from src.brush import BRUSHES, applyStep
+from src.scene import COLORS, buildRects
+from src.history import History
+from src.lod import LodPyramid
+from src.roadnet import RoadNetwork
+from src.aggregate import PopulationIndex
+from src.viewport import Viewport
+from src.view2d import View2d
+
+CANVAS_W, CANVAS_H = 800, 800
+CHECK_SIZES, CHECK_SEEDS, CHECK_STEPS = (7, 30, 150), 4, 60
+BENCH_SIZE, MIN_LOT_SIZE = 5000, 20
+
+# just enough of tkinter's canvas and of App for View2d, items are kept as coords and options
+class Canvas(object):
+
+    def __init__(self) -> None:
+        self.items, self.next = dict(), 1
+
+    def create_rectangle(self, coords: list, **options) -> int:
+        self.items[self.next] = (list(map(float, coords)), options)
+        self.next += 1
+        return self.next - 1
+
+    def tagged(self, tag) -> list:
+        if tag == 'all': return list(self.items)
+        if isinstance(tag, int): return [tag] if tag in self.items else []
+        return [item for item, (_, options) in self.items.items() if tag in options.get('tags', ())]
+
+    def type(self, item: int) -> str:
+        return 'rectangle' if item in self.items else None
+
+    def delete(self, tag) -> None:
+        for item in self.tagged(tag): del self.items[item]
+
+    def itemconfigure(self, tag, **options) -> None:
+        for item in self.tagged(tag): self.items[item][1].update(options)
+
+    def move(self, tag, dx: float, dy: float) -> None:
+        for item in self.tagged(tag):
+            coords = self.items[item][0]
+            coords[:] = [value + (dy if index % 2 else dx) for index, value in enumerate(coords)]
+
+    def scale(self, tag, x: float, y: float, fx: float, fy: float) -> None:
+        for item in self.tagged(tag):
+            coords = self.items[item][0]
+            coords[:] = [y + (value - y) * fy if index % 2 else x + (value - x) * fx for index, value in enumerate(coords)]
+
+    def after(self, ms: int, func=None) -> None:
+        return None
+
+class Var(object):
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value) -> None:
+        self.value = value
+
+class Event(object):
+
+    def __init__(self, x: float, y: float) -> None:
+        self.x, self.y = x, y
+
+class Host(object):
+
+    CANVAS_W, CANVAS_H = CANVAS_W, CANVAS_H
+    BRUSH_TYPE_REPULSE, BRUSH_TYPE_ATTRACT, BRUSH_TYPE_DRAG, BRUSH_TYPE_BREAK, BRUSH_TYPE_CONNECT = range(5)
+
+    # the parts of App View2d reads, with the listeners App subscribes
+    def __init__(self, grid: Grid) -> None:
+        self.grid, self.canvas = grid, Canvas()
+        self.history, self.network, self.populationIndex = History(grid), RoadNetwork(grid), PopulationIndex(grid)
+        self.pyramid = LodPyramid(grid)
+        self.showLot, self.showRoad, self.showAnimation = Var(True), Var(True), Var(False)
+        self.brushType, self.innerRadius, self.outerRadius, self.brushAmount = Var(-1), Var(3), Var(6), Var(20)
+        self.infoLabel = Var('')
+        self.view2d = View2d(self)
+
+def lotSize(rows: int, cols: int) -> int:
+    # as App sizes its lots
+    return max(min(CANVAS_H // rows, CANVAS_W // cols), MIN_LOT_SIZE)
+
+def checkViewport(viewport: Viewport, rng: random.Random, moved: bool) -> None:
+    grid, scale = viewport.grid, viewport.scale
+    rows, cols = grid.shape
+    baseX, baseY = grid.basePos
+    assert viewport.minScale - 1e-9 <= scale <= Viewport.MAX_SCALE + 1e-9, f'scale {scale} out of range'
+    # the center of the canvas stays over the grid once the view moved, a grid smaller than the canvas starts at its top left
+    x, y = viewport.toGrid((CANVAS_W / 2, CANVAS_H / 2))
+    assert not moved or baseX - 1e-6 <= x <= baseX + cols * grid.size + 1e-6 and baseY - 1e-6 <= y <= baseY + rows * grid.size + 1e-6, 'center left the grid'
+    for _ in range(5):
+        pos = (rng.uniform(-1000, 5000), rng.uniform(-1000, 5000))
+        assert np.allclose(viewport.toGrid(viewport.toCanvas(pos)), pos), f'{pos} does not map back'
+        assert np.allclose(viewport.toCanvasRects(pos + pos), viewport.toCanvas(pos) * 2), f'{pos} maps apart as a rectangle'
+    # every lot overlapping the grown canvas is in range, and the range stays inside the grid
+    for margin in (0, View2d.WINDOW_MARGIN):
+        row0, row1, col0, col1 = viewport.visibleLots(margin)
+        assert 0 <= row0 <= row1 <= rows and 0 <= col0 <= col1 <= cols, f'lot range {(row0, row1, col0, col1)} leaves the grid'
+        x0, y0 = viewport.toCanvas((baseX + np.arange(cols) * grid.size, baseY + np.arange(rows) * grid.size))
+        size = grid.size * scale
+        colsIn = np.flatnonzero((x0 + size > -margin * CANVAS_W) & (x0 < (1 + margin) * CANVAS_W))
+        rowsIn = np.flatnonzero((y0 + size > -margin * CANVAS_H) & (y0 < (1 + margin) * CANVAS_H))
+        assert not len(rowsIn) or (row0 <= rowsIn.min() and rowsIn.max() < row1), f'visible rows {rowsIn.min()}..{rowsIn.max()} not in {row0}..{row1}'
+        assert not len(colsIn) or (col0 <= colsIn.min() and colsIn.max() < col1), f'visible cols {colsIn.min()}..{colsIn.max()} not in {col0}..{col1}'
+
+def checkItems(view: View2d) -> None:
+    # the items of the window show the grid as it is, where a fresh createItems would put them
+    grid, canvas = view.master.grid, view.master.canvas
+    row0, row1, col0, col1 = view.window
+    assert view.covers(), 'the window does not hold the visible lots'
+    assert view.lotItems.shape == (row1 - row0, col1 - col0), f'{view.lotItems.shape} lot items for window {view.window}'
+    rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+    bodyRects, roadRects = (view.viewport.toCanvasRects(rects) for rects in buildRects(grid, rows, cols))
+    roads = grid.roadStates(rows, cols)
+    for index, (lotItem, roadItems) in enumerate(zip(view.lotItems.ravel().tolist(), view.roadItems.reshape(-1, 4).tolist())):
+        coords, options = canvas.items[lotItem]
+        assert options['fill'] == COLORS[grid.population[rows[index], cols[index]]], f'lot {(rows[index], cols[index])} shows a stale population'
+        assert np.allclose(coords, bodyRects[index], atol=1e-6), f'lot {(rows[index], cols[index])} drawn at {coords}, not {bodyRects[index].tolist()}'
+        for direction, item in enumerate(roadItems):
+            coords, options = canvas.items[item]
+            assert (options['state'] == 'normal') == bool(roads[index, direction]), f'road {direction} of lot {(rows[index], cols[index])} shows a stale state'
+            assert np.allclose(coords, roadRects[index, direction], atol=1e-6), f'road {direction} of lot {(rows[index], cols[index])} is misplaced'
+
+def check() -> None:
+    for size in CHECK_SIZES:
+        for seed in range(CHECK_SEEDS):
+            rows, cols = size, size + seed
+            grid = Grid(rows, cols, 3, 3, lotSize(rows, cols))
+            grid.randomize(seed=seed)
+            host, rng = Host(grid), random.Random(seed)
+            view = host.view2d
+            view.render()
+            moved = False
+            for index in range(CHECK_STEPS):
+                # pans far past the border, zooms around anywhere, brushes anywhere, also off the window
+                op = rng.randrange(3)
+                moved |= op < 2
+                if op == 0:
+                    view.pan(rng.uniform(-2, 2) * CANVAS_W, rng.uniform(-2, 2) * CANVAS_H)
+                elif op == 1:
+                    view.zoom(Event(rng.uniform(0, CANVAS_W), rng.uniform(0, CANVAS_H)), rng.random() < 0.5)
+                else:
+                    pos = lambda: [rng.uniform(-1, cols + 1), rng.uniform(-1, rows + 1)]
+                    for _ in range(rng.randrange(1, 4)):
+                        applyStep(grid, {'brush': rng.choice(BRUSHES), 'at': pos(), 'from': pos(), 'inner': 2, 'outer': 4, 'amount': 50})
+                    view.render()
+                checkViewport(view.viewport, rng, moved)
+                checkItems(view)
+    print(f'viewport and window items match the grid on {len(CHECK_SIZES) * CHECK_SEEDS} random sessions')
+
+def timed(job) -> float:
+    start = perf_counter()
+    job()
+    return perf_counter() - start
+
+def bench() -> None:
+    # where the time of a large grid goes: starting the app, rand and load rebuild every listener, a brush and a pan do not
+    grid = Grid(BENCH_SIZE, BENCH_SIZE, 3, 3, MIN_LOT_SIZE)
+    times = {'randomize, no listeners': timed(lambda: grid.randomize(seed=0))}
+    times['RoadNetwork, first query'] = timed(lambda: RoadNetwork(grid).current())
+    times['PopulationIndex'] = timed(lambda: PopulationIndex(grid))
+    times['LodPyramid'] = timed(lambda: LodPyramid(grid))
+    del grid.listeners[:]
+    times['startup, every listener'] = timed(lambda: setattr(grid, 'host', Host(grid)))
+    view = grid.host.view2d
+    times['first render'] = timed(view.render)
+    times['randomize, every listener'] = timed(lambda: grid.randomize(seed=1))
+    layout = grid.dump()
+    times['load, every listener'] = timed(lambda: grid.load(layout))
+    times['render after rand'] = timed(view.render)
+    center = [BENCH_SIZE / 2, BENCH_SIZE / 2]
+    times['repulse step and render'] = timed(lambda: (applyStep(grid, {'brush': 'repulse', 'at': center, 'inner': 3, 'outer': 6, 'amount': 20}), view.render()))
+    times['break step and render'] = timed(lambda: (applyStep(grid, {'brush': 'break', 'at': center, 'inner': 3, 'outer': 6}), view.render()))
+    times['pan within the window'] = timed(lambda: view.pan(-50, -50))
+    times['pan out of the window'] = timed(lambda: view.pan(-2 * CANVAS_W, -2 * CANVAS_H))
+    # the view starts zoomed out as far as it goes
+    times['zoom in'] = timed(lambda: view.zoom(Event(CANVAS_W / 2, CANVAS_H / 2), True))
+    print(f'{BENCH_SIZE}x{BENCH_SIZE} lots of {MIN_LOT_SIZE} pixels, canvas items are not drawn by tk here')
+    for name, seconds in times.items():
+        print(f'  {name:<28} {seconds * 1000:>10.1f}ms')
+
+if __name__ == '__main__':
+    check()
+    bench()
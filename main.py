@@ -1,4 +1,23 @@
+import argparse
+
+from src import ubfile
 from src.app import App
+from src.generate import GENERATORS
 
 if __name__ == '__main__':
-    App().run()
+    parser = argparse.ArgumentParser(description='urban brush demo')
+    parser.add_argument('layout', nargs='?', help='.ub layout to open, the grid takes its size')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('ROWS', 'COLS'), default=(App.LOT_ROWS, App.LOT_COLS), help='lots of an empty grid (default: 20 20)')
+    parser.add_argument('--generate', choices=list(GENERATORS), help='start from a generated layout instead of an empty grid')
+    parser.add_argument('--seed', type=int, help='seed of the generated layout, the same seed gives the same layout')
+    args = parser.parse_args()
+    infoDict = ubfile.read(args.layout) if args.layout else None
+    app = App(*(infoDict['lots'].shape if infoDict else args.size))
+    if infoDict:
+        app.grid.load(infoDict)
+        app.renderCanvas()
+    elif args.generate:
+        app.generator.set(args.generate)
+        app.grid.randomize(args.generate, args.seed)
+        app.renderCanvas()
+    app.run()
@@ -0,0 +1,120 @@
+# population aggregates
+
+import numpy as np
+
+from src.change import Change
+from src.util import distances
+from src.profiler import profiled
+
+class PopulationIndex(object):
+
+    DISTRICT_LOTS = 5 # lots per side of a district
+
+    # sums of population over rectangles and circles without scanning lots:
+    # prefix sums along every row, rebuilt only for the rows a change touched, answer a circle or a rectangle with one span per row,
+    # and a summed-area table built from them answers a rectangle above its first stale row in constant time,
+    # it is only brought up to date for queries over the whole grid
+    def __init__(self, grid) -> None:
+        self.grid = grid
+        self.rebuild()
+        grid.subscribe(self.gridChanged)
+
+    def rebuild(self) -> None:
+        rows, cols = self.grid.shape
+        self.prefix = np.zeros((rows, cols + 1), dtype=np.int64)
+        self.table = np.zeros((rows + 1, cols + 1), dtype=np.int64)
+        self.stale = rows
+        self.refreshRows(np.arange(rows))
+
+    def refreshRows(self, rows: np.ndarray) -> None:
+        cols = self.grid.shape[1]
+        self.prefix[rows, 1:] = np.cumsum(self.grid.population[rows[:, None], np.arange(cols)], axis=1)
+        if len(rows): self.stale = min(self.stale, int(rows.min()))
+
+    @profiled('aggregate.gridChanged')
+    def gridChanged(self, change: Change) -> None:
+        if change.full:
+            self.rebuild()
+        elif change.lots:
+            self.refreshRows(np.unique([row for row, _ in change.lots]))
+
+    def refreshTable(self) -> None:
+        # table[row] sums the lots above row, so the ones below the first stale row follow from the row prefixes
+        rows = self.grid.shape[0]
+        if self.stale < rows:
+            self.table[self.stale + 1:] = self.table[self.stale] + np.cumsum(self.prefix[self.stale:], axis=0)
+            self.stale = rows
+
+    def rectSum(self, row0: int, row1: int, col0: int, col1: int) -> int:
+        # population of the lots in rows [row0, row1) and cols [col0, col1), clipped to the grid
+        rows, cols = self.grid.shape
+        row0, row1 = min(max(row0, 0), rows), min(max(row1, 0), rows)
+        col0, col1 = min(max(col0, 0), cols), min(max(col1, 0), cols)
+        if row0 >= row1 or col0 >= col1: return 0
+        if row1 > self.stale: return int((self.prefix[row0:row1, col1] - self.prefix[row0:row1, col0]).sum())
+        table = self.table
+        return int(table[row1, col1] - table[row0, col1] - table[row1, col0] + table[row0, col0])
+
+    def districtSums(self, size: int=DISTRICT_LOTS) -> np.ndarray:
+        # population of every size x size district, the last ones cut by the border
+        rows, cols = self.grid.shape
+        self.refreshTable()
+        rowEdges, colEdges = np.append(np.arange(0, rows, size), rows), np.append(np.arange(0, cols, size), cols)
+        corners = self.table[rowEdges[:, None], colEdges]
+        return corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+    def districtOf(self, base: tuple, size: int=DISTRICT_LOTS) -> tuple:
+        # (row0, row1, col0, col1) of the district under a canvas position, None off the grid
+        rows, cols = self.grid.shape
+        baseX, baseY = self.grid.basePos
+        row, col = int(np.floor((base[1] - baseY) / self.grid.size)), int(np.floor((base[0] - baseX) / self.grid.size))
+        if not (0 <= row < rows and 0 <= col < cols): return None
+        row0, col0 = row - row % size, col - col % size
+        return (row0, min(row0 + size, rows), col0, min(col0 + size, cols))
+
+    def spans(self, base: tuple, radius: float, inclusive: bool) -> tuple:
+        # lot rows in range and per row the half-open cols whose centers lie within the radius, < or <= as grid queries compare
+        rows, cols = self.grid.shape
+        baseX, baseY = self.grid.basePos
+        size, half = self.grid.size, self.grid.size // 2
+        row0, row1, _, _ = self.grid.index.lotRange(base, radius + 1)
+        rowIds = np.arange(row0, row1)
+        dy = baseY + rowIds * size + half - base[1]
+        reach = np.sqrt(np.maximum(radius ** 2 - dy ** 2, 0))
+        # ends from the circle are off by at most one lot where a center lies on it,
+        # one exact distance check on each side makes them agree with getLotIdsByDistance
+        center = (base[0] - baseX - half) / size
+        lo = np.clip(np.ceil(center - reach / size), 0, cols).astype(int)
+        hi = np.clip(np.floor(center + reach / size) + 1, 0, cols).astype(int)
+        inside = lambda ids: (ids >= 0) & (ids < cols) & self.within(base, rowIds, ids, radius, inclusive)
+        lo = np.where(inside(lo - 1), lo - 1, np.where((lo < hi) & ~inside(lo), lo + 1, lo))
+        hi = np.where(inside(hi), hi + 1, np.where((hi > lo) & ~inside(hi - 1), hi - 1, hi))
+        return (rowIds, lo, np.maximum(hi, lo))
+
+    def within(self, base: tuple, rows: np.ndarray, cols: np.ndarray, radius: float, inclusive: bool) -> np.ndarray:
+        baseX, baseY = self.grid.basePos
+        size, half = self.grid.size, self.grid.size // 2
+        dis = distances(base, baseX + cols * size + half, baseY + rows * size + half)
+        return dis <= radius if inclusive else dis < radius
+
+    def diskSum(self, base: tuple, radius: float, inclusive: bool=False) -> tuple:
+        # (population, lots) of the lots whose centers lie within the radius, one prefix lookup per row
+        rows, lo, hi = self.spans(base, radius, inclusive)
+        prefix = self.prefix
+        return (int((prefix[rows, hi] - prefix[rows, lo]).sum()), int((hi - lo).sum()))
+
+    @profiled('aggregate.regionSum')
+    def regionSum(self, base: tuple, minDis: float, maxDis: float) -> tuple:
+        # (population, lots) of the lots with minDis < distance < maxDis, the region getLotIdsByDistance returns
+        if maxDis <= minDis: return (0, 0)
+        outer, inner = self.diskSum(base, maxDis), self.diskSum(base, minDis, inclusive=True)
+        return (outer[0] - inner[0], outer[1] - inner[1])
+
+    def overlapSum(self, baseA: tuple, radiusA: float, baseB: tuple, radiusB: float) -> tuple:
+        # (population, lots) of the lots inside both regions regionSum(base, 0, radius) gives, scanning the first one
+        baseX, baseY = self.grid.basePos
+        size, half = self.grid.size, self.grid.size // 2
+        rows, cols = self.grid.getLotIdsByDistance(baseA, 0, radiusA)
+        dis = distances(baseB, baseX + cols * size + half, baseY + rows * size + half)
+        both = (0 < dis) & (dis < radiusB)
+        return (int(self.grid.population[rows[both], cols[both]].astype(np.int64).sum()), int(both.sum()))
@@ -3,9 +3,16 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
-import pickle
+from tkinter import messagebox
 
+from src import ubfile
+from src.aggregate import PopulationIndex
+from src.generate import GENERATORS
 from src.grid import Grid
+from src.history import History
+from src.profiler import PROFILER
+from src.roadnet import RoadNetwork
+from src.scheduler import Scheduler
 from src.view2d import View2d
 from src.view3d import View3d
 
@@ -13,7 +20,8 @@ class App(object):
 
     CANVAS_H, CANVAS_W = 800, 800
     LOT_ROWS, LOT_COLS = 20, 20
-    LOT_SIZE = min(CANVAS_H // LOT_ROWS, CANVAS_W // LOT_COLS)
+    MIN_LOT_SIZE = 20 # larger grids no longer fit the canvas and are panned and zoomed instead
+    MAX_RADIUS = 64
 
     BRUSH_TYPE_REPULSE = 0
     BRUSH_TYPE_ATTRACT = 1
@@ -21,19 +29,27 @@ class App(object):
     BRUSH_TYPE_BREAK   = 3
     BRUSH_TYPE_CONNECT = 4
 
-    def __init__(self) -> None:
+    HISTORY_BUDGET = 16 << 20
+    PROFILE_INTERVAL = 500 # ms between refreshes of the profile overlay
+
+    def __init__(self, rows: int=LOT_ROWS, cols: int=LOT_COLS) -> None:
         self.root = tk.Tk()
         self.root.title('urban brush demo')
         self.root.resizable(0, 0)
 
-        self.grid = Grid(App.LOT_ROWS, App.LOT_COLS, 3, 3, App.LOT_SIZE)
+        self.grid = Grid(rows, cols, 3, 3, max(min(App.CANVAS_H // rows, App.CANVAS_W // cols), App.MIN_LOT_SIZE))
         self.view2d = View2d(self)
         self.view3d = View3d(self)
+        self.history = History(self.grid, App.HISTORY_BUDGET)
+        self.network = RoadNetwork(self.grid)
+        self.populationIndex = PopulationIndex(self.grid)
 
         self.show3d = tk.BooleanVar(value=False)
         self.showLot = tk.BooleanVar(value=True)
         self.showRoad = tk.BooleanVar(value=True)
         self.showAnimation = tk.BooleanVar(value=False)
+        self.showProfile = tk.BooleanVar(value=False)
+        self.generator = tk.StringVar(value='uniform')
 
         self.brushType = tk.IntVar(value=-1)
         self.innerRadius = tk.IntVar(value=3)
@@ -41,12 +57,16 @@ class App(object):
         self.brushAmount = tk.IntVar(value=20)
 
         self.infoLabel = tk.StringVar(value='')
+        self.profileLabel = tk.StringVar(value='')
         self.innerRadiusLabel = tk.StringVar(value=f'inner radius: {self.innerRadius.get()}')
         self.outerRadiusLabel = tk.StringVar(value=f'outer radius: {self.outerRadius.get()}')
         self.brushAmountLabel = tk.StringVar(value=f'brush amount: {self.brushAmount.get()}%')
 
         self.createControlPad(self.root)
         self.createCanvas(self.root)
+        self.root.bind('<Control-z>', lambda _: self.undoButton())
+        self.root.bind('<Control-y>', lambda _: self.redoButton())
+        self.root.bind('<Control-Z>', lambda _: self.redoButton())
     
     def createControlPad(self, master) -> None:
         controlPad = ttk.Frame(master)
@@ -54,13 +74,18 @@ class App(object):
         self.createDisplayPad(controlPad)
         self.createBrushPad(controlPad)
         ttk.Label(controlPad, textvariable=self.infoLabel).pack()
+        ttk.Label(controlPad, textvariable=self.profileLabel).pack()
         controlPad.pack(anchor='n', side=tk.LEFT, padx=10, pady=10)
     
     def createGlobalPad(self, master) -> None:
         globalPad = ttk.Labelframe(master, text='global')
         ttk.Button(globalPad, text='load', command=self.loadButton).pack(fill=tk.X)
         ttk.Button(globalPad, text='save', command=self.saveButton).pack(fill=tk.X)
+        ttk.OptionMenu(globalPad, self.generator, self.generator.get(), *GENERATORS).pack(fill=tk.X)
         ttk.Button(globalPad, text='rand', command=self.randButton).pack(fill=tk.X)
+        ttk.Button(globalPad, text='undo', command=self.undoButton).pack(fill=tk.X)
+        ttk.Button(globalPad, text='redo', command=self.redoButton).pack(fill=tk.X)
+        ttk.Button(globalPad, text='export profile', command=self.exportProfileButton).pack(fill=tk.X)
         globalPad.pack(fill=tk.X, padx=5, pady=5)
     
     def createDisplayPad(self, master) -> None:
@@ -72,6 +97,7 @@ class App(object):
         ttk.Checkbutton(displayPad, text='roads', variable=self.showRoad, command=self.renderCanvas).pack(anchor=tk.W)
         ttk.Separator(displayPad, orient=tk.HORIZONTAL).pack(fill=tk.BOTH, padx=5, pady=5)
         ttk.Checkbutton(displayPad, text='animated', variable=self.showAnimation).pack(anchor=tk.W)
+        ttk.Checkbutton(displayPad, text='profile', variable=self.showProfile, command=self.toggleProfile).pack(anchor=tk.W)
         displayPad.pack(fill=tk.X, padx=5, pady=5)
     
     def createBrushPad(self, master) -> None:
@@ -85,12 +111,12 @@ class App(object):
         ttk.Separator(brushPad, orient=tk.HORIZONTAL).pack(fill=tk.BOTH, padx=5, pady=5)
         ttk.Label(brushPad, textvariable=self.innerRadiusLabel).pack(anchor=tk.W)
         ttk.Scale(
-            brushPad, variable=self.innerRadius, from_=1, to=max(App.LOT_ROWS, App.LOT_COLS), orient=tk.HORIZONTAL, length=200,
+            brushPad, variable=self.innerRadius, from_=1, to=min(max(self.grid.shape), App.MAX_RADIUS), orient=tk.HORIZONTAL, length=200,
             command=lambda _: self.innerRadiusLabel.set(f'inner radius: {self.innerRadius.get()}')
         ).pack(padx=5)
         ttk.Label(brushPad, textvariable=self.outerRadiusLabel).pack(anchor=tk.W)
         ttk.Scale(
-            brushPad, variable=self.outerRadius, from_=1, to=max(App.LOT_ROWS, App.LOT_COLS), orient=tk.HORIZONTAL, length=200,
+            brushPad, variable=self.outerRadius, from_=1, to=min(max(self.grid.shape), App.MAX_RADIUS), orient=tk.HORIZONTAL, length=200,
             command=lambda _: self.outerRadiusLabel.set(f'outer radius: {self.outerRadius.get()}')
         ).pack(padx=5)
         ttk.Label(brushPad, textvariable=self.brushAmountLabel).pack(anchor=tk.W)
@@ -105,27 +131,58 @@ class App(object):
         size = max(App.CANVAS_H, App.CANVAS_W)
         self.canvas = tk.Canvas(master, bg='white', height=size, width=size)
         self.canvas.pack(side=tk.LEFT, padx=10, pady=10)
+        self.scheduler = Scheduler(self.canvas)
         self.view2d.activate()
 
     def renderCanvas(self) -> None:
+        # a mode switch or a new render stops any drawing still in progress
+        self.scheduler.cancel()
+        if not self.show3d.get(): self.view3d.cancel()
         view = self.view3d if self.show3d.get() else self.view2d
         view.activate()
         view.render()
     
     def loadButton(self) -> None:
         if filename := filedialog.askopenfilename(filetypes=[('urban brush file', '.ub')], initialdir='.'):
-            with open(filename, 'rb') as f:
-                self.grid.load(pickle.load(f))
+            infoDict = ubfile.read(filename)
+            if infoDict['lots'].shape != self.grid.shape:
+                rows, cols = infoDict['lots'].shape
+                messagebox.showerror('load', f'the layout has {rows}x{cols} lots, open it with `python3 main.py {filename}` to edit it at its size')
+                return
+            self.grid.load(infoDict)
             self.renderCanvas()
 
     def saveButton(self) -> None:
         if filename := filedialog.asksaveasfilename(filetypes=[('urban brush file', '.ub')], initialdir='.'):
-            with open(filename, 'wb') as f:
-                pickle.dump(self.grid.dump(), f)
+            ubfile.write(filename, self.grid.dump())
 
     def randButton(self) -> None:
-        self.grid.randomize()
+        self.grid.randomize(self.generator.get())
         self.renderCanvas()
 
+    def undoButton(self) -> None:
+        if self.history.undo(): self.renderCanvas()
+
+    def redoButton(self) -> None:
+        if self.history.redo(): self.renderCanvas()
+
+    def exportProfileButton(self) -> None:
+        if filename := filedialog.asksaveasfilename(filetypes=[('json', '.json'), ('csv', '.csv')], defaultextension='.json', initialdir='.'):
+            PROFILER.export(filename)
+
+    def toggleProfile(self) -> None:
+        # timings gather only while the overlay is shown, and start over every time it is
+        PROFILER.enabled = self.showProfile.get()
+        if PROFILER.enabled:
+            PROFILER.reset()
+            self.refreshProfile()
+        else:
+            self.profileLabel.set('')
+
+    def refreshProfile(self) -> None:
+        if not self.showProfile.get(): return
+        self.profileLabel.set(PROFILER.overlay())
+        self.root.after(App.PROFILE_INTERVAL, self.refreshProfile)
+
     def run(self) -> None:
         self.root.mainloop()
@@ -0,0 +1,46 @@
+# brush
+
+from src.change import Change
+from src.grid import Grid
+
+# a brush script is a list of steps like the clicks in the 2d view, positions and radii are given in lots
+#   {"brush": "repulse", "at": [x, y], "inner": 3, "outer": 6, "amount": 20}
+#   {"brush": "attract", "at": [x, y], "inner": 3, "outer": 6, "amount": 20}
+#   {"brush": "drag", "from": [x, y], "at": [x, y], "inner": 3, "outer": 6, "amount": 20}
+#   {"brush": "break", "at": [x, y], "inner": 3, "marks": [[x, y], ...]}
+#   {"brush": "connect", "at": [x, y], "inner": 3, "outer": 6, "marks": [[x, y], ...]}
+# "marks" are optional right clicks picking the roads nearest to them, as with the break and connect brushes
+BRUSHES = ('repulse', 'attract', 'drag', 'break', 'connect')
+
+def toCanvas(grid: Grid, pos: list) -> tuple:
+    # lot units from the top left corner of the grid to canvas pixels
+    baseX, baseY = grid.basePos
+    return (baseX + pos[0] * grid.size, baseY + pos[1] * grid.size)
+
+def applyStep(grid: Grid, step: dict) -> Change:
+    brush = step.get('brush')
+    if brush not in BRUSHES:
+        raise ValueError(f'unknown brush {brush!r}, expected one of {", ".join(BRUSHES)}')
+    base = toCanvas(grid, step['at'])
+    innerRadius = step.get('inner', 3) * grid.size
+    outerRadius = step.get('outer', 6) * grid.size
+    amount = step.get('amount', 20)
+    if brush == 'repulse':
+        return grid.repulseLots(base, innerRadius, outerRadius, amount)
+    if brush == 'attract':
+        return grid.attractLots(base, innerRadius, outerRadius, amount)
+    if brush == 'drag':
+        return grid.dragLots(toCanvas(grid, step['from']), base, innerRadius, outerRadius, amount)
+    roadBuffer = list()
+    for mark in step.get('marks', ()):
+        roadBuffer.extend(grid.markRoads(toCanvas(grid, mark)))
+    if brush == 'break':
+        return grid.breakRoads(base, innerRadius, roadBuffer)
+    return grid.connectRoads(base, innerRadius, outerRadius, roadBuffer)
+
+def replay(grid: Grid, script: list) -> Change:
+    # apply every step in order, the merged change covers the whole script
+    change = Change()
+    for step in script:
+        change.merge(applyStep(grid, step))
+    return change
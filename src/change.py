@@ -0,0 +1,41 @@
+# change tracking
+
+class Change(object):
+
+    # what a grid mutation changed, lots map (row, col) and edges map (row, col, direction) of a sec to (before, after)
+    def __init__(self, full: bool=False) -> None:
+        self.full = full
+        self.lots = dict()
+        self.edges = dict()
+
+    @staticmethod
+    def record(entries: dict, key: tuple, before: int, after: int) -> None:
+        # keep the earliest before and the latest after, forget entries that ended where they started
+        if key in entries: before = entries[key][0]
+        if before == after:
+            entries.pop(key, None)
+        else:
+            entries[key] = (before, after)
+
+    def merge(self, other) -> None:
+        self.full = self.full or other.full
+        for key, (before, after) in other.lots.items(): Change.record(self.lots, key, before, after)
+        for key, (before, after) in other.edges.items(): Change.record(self.edges, key, before, after)
+
+    @property
+    def secs(self) -> set:
+        return {(row, col) for row, col, _ in self.edges}
+
+    def touchedLots(self, shape: tuple) -> set:
+        # lots whose population changed or which border a changed sec
+        rows, cols = shape
+        touched = set(self.lots)
+        for row, col in self.secs:
+            touched.update((r, c) for r in (row - 1, row) for c in (col - 1, col) if 0 <= r < rows and 0 <= c < cols)
+        return touched
+
+    def __bool__(self) -> bool:
+        return self.full or bool(self.lots) or bool(self.edges)
+
+    def __repr__(self) -> str:
+        return 'Change(full)' if self.full else f'Change({len(self.lots)} lots, {len(self.edges)} edges)'
@@ -0,0 +1,139 @@
+# procedural generation
+
+import numpy as np
+
+from src.sec import Sec
+from src.lot import Lot
+from src.profiler import profiled
+
+UNIFORM_BLOCKED = 31 / 101 # share of inner roads the original per-road randint(0, 100) > 30 test blocked
+DENSE_BLOCKED, SPARSE_BLOCKED = 0.1, 0.6 # share of roads blocked where the density is 1 and where it is 0
+NOISE_PERIODS = (32, 16, 8, 4) # lots between lattice points of the noise octaves, each half as strong as the one before
+BAND = 1 << 16 # lots worked on at a time over the whole grid, to stay in cache
+JITTER = 0.25 # how far the population of a lot strays from its density either way, as a share of the maximum
+DRAWS = 1 << 16 # roads are blocked by 16 bit draws, cheaper than floats
+
+def uniform(rng: np.random.Generator, rows: int, cols: int) -> tuple:
+    # every lot and road alike, as the original randomize
+    population = rng.integers(0, Lot.POPULATION_MAX, size=(rows, cols), endpoint=True, dtype=np.uint8)
+    hor, ver = (rng.integers(0, DRAWS, size=shape, dtype=np.uint16) < round(UNIFORM_BLOCKED * DRAWS) for shape in ((rows - 1, cols), (rows, cols - 1)))
+    return (population, hor, ver)
+
+def noise(rng: np.random.Generator, rows: int, cols: int) -> tuple:
+    # dense and sparse patches from smooth value noise
+    return fromDensity(rng, valueNoise(rng, rows, cols))
+
+def radial(rng: np.random.Generator, rows: int, cols: int) -> tuple:
+    # a downtown somewhere around the middle falling off towards the outskirts, roughened by some noise
+    centerRow, centerCol = rng.uniform(0.3, 0.7) * rows, rng.uniform(0.3, 0.7) * cols
+    radius = 0.35 * max(rows, cols)
+    # exp(-(dy^2 + dx^2) / radius^2) as the product of its row and column factors
+    falloff = lambda size, center: 0.8 ** 0.5 * np.exp(-((np.arange(size, dtype=np.float32) + 0.5 - center) / radius) ** 2)
+    rowFactors, colFactors = falloff(rows, centerRow), falloff(cols, centerCol)
+    density = valueNoise(rng, rows, cols)
+    for rowsIn in bands(rows, cols):
+        density[rowsIn] *= 0.2
+        density[rowsIn] += rowFactors[rowsIn, None] * colFactors
+    return fromDensity(rng, density)
+
+GENERATORS = {'uniform': uniform, 'noise': noise, 'radial': radial}
+
+def bands(rows: int, cols: int) -> list:
+    # slices of rows holding about BAND lots each
+    height = max(BAND // max(cols, 1), 1)
+    return [slice(start, min(start + height, rows)) for start in range(0, rows, height)]
+
+def valueNoise(rng: np.random.Generator, rows: int, cols: int) -> np.ndarray:
+    # octaves of random lattices smoothly interpolated, summed and scaled to [0, 1] on the lattice of the finest octave,
+    # which alone is then interpolated over the lots, along the columns on its rows first
+    finest = NOISE_PERIODS[-1]
+    shape = (rows // finest + 2, cols // finest + 2)
+    coarse = np.zeros(shape, dtype=np.float32)
+    for octave, period in enumerate(NOISE_PERIODS):
+        step = period // finest
+        lattice = rng.random((shape[0] // step + 2, shape[1] // step + 2), dtype=np.float32)
+        coarse += stretch(stretch(lattice, shape[0], step).T, shape[1], step).T / 2 ** octave
+    low, high = coarse.min(), coarse.max()
+    coarse -= low
+    coarse /= max(high - low, 1e-9)
+    return stretch(np.ascontiguousarray(stretch(coarse.T, cols, finest).T), rows, finest)
+
+def stretch(values: np.ndarray, size: int, period: int) -> np.ndarray:
+    # rows of lattice points smoothly interpolated over size rows, period rows apart, more than size // period + 1 given;
+    # every period has the same weights, so whole periods are broadcast rather than gathered, a band of them at a time
+    at = np.arange(period, dtype=np.float32) / period
+    weights = (at * at * (3 - 2 * at))[:, None]
+    rises = values[1:] - values[:-1]
+    stretched = np.empty((size, values.shape[1]), dtype=np.float32)
+    whole = size // period
+    periods = stretched[:whole * period].reshape(whole, period, values.shape[1])
+    for rowsIn in bands(whole, period * values.shape[1]):
+        np.multiply(rises[rowsIn, None], weights, out=periods[rowsIn])
+        periods[rowsIn] += values[rowsIn, None]
+    rest = stretched[whole * period:]
+    np.multiply(rises[whole], weights[:len(rest)], out=rest)
+    rest += values[whole]
+    return stretched
+
+def fromDensity(rng: np.random.Generator, density: np.ndarray) -> tuple:
+    # population around the density of each lot from random bytes, roads more often blocked between sparse lots,
+    # a band of rows at a time, each with the row below it for the roads between the two
+    rows, cols = density.shape
+    population = np.empty((rows, cols), dtype=np.uint8)
+    hor, ver = np.empty((max(rows - 1, 0), cols), dtype=bool), np.empty((rows, max(cols - 1, 0)), dtype=bool)
+    spread = np.float32(2 * JITTER * Lot.POPULATION_MAX / 255)
+    # draws under the share blocked at the mean density of the two lots, given the sum of their densities
+    blocked = lambda sums: rng.integers(0, DRAWS, size=sums.shape, dtype=np.uint16) < (SPARSE_BLOCKED - (SPARSE_BLOCKED - DENSE_BLOCKED) / 2 * sums) * DRAWS
+    for rowsIn in bands(rows, cols):
+        around = np.clip(density[rowsIn.start:rowsIn.stop + 1], 0, 1)
+        here = around[:rowsIn.stop - rowsIn.start]
+        level = rng.integers(0, 255, size=here.shape, endpoint=True, dtype=np.uint8) * spread
+        level += here * Lot.POPULATION_MAX + (0.5 - JITTER * Lot.POPULATION_MAX)
+        population[rowsIn] = np.clip(level, 0, Lot.POPULATION_MAX, out=level)
+        below = min(rowsIn.stop, rows - 1) - rowsIn.start
+        if below > 0: hor[rowsIn.start:rowsIn.start + below] = blocked(around[:below] + around[1:below + 1])
+        ver[rowsIn] = blocked(here[:, :-1] + here[:, 1:])
+    return (population, hor, ver)
+
+def blockRoads(rows: int, cols: int, hor: np.ndarray, ver: np.ndarray) -> np.ndarray:
+    # every intersection all connected, then the inner roads given blocked, hor (rows - 1, cols) runs along the inner rows
+    # of secs and ver (rows, cols - 1) along the inner columns, written straight into the roads as blocked is 0
+    roads = np.full((rows + 1, cols + 1, 4), Sec.ACTIVE, dtype=np.uint8)
+    np.subtract(Sec.ACTIVE, hor.view(np.uint8), out=roads[1:rows, :-1, Sec.E])
+    np.subtract(Sec.ACTIVE, ver.view(np.uint8), out=roads[:-1, 1:cols, Sec.S])
+    roads[1:rows, 1:, Sec.W], roads[1:, 1:cols, Sec.N] = roads[1:rows, :-1, Sec.E], roads[:-1, 1:cols, Sec.S]
+    return roads
+
+@profiled('generate.pruneDeadEnds')
+def pruneDeadEnds(roads: np.ndarray) -> None:
+    # block dead ends of inner secs until none is left as Grid.keepRoadsConsistent does, a whole front of them at a time:
+    # the only road of a dead end is blocked, and the secs it led to are checked in the next round; secs on the border
+    # keep their two roads along it so never show up; with whole fronts generating stays under half a second only up to
+    # about 3000x3000 lots and takes 0.7 to 1.4 seconds at 5000x5000 (see the README and bench.generate)
+    cols = roads.shape[1] - 1
+    cells = roads.reshape(-1)
+    # the four roads of a sec, only ever blocked (0) or active (1) here, are read as one little-endian word with a byte
+    # per direction, so a dead end is a sec whose word is a power of two
+    words = roads.view('<u4').reshape(-1)
+    single = lambda ids, around: ids[(around & (around - 1) == 0) & (around != 0)]
+    # the byte of the single road gives its direction, e/n/w/s being bytes 0 to 3 of the word, and with it the flat index
+    # of the next sec that way and the cell of the same road seen from there
+    direction = lambda word: (word >= 1 << 8).view(np.uint8) + (word >= 1 << 16).view(np.uint8) + (word >= 1 << 24).view(np.uint8)
+    nextSecs = np.array([row * (cols + 1) + col for row, col in Sec.STEPS])
+    opposite = (np.arange(4) + 2) % 4
+    secIds = np.concatenate([single(np.arange(start, min(start + BAND, len(words))), words[start:start + BAND]) for start in range(0, len(words), BAND)])
+    while len(secIds):
+        # two dead ends on the same road both block it, which leaves both empty, and a sec listed twice is cleared twice alike
+        directions = direction(words[secIds])
+        words[secIds] = 0
+        secIds = secIds + nextSecs[directions]
+        cells[secIds * 4 + opposite[directions]] = Sec.BLOCKED
+        secIds = single(secIds, words[secIds])
+
+@profiled('generate.generate')
+def generate(rows: int, cols: int, generator: str='uniform', seed: int=None) -> dict:
+    # a consistent layout in the form Grid.dump gives and Grid.load takes, the same seed gives the same layout
+    population, hor, ver = GENERATORS[generator](np.random.default_rng(seed), rows, cols)
+    roads = blockRoads(rows, cols, hor, ver)
+    pruneDeadEnds(roads)
+    return {'lots': population, 'secs': roads}
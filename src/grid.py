@@ -1,185 +1,356 @@
 # grid
 
-from random import randint, choice
+from random import choice
 from collections import deque
+from contextlib import contextmanager
+import numpy as np
 
-from src.util import distance, flatten
+from src.util import distances
+from src.index import GridIndex
+from src.transfer import transfer
+from src.change import Change
 from src.sec import Sec
 from src.lot import Lot
+from src.generate import generate
+from src.profiler import profiled
 
 class Grid(object):
 
     def __init__(self, rows: int, cols: int, baseX: int, baseY: int, size: int) -> None:
         self.shape = (rows, cols)
         self.basePos = (baseX, baseY)
-        # init lots
+        self.size = size
+        # init lots, population of lot (row, col) lives at [row, col]
         Lot.LOT_SIZE = size
-        self.lots = [[
-            Lot(self, (row, col), baseX + col * size, baseY + row * size) for col in range(cols)
-        ] for row in range(rows)]
-        # init secs
-        self.secs = [[
-            Sec((row, col), baseX + col * size, baseY + row * size) for col in range(cols + 1)
-        ] for row in range(rows + 1)]
+        self.population = np.zeros((rows, cols), dtype=np.uint8)
+        # init secs, states of e/n/w/s of sec (row, col) live at [row, col, Sec.E/N/W/S]
+        self.roads = np.full((rows + 1, cols + 1, 4), Sec.ACTIVE, dtype=np.uint8)
+        # init spatial index
+        self.index = GridIndex(self.shape, self.basePos, size)
+        # init change listeners, and the change and consistency work held back by an open batch
+        self.listeners = list()
+        self.batched = self.deferred = None
+
+    def lot(self, row: int, col: int) -> Lot:
+        baseX, baseY = self.basePos
+        return Lot(self, (row, col), baseX + col * self.size, baseY + row * self.size)
+
+    def sec(self, row: int, col: int) -> Sec:
+        baseX, baseY = self.basePos
+        return Sec(self, (row, col), baseX + col * self.size, baseY + row * self.size)
+
+    @property
+    def lots(self) -> list:
+        rows, cols = self.shape
+        return [[self.lot(row, col) for col in range(cols)] for row in range(rows)]
+
+    @property
+    def secs(self) -> list:
+        rows, cols = self.shape
+        return [[self.sec(row, col) for col in range(cols + 1)] for row in range(rows + 1)]
     
+    @profiled('grid.getSecIdsByDistance')
+    def getSecIdsByDistance(self, base: tuple, dis: float) -> tuple:
+        # only the cells in the bounding range of the circle are measured, in row-major order
+        row0, row1, col0, col1 = self.index.secRange(base, dis)
+        rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+        baseX, baseY = self.basePos
+        inside = distances(base, baseX + cols * self.size, baseY + rows * self.size) < dis
+        return (rows[inside], cols[inside])
+
+    @profiled('grid.getLotIdsByDistance')
+    def getLotIdsByDistance(self, base: tuple, minDis: float, maxDis: float) -> tuple:
+        # only the cells in the bounding range of the circle are measured, sorted by distance (stable)
+        row0, row1, col0, col1 = self.index.lotRange(base, maxDis)
+        rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+        baseX, baseY = self.basePos
+        half = self.size // 2
+        dis = distances(base, baseX + cols * self.size + half, baseY + rows * self.size + half)
+        inside = (minDis < dis) & (dis < maxDis)
+        order = np.argsort(dis[inside], kind='stable')
+        return (rows[inside][order], cols[inside][order])
+
     def getSecsByDistance(self, base: tuple, dis: float) -> list:
-        return [sec for sec in flatten(self.secs) if distance(base, sec.pos) < dis]
+        rows, cols = self.getSecIdsByDistance(base, dis)
+        return [self.sec(row, col) for row, col in zip(rows.tolist(), cols.tolist())]
     
     def getLotsByDistance(self, base: tuple, minDis: float, maxDis: float) -> deque:
-        lotList = [(lot, d) for lot in flatten(self.lots) if minDis < (d := distance(base, lot.center)) < maxDis]
-        lotList.sort(key=lambda x: x[1])
-        return deque([x[0] for x in lotList])
+        rows, cols = self.getLotIdsByDistance(base, minDis, maxDis)
+        return deque(self.lot(row, col) for row, col in zip(rows.tolist(), cols.tolist()))
     
+    @profiled('grid.getNearestLot')
     def getNearestLot(self, base: tuple) -> Lot:
-        return min([(lot, distance(base, lot.center)) for lot in flatten(self.lots)], key=lambda x: x[1])[0]
+        row0, row1, col0, col1 = self.index.nearestLotRange(base)
+        rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+        baseX, baseY = self.basePos
+        half = self.size // 2
+        nearest = np.argmin(distances(base, baseX + cols * self.size + half, baseY + rows * self.size + half))
+        return self.lot(int(rows[nearest]), int(cols[nearest]))
     
     def getRoadsByDistance(self, base: tuple, dis: float) -> list:
-        secList = [sec for sec in flatten(self.secs) if distance(base, sec.pos) < dis]
+        secList = self.getSecsByDistance(base, dis)
         return [(secA, secB) for secA in secList for secB in secList]
 
-    def keepSecsConsistent(self) -> None:
+    @profiled('grid.keepSecsConsistent')
+    def keepSecsConsistent(self, change: Change=None, window: tuple=None) -> list:
+        # only roads within the window (row0, row1, col0, col1) of secs are checked, the whole grid by default
         rows, cols = self.shape
-        for row, col in ((i, j) for i in range(1, rows) for j in range(1, cols)):
-            sec = self.secs[row][col]
-            if sec.e: Sec.set2(sec, self.secs[row][col + 1], Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
-            if sec.n: Sec.set2(self.secs[row - 1][col], sec, Sec.ACTIVE, connection=Sec.VER_CONNECTED)
-            if sec.w: Sec.set2(self.secs[row][col - 1], sec, Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
-            if sec.s: Sec.set2(sec, self.secs[row + 1][col], Sec.ACTIVE, connection=Sec.VER_CONNECTED)
-
-    def keepRoadsConsistent(self) -> None:
-        valid = True
+        row0, row1, col0, col1 = (0, rows + 1, 0, cols + 1) if window is None else window
+        roads = self.roads[row0:row1, col0:col1].copy()
+        # a road claimed by either inner end becomes active on both ends
+        inner = np.zeros(roads.shape[:2] + (1,), dtype=bool)
+        inner[max(1 - row0, 0):rows - row0, max(1 - col0, 0):cols - col0] = True
+        claimed = (roads != Sec.BLOCKED) & inner
+        hor = claimed[:, :-1, Sec.E] | claimed[:, 1:, Sec.W]
+        ver = claimed[:-1, :, Sec.S] | claimed[1:, :, Sec.N]
+        before = roads.copy()
+        roads[:, :-1, Sec.E][hor] = roads[:, 1:, Sec.W][hor] = Sec.ACTIVE
+        roads[:-1, :, Sec.S][ver] = roads[1:, :, Sec.N][ver] = Sec.ACTIVE
+        self.roads[row0:row1, col0:col1] = roads
+        # record and return the changed intersections
+        changed = np.argwhere((before != roads).any(axis=2))
+        if change is not None: self.recordRoads(change, changed[:, 0] + row0, changed[:, 1] + col0, before[changed[:, 0], changed[:, 1]])
+        return (changed + (row0, col0)).tolist()
+
+    @profiled('grid.keepRoadsConsistent')
+    def keepRoadsConsistent(self, secIds: list=None, change: Change=None) -> Change:
+        rows, cols = self.shape
+        roads = self.roads
+        change = Change() if change is None else change
+        if self.deferred is not None and secIds is not None:
+            self.deferred.extend(secIds)
+            return change
+        # restore intersections on the border, after a local edit only those the edit touched
+        self.restoreBorder(*(self.borderIds if secIds is None else self.onBorder(change.secs)), change)
+        # start from the changed intersections, or from every dead end of the inner intersections
+        if secIds is None:
+            secIds = (np.argwhere(roads[1:-1, 1:-1].sum(axis=2) == 1) + 1).tolist()
+        workList = deque(secIds)
+        # block dead ends until none is left, spreading to the neighbours they leave as dead ends
+        while workList:
+            row, col = workList.popleft()
+            if not (0 < row < rows and 0 < col < cols) or int(roads[row, col].sum()) != 1: continue
+            direction = int(roads[row, col].argmax())
+            nextRow, nextCol = row + Sec.STEPS[direction][0], col + Sec.STEPS[direction][1]
+            opposite = (direction + 2) % 4
+            Change.record(change.edges, (row, col, direction), Sec.ACTIVE, Sec.BLOCKED)
+            Change.record(change.edges, (nextRow, nextCol, opposite), int(roads[nextRow, nextCol, opposite]), Sec.BLOCKED)
+            roads[row, col, direction] = roads[nextRow, nextCol, opposite] = Sec.BLOCKED
+            if int(roads[nextRow, nextCol].sum()) == 1: workList.append((nextRow, nextCol))
+        return change
+
+    @property
+    def borderIds(self) -> tuple:
+        rows, cols = self.shape
+        border = np.zeros((rows + 1, cols + 1), dtype=bool)
+        border[[0, -1], :] = border[:, [0, -1]] = True
+        return np.nonzero(border)
+
+    def onBorder(self, secIds: set) -> tuple:
+        rows, cols = self.shape
+        ids = np.array(sorted(secIds), dtype=int).reshape(-1, 2)
+        border = (ids[:, 0] == 0) | (ids[:, 0] == rows) | (ids[:, 1] == 0) | (ids[:, 1] == cols)
+        return (ids[border, 0], ids[border, 1])
+
+    def restoreBorder(self, secRows: np.ndarray, secCols: np.ndarray, change: Change) -> None:
+        # roads running along the border are always active
         rows, cols = self.shape
-        # restore intersections on the border
-        for row in range(rows):
-            Sec.set2(self.secs[row][0], self.secs[row + 1][0], Sec.ACTIVE, connection=Sec.VER_CONNECTED)
-            Sec.set2(self.secs[row][-1], self.secs[row + 1][-1], Sec.ACTIVE, connection=Sec.VER_CONNECTED)
-        for col in range(cols):
-            Sec.set2(self.secs[0][col], self.secs[0][col + 1], Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
-            Sec.set2(self.secs[-1][col], self.secs[-1][col + 1], Sec.ACTIVE, connection=Sec.HOR_CONNECTED)
-        # check inner intersections
-        for row, col in ((i, j) for i in range(1, rows) for j in range(1, cols)):
-            sec = self.secs[row][col]
-            if int(sec) != 1: continue
-            # check every direction
-            if sec.e: Sec.set2(sec, self.secs[row][col + 1], Sec.BLOCKED, connection=Sec.HOR_CONNECTED)
-            if sec.n: Sec.set2(self.secs[row - 1][col], sec, Sec.BLOCKED, connection=Sec.VER_CONNECTED)
-            if sec.w: Sec.set2(self.secs[row][col - 1], sec, Sec.BLOCKED, connection=Sec.HOR_CONNECTED)
-            if sec.s: Sec.set2(sec, self.secs[row + 1][col], Sec.BLOCKED, connection=Sec.VER_CONNECTED)
-            # set flag to invalid
-            valid = False
-        # loop until all valid
-        if not valid: self.keepRoadsConsistent()
+        before = self.roads[secRows, secCols]
+        after = before.copy()
+        vertical, horizontal = (secCols == 0) | (secCols == cols), (secRows == 0) | (secRows == rows)
+        after[vertical & (secRows > 0), Sec.N] = after[vertical & (secRows < rows), Sec.S] = Sec.ACTIVE
+        after[horizontal & (secCols > 0), Sec.W] = after[horizontal & (secCols < cols), Sec.E] = Sec.ACTIVE
+        self.roads[secRows, secCols] = after
+        self.recordRoads(change, secRows, secCols, before)
+
+    def subscribe(self, listener) -> None:
+        # listener(change) is called after every mutation that changed something
+        self.listeners.append(listener)
+
+    @profiled('grid.notify')
+    def notify(self, change: Change) -> Change:
+        if self.batched is not None:
+            self.batched.merge(change)
+        elif change:
+            for listener in self.listeners: listener(change)
+        return change
+
+    @contextmanager
+    def batch(self):
+        # edits inside share one road consistency pass and one notification, both at the end
+        if self.batched is not None:
+            yield
+            return
+        self.batched, self.deferred = Change(), list()
+        try:
+            yield
+        finally:
+            change, secIds = self.batched, self.deferred
+            self.batched = self.deferred = None
+            if secIds: self.keepRoadsConsistent(secIds, change)
+            self.notify(change)
+
+    def recordLots(self, change: Change, rows: np.ndarray, cols: np.ndarray, before: np.ndarray) -> None:
+        # record the given lots whose population differs from before
+        after = self.population[rows, cols]
+        for index in np.flatnonzero(after != before).tolist():
+            Change.record(change.lots, (int(rows[index]), int(cols[index])), int(before[index]), int(after[index]))
+
+    def recordRoads(self, change: Change, rows: np.ndarray, cols: np.ndarray, before: np.ndarray) -> None:
+        # record the sides of the given secs whose state differs from before
+        after = self.roads[rows, cols]
+        for index, direction in np.argwhere(after != before).tolist():
+            key = (int(rows[index]), int(cols[index]), direction)
+            Change.record(change.edges, key, int(before[index, direction]), int(after[index, direction]))
     
-    def repulseLots(self, base: tuple, innerRadius: int, outerRadius: int, amount: int) -> None:
-        innerLots = self.getLotsByDistance(base, 0, innerRadius)
-        outerLots = self.getLotsByDistance(base, innerRadius, outerRadius)
-        # prepare buffer
-        for lot in innerLots: lot.prepareBuffer(amount)
-        # transfer population
-        while len(innerLots) and len(outerLots):
-            srcLot, tarLot = innerLots.popleft(), outerLots.popleft()
-            srcDone, tarDone = Lot.transfer(srcLot, tarLot)
-            if not srcDone: innerLots.append(srcLot)
-            if not tarDone: outerLots.append(tarLot)
-        # restore buffer
-        for lot in innerLots: lot.restoreBuffer()
-
-    def attractLots(self, base: tuple, innerRadius: int, outerRadius: int, amount: int) -> None:
-        innerLots = self.getLotsByDistance(base, 0, innerRadius)
-        outerLots = self.getLotsByDistance(base, innerRadius, outerRadius)
-        # prepare buffer
-        for lot in outerLots: lot.prepareBuffer(amount)
-        # transfer population
-        while len(innerLots) and len(outerLots):
-            srcLot, tarLot = outerLots.popleft(), innerLots.popleft()
-            srcDone, tarDone = Lot.transfer(srcLot, tarLot)
-            if not srcDone: outerLots.append(srcLot)
-            if not tarDone: innerLots.append(tarLot)
-        # restore buffer
-        for lot in outerLots: lot.restoreBuffer()
+    def transferLots(self, srcIds: tuple, tarIds: tuple, amount: int) -> Change:
+        rows, cols = np.concatenate((srcIds[0], tarIds[0])), np.concatenate((srcIds[1], tarIds[1]))
+        before = self.population[rows, cols]
+        transfer(self.population, srcIds, tarIds, amount)
+        change = Change()
+        self.recordLots(change, rows, cols, before)
+        return self.notify(change)
+
+    @profiled('grid.repulseLots')
+    def repulseLots(self, base: tuple, innerRadius: int, outerRadius: int, amount: int) -> Change:
+        innerIds = self.getLotIdsByDistance(base, 0, innerRadius)
+        outerIds = self.getLotIdsByDistance(base, innerRadius, outerRadius)
+        return self.transferLots(innerIds, outerIds, amount)
+
+    @profiled('grid.attractLots')
+    def attractLots(self, base: tuple, innerRadius: int, outerRadius: int, amount: int) -> Change:
+        innerIds = self.getLotIdsByDistance(base, 0, innerRadius)
+        outerIds = self.getLotIdsByDistance(base, innerRadius, outerRadius)
+        return self.transferLots(outerIds, innerIds, amount)
     
-    def dragLots(self, innerBase: tuple, outerBase: tuple, innerRadius: int, outerRadius: int, amount: int) -> None:
-        innerLots = self.getLotsByDistance(innerBase, 0, innerRadius)
-        outerLots = self.getLotsByDistance(outerBase, 0, outerRadius)
-        # prepare buffer
-        for lot in innerLots: lot.prepareBuffer(amount)
-        # transfer population
-        while len(innerLots) and len(outerLots):
-            srcLot, tarLot = innerLots.popleft(), outerLots.popleft()
-            srcDone, tarDone = Lot.transfer(srcLot, tarLot)
-            if not srcDone: innerLots.append(srcLot)
-            if not tarDone: outerLots.append(tarLot)
-        # restore buffer
-        for lot in innerLots: lot.restoreBuffer()
+    @profiled('grid.dragLots')
+    def dragLots(self, innerBase: tuple, outerBase: tuple, innerRadius: int, outerRadius: int, amount: int) -> Change:
+        innerIds = self.getLotIdsByDistance(innerBase, 0, innerRadius)
+        outerIds = self.getLotIdsByDistance(outerBase, 0, outerRadius)
+        # lots inside both regions keep their own population, otherwise they would be both a source and a target
+        cols = self.shape[1]
+        outside = ~np.isin(outerIds[0] * cols + outerIds[1], innerIds[0] * cols + innerIds[1])
+        return self.transferLots(innerIds, (outerIds[0][outside], outerIds[1][outside]), amount)
+
+    def setRoads(self, roadList: list, state: int, change: Change) -> list:
+        # set the given pairs of secs and return the ids of the secs involved
+        secIds = sorted({sec.info.id for secPair in roadList for sec in secPair})
+        rows, cols = np.array(secIds, dtype=int).reshape(-1, 2).T
+        before = self.roads[rows, cols]
+        for secA, secB in roadList:
+            Sec.set2(secA, secB, state)
+        self.recordRoads(change, rows, cols, before)
+        return secIds
 
+    @profiled('grid.markRoads')
     def markRoads(self, base: tuple) -> list:
         secPairs = self.getRoadsByDistance(base, Lot.LOT_SIZE / 1.414)
-        for secA, secB in secPairs:
-            Sec.set2(secA, secB, Sec.FOCUSED)
+        change = Change()
+        self.setRoads(secPairs, Sec.FOCUSED, change)
+        self.notify(change)
         return secPairs
     
-    def breakRoads(self, base: tuple, radius: int, roadList: list) -> None:
-        roadList = roadList or self.getRoadsByDistance(base, radius)
-        for secA, secB in roadList:
-            Sec.set2(secA, secB, Sec.BLOCKED)
-        self.keepRoadsConsistent()
+    @profiled('grid.breakRoads')
+    def breakRoads(self, base: tuple, radius: int, roadList: list) -> Change:
+        change = Change()
+        if roadList:
+            # break the marked roads
+            secIds = self.setRoads(roadList, Sec.BLOCKED, change)
+        else:
+            # break every road with both ends inside the circle
+            row0, row1, col0, col1 = self.index.secRange(base, radius)
+            inside = np.zeros((row1 - row0, col1 - col0), dtype=bool)
+            rows, cols = self.getSecIdsByDistance(base, radius)
+            inside[rows - row0, cols - col0] = True
+            windowRows, windowCols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+            before = self.roads[windowRows, windowCols]
+            window = self.roads[row0:row1, col0:col1].copy()
+            hor, ver = inside[:, :-1] & inside[:, 1:], inside[:-1, :] & inside[1:, :]
+            window[:, :-1, Sec.E][hor] = window[:, 1:, Sec.W][hor] = Sec.BLOCKED
+            window[:-1, :, Sec.S][ver] = window[1:, :, Sec.N][ver] = Sec.BLOCKED
+            self.roads[row0:row1, col0:col1] = window
+            self.recordRoads(change, windowRows, windowCols, before)
+            secIds = zip(rows.tolist(), cols.tolist())
+        self.keepRoadsConsistent(secIds, change)
+        return self.notify(change)
 
-    def connectRoads(self, base: tuple, innerRadius: int, outerRadius: int, roadList: list) -> None:
+    @profiled('grid.connectRoads')
+    def connectRoads(self, base: tuple, innerRadius: int, outerRadius: int, roadList: list) -> Change:
+        change = Change()
         if roadList:
             # connect
-            for secA, secB in roadList:
-                Sec.set2(secA, secB, Sec.ACTIVE)
+            secIds = self.setRoads(roadList, Sec.ACTIVE, change)
         else:
             # rebuild
             styleList = [sec.get() for sec in self.getSecsByDistance(base, outerRadius)]
-            for sec in self.getSecsByDistance(base, innerRadius):
-                sec.set(*choice(styleList))
-            self.keepSecsConsistent()
-        self.keepRoadsConsistent()
-
-    def load(self, infoDict: dict) -> None:
-        # set lots
-        for row, info in enumerate(infoDict['lots']):
-            for col, population in enumerate(info):
-                self.lots[row][col].population = population
-        # set secs
-        for row, info in enumerate(infoDict['secs']):
-            for col, dir in enumerate(info):
-                self.secs[row][col].set(*dir)
-
-    def dump(self) -> None:
+            rows, cols = self.getSecIdsByDistance(base, innerRadius)
+            before = self.roads[rows, cols]
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                self.roads[row, col] = choice(styleList)
+            self.recordRoads(change, rows, cols, before)
+            # only roads leaving the rebuilt secs can disagree, so their neighbours bound the check
+            row0, row1, col0, col1 = self.index.secRange(base, innerRadius)
+            window = (max(row0 - 1, 0), min(row1 + 1, self.shape[0] + 1), max(col0 - 1, 0), min(col1 + 1, self.shape[1] + 1))
+            secIds = list(zip(rows.tolist(), cols.tolist())) + self.keepSecsConsistent(change, window)
+        self.keepRoadsConsistent(secIds, change)
+        return self.notify(change)
+
+    @profiled('grid.setCells')
+    def setCells(self, lotIds: np.ndarray, populations: np.ndarray, edgeIds: np.ndarray, states: np.ndarray) -> Change:
+        # write the given lots (K, 2) and edges (E, 3) of secs in bulk, as undo and redo do
+        change = Change()
+        rows, cols = lotIds[:, 0], lotIds[:, 1]
+        before = self.population[rows, cols]
+        self.population[rows, cols] = populations
+        self.recordLots(change, rows, cols, before)
+        # one direction at a time, a sec may appear once per direction
+        for direction in range(4):
+            ids = edgeIds[edgeIds[:, 2] == direction]
+            after = np.asarray(states)[edgeIds[:, 2] == direction]
+            before = self.roads[ids[:, 0], ids[:, 1], direction]
+            self.roads[ids[:, 0], ids[:, 1], direction] = after
+            for key, state, value in zip(ids.tolist(), before.tolist(), after.tolist()):
+                Change.record(change.edges, tuple(key), state, value)
+        return self.notify(change)
+
+    @profiled('grid.load')
+    def load(self, infoDict: dict) -> Change:
+        # set lots and secs in bulk
+        self.population[:] = infoDict['lots']
+        self.roads[:] = infoDict['secs']
+        return self.notify(Change(full=True))
+
+    def dump(self) -> dict:
         infoDict = dict()
-        infoDict['lots'] = [[col.population for col in row] for row in self.lots]
-        infoDict['secs'] = [[col.get() for col in row] for row in self.secs]
+        infoDict['lots'] = self.population.copy()
+        infoDict['secs'] = self.roads.copy()
         return infoDict
 
-    def randomize(self) -> None:
+    @profiled('grid.randomize')
+    def randomize(self, generator: str='uniform', seed: int=None) -> Change:
+        # a new layout from one of the generators in src/generate.py, reproducible with a seed
         rows, cols = self.shape
-        # randomize population
-        for row, col in ((i, j) for i in range(rows) for j in range(cols)):
-            self.lots[row][col].population = randint(0, Lot.POPULATION_MAX)
-        # set all intersections back to all-connected
-        for row, col in ((i, j) for i in range(rows + 1) for j in range(cols + 1)):
-            self.secs[row][col].set(Sec.ACTIVE, Sec.ACTIVE, Sec.ACTIVE, Sec.ACTIVE)
-        # randomize horizontal roads
-        for row, col in ((i, j) for i in range(1, rows) for j in range(cols)):
-            if not bool(randint(0, 100) > 30):
-                Sec.set2(self.secs[row][col], self.secs[row][col + 1], Sec.BLOCKED, connection=Sec.HOR_CONNECTED)
-        # randomize vertical roads
-        for row, col in ((i, j) for i in range(rows) for j in range(1, cols)):
-            if not bool(randint(0, 100) > 30):
-                Sec.set2(self.secs[row][col], self.secs[row + 1][col], Sec.BLOCKED, connection=Sec.VER_CONNECTED)
-        # keep consistency
-        self.keepRoadsConsistent()
+        return self.load(generate(rows, cols, generator, seed))
     
+    def roadStates(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # isRoad of the given lots in bulk, one column per direction e/n/w/s
+        roads = self.roads
+        return np.stack((
+            roads[rows, cols + 1, Sec.S] & roads[rows + 1, cols + 1, Sec.N],
+            roads[rows, cols, Sec.E] & roads[rows, cols + 1, Sec.W],
+            roads[rows, cols, Sec.S] & roads[rows + 1, cols, Sec.N],
+            roads[rows + 1, cols, Sec.E] & roads[rows + 1, cols + 1, Sec.W]
+        ), axis=-1)
+
     def isRoad(self, lotId: tuple, direction: str) -> int:
         row, col = lotId
+        roads = self.roads
         if direction == 'e':
-            return Sec.get2(self.secs[row][col + 1], self.secs[row + 1][col + 1], connection=Sec.VER_CONNECTED)
+            return int(roads[row, col + 1, Sec.S] & roads[row + 1, col + 1, Sec.N])
         if direction == 'n':
-            return Sec.get2(self.secs[row][col], self.secs[row][col + 1], connection=Sec.HOR_CONNECTED)
+            return int(roads[row, col, Sec.E] & roads[row, col + 1, Sec.W])
         if direction == 'w':
-            return Sec.get2(self.secs[row][col], self.secs[row + 1][col], connection=Sec.VER_CONNECTED)
+            return int(roads[row, col, Sec.S] & roads[row + 1, col, Sec.N])
         if direction == 's':
-            return Sec.get2(self.secs[row + 1][col], self.secs[row + 1][col + 1], connection=Sec.HOR_CONNECTED)
+            return int(roads[row + 1, col, Sec.E] & roads[row + 1, col + 1, Sec.W])
         return Sec.BLOCKED
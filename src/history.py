@@ -0,0 +1,95 @@
+# undo history
+
+from collections import deque, namedtuple
+import numpy as np
+
+from src.change import Change
+from src.profiler import profiled
+
+# one operation as the changed lots (K, 2) and edges (E, 3) with their values before and after, in compact arrays
+Delta = namedtuple('Delta', ['lotIds', 'lotBefore', 'lotAfter', 'edgeIds', 'edgeBefore', 'edgeAfter'])
+
+def toDelta(change: Change) -> Delta:
+    lots, edges = sorted(change.lots.items()), sorted(change.edges.items())
+    return Delta(
+        np.array([key for key, _ in lots], dtype=np.int32).reshape(-1, 2),
+        np.array([values[0] for _, values in lots], dtype=np.uint8),
+        np.array([values[1] for _, values in lots], dtype=np.uint8),
+        np.array([key for key, _ in edges], dtype=np.int32).reshape(-1, 3),
+        np.array([values[0] for _, values in edges], dtype=np.uint8),
+        np.array([values[1] for _, values in edges], dtype=np.uint8)
+    )
+
+def sizeOf(delta: Delta) -> int:
+    return sum(array.nbytes for array in delta)
+
+class History(object):
+
+    # undo and redo over the changes the grid reports, each costing O(changed cells) in time and memory
+    # changes gather in an open entry until commit(), a whole new layout (a full change) starts a new history
+    def __init__(self, grid, budget: int=16 << 20) -> None:
+        self.grid = grid
+        self.budget = budget
+        self.current = Change()
+        self.undoStack, self.redoStack = deque(), deque()
+        self.used = 0
+        self.replaying = False
+        grid.subscribe(self.record)
+
+    def record(self, change: Change) -> None:
+        if self.replaying: return
+        if change.full:
+            self.clear()
+            return
+        self.current.merge(change)
+
+    @profiled('history.commit')
+    def commit(self) -> bool:
+        # close the open entry as one undoable step, whatever the edit left unchanged is dropped
+        if not self.current: return False
+        delta, self.current = toDelta(self.current), Change()
+        self.undoStack.append(delta)
+        self.used += sizeOf(delta)
+        self.used -= sum(sizeOf(redone) for redone in self.redoStack)
+        self.redoStack.clear()
+        self.evict()
+        return True
+
+    def evict(self) -> None:
+        # oldest undo steps go first, then the redo steps furthest away
+        while self.used > self.budget and (self.undoStack or self.redoStack):
+            self.used -= sizeOf(self.undoStack.popleft() if self.undoStack else self.redoStack.popleft())
+
+    def clear(self) -> None:
+        self.current = Change()
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.used = 0
+
+    def apply(self, delta: Delta, undo: bool) -> Change:
+        self.replaying = True
+        try:
+            return self.grid.setCells(
+                delta.lotIds, delta.lotBefore if undo else delta.lotAfter,
+                delta.edgeIds, delta.edgeBefore if undo else delta.edgeAfter
+            )
+        finally:
+            self.replaying = False
+
+    @profiled('history.undo')
+    def undo(self) -> Change:
+        self.commit()
+        if not self.undoStack: return Change()
+        delta = self.undoStack.pop()
+        self.redoStack.append(delta)
+        return self.apply(delta, True)
+
+    @profiled('history.redo')
+    def redo(self) -> Change:
+        if self.current or not self.redoStack: return Change()
+        delta = self.redoStack.pop()
+        self.undoStack.append(delta)
+        return self.apply(delta, False)
+
+    def __repr__(self) -> str:
+        return f'History({len(self.undoStack)} undo, {len(self.redoStack)} redo, {self.used}/{self.budget} bytes)'
@@ -0,0 +1,42 @@
+# spatial index
+
+from math import floor
+
+class GridIndex(object):
+
+    # maps a canvas position and a radius to the range of cells that may lie inside the circle
+    def __init__(self, shape: tuple, basePos: tuple, size: int) -> None:
+        self.shape = shape
+        self.basePos = basePos
+        self.size = size
+
+    @staticmethod
+    def span(center: float, dis: float, offset: float, size: int, count: int) -> tuple:
+        # half-open range of indices i in [0, count) with |offset + i * size - center| < dis
+        lo = floor((center - dis - offset) / size)
+        hi = floor((center + dis - offset) / size) + 1
+        return (min(max(lo, 0), count), min(max(hi, 0), count))
+
+    def lotRange(self, base: tuple, dis: float) -> tuple:
+        rows, cols = self.shape
+        baseX, baseY = self.basePos
+        half = self.size // 2
+        row0, row1 = GridIndex.span(base[1], dis, baseY + half, self.size, rows)
+        col0, col1 = GridIndex.span(base[0], dis, baseX + half, self.size, cols)
+        return (row0, row1, col0, col1)
+
+    def secRange(self, base: tuple, dis: float) -> tuple:
+        rows, cols = self.shape
+        baseX, baseY = self.basePos
+        row0, row1 = GridIndex.span(base[1], dis, baseY, self.size, rows + 1)
+        col0, col1 = GridIndex.span(base[0], dis, baseX, self.size, cols + 1)
+        return (row0, row1, col0, col1)
+
+    def nearestLotRange(self, base: tuple) -> tuple:
+        # the nearest lot centers (ties included) lie within one cell of the rounded position
+        rows, cols = self.shape
+        baseX, baseY = self.basePos
+        half = self.size // 2
+        row = min(max(round((base[1] - baseY - half) / self.size), 0), rows - 1)
+        col = min(max(round((base[0] - baseX - half) / self.size), 0), cols - 1)
+        return (max(row - 1, 0), min(row + 2, rows), max(col - 1, 0), min(col + 2, cols))
@@ -0,0 +1,187 @@
+# level of detail
+
+import numpy as np
+
+from src.change import Change
+from src.lot import Lot
+from src.sec import Sec
+from src.scene import Camera, FACE_CORNERS, buildViewMat4, extrudeSlots, eyePosition, toCanvas
+from src.profiler import profiled
+
+class LodPyramid(object):
+
+    BLOCK = 2 # lots per side of a block, which merges into a block of the next level the same way
+    LOD_PIXELS = 24 # a block is split into its children while it may span more canvas pixels than this
+
+    # population sums and roads of blocks of lots, blocks of those and so on up to one block over the grid, level 0 being the lots:
+    # hor[level][row, col] runs along the north side of block (row, col), ver[level][row, col] along its west side,
+    # and a road runs along a side of a block whenever any road along that side is drawn, which drops the roads inside it;
+    # a change only updates the blocks over the lots and roads it touched, level by level
+    def __init__(self, grid, listen: bool=True) -> None:
+        self.grid = grid
+        self.rebuild()
+        if listen: grid.subscribe(self.gridChanged)
+
+    def rebuild(self) -> None:
+        roads, k = self.grid.roads, LodPyramid.BLOCK
+        self.shapes = [self.grid.shape]
+        self.sums = [self.grid.population]
+        self.hor = [(roads[:, :-1, Sec.E] & roads[:, 1:, Sec.W]) != 0]
+        self.ver = [(roads[:-1, :, Sec.S] & roads[1:, :, Sec.N]) != 0]
+        while max(self.shapes[-1]) > 1:
+            (lowRows, lowCols), sums, hor, ver = self.shapes[-1], self.sums[-1], self.hor[-1], self.ver[-1]
+            rows, cols = -(-lowRows // k), -(-lowCols // k)
+            padded = np.zeros((rows * k, cols * k), dtype=np.int64)
+            padded[:lowRows, :lowCols] = sums
+            self.sums.append(padded.reshape(rows, k, cols, k).sum(axis=(1, 3)))
+            # the sides of a block are the sides of the lower blocks along the block borders
+            padded = np.zeros((rows + 1, cols * k), dtype=bool)
+            padded[:, :lowCols] = hor[np.minimum(np.arange(rows + 1) * k, lowRows)]
+            self.hor.append(padded.reshape(rows + 1, cols, k).any(axis=2))
+            padded = np.zeros((rows * k, cols + 1), dtype=bool)
+            padded[:lowRows] = ver[:, np.minimum(np.arange(cols + 1) * k, lowCols)]
+            self.ver.append(padded.reshape(rows, k, cols + 1).any(axis=1))
+            self.shapes.append((rows, cols))
+
+    @profiled('lod.gridChanged')
+    def gridChanged(self, change: Change) -> None:
+        if change.full:
+            self.rebuild()
+            return
+        if not change: return
+        k, roads = LodPyramid.BLOCK, self.grid.roads
+        rows, cols = self.shapes[0]
+        lots = np.array(list(change.lots), dtype=int).reshape(-1, 2)
+        # the lot sides with a changed end, as indexed in hor and ver
+        horIds, verIds = set(), set()
+        for row, col, direction in change.edges:
+            if direction == Sec.E and col < cols: horIds.add((row, col))
+            if direction == Sec.W and col > 0: horIds.add((row, col - 1))
+            if direction == Sec.S and row < rows: verIds.add((row, col))
+            if direction == Sec.N and row > 0: verIds.add((row - 1, col))
+        horIds, verIds = (np.array(sorted(ids), dtype=int).reshape(-1, 2) for ids in (horIds, verIds))
+        self.hor[0][horIds[:, 0], horIds[:, 1]] = (roads[horIds[:, 0], horIds[:, 1], Sec.E] & roads[horIds[:, 0], horIds[:, 1] + 1, Sec.W]) != 0
+        self.ver[0][verIds[:, 0], verIds[:, 1]] = (roads[verIds[:, 0], verIds[:, 1], Sec.S] & roads[verIds[:, 0] + 1, verIds[:, 1], Sec.N]) != 0
+        for level in range(1, len(self.shapes)):
+            (lowRows, lowCols), (blockRows, blockCols) = self.shapes[level - 1], self.shapes[level]
+            lots = np.unique(lots // k, axis=0)
+            self.sums[level][lots[:, 0], lots[:, 1]] = self.childSums(level, lots[:, 0], lots[:, 1])
+            # sides of the lower level on a block border, the last border may be the end of the grid
+            horIds = horIds[(horIds[:, 0] % k == 0) | (horIds[:, 0] == lowRows)]
+            horIds = np.unique(np.stack((np.where(horIds[:, 0] % k == 0, horIds[:, 0] // k, blockRows), horIds[:, 1] // k), axis=1), axis=0)
+            self.hor[level][horIds[:, 0], horIds[:, 1]] = self.childSides(self.hor[level - 1], horIds[:, 0], horIds[:, 1], lowRows, lowCols)
+            verIds = verIds[(verIds[:, 1] % k == 0) | (verIds[:, 1] == lowCols)]
+            verIds = np.unique(np.stack((verIds[:, 0] // k, np.where(verIds[:, 1] % k == 0, verIds[:, 1] // k, blockCols)), axis=1), axis=0)
+            self.ver[level][verIds[:, 0], verIds[:, 1]] = self.childSides(self.ver[level - 1].T, verIds[:, 1], verIds[:, 0], lowCols, lowRows)
+
+    def childSums(self, level: int, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # population of the given blocks from the blocks of the level below
+        k, lower = LodPyramid.BLOCK, self.sums[level - 1]
+        lowRows, lowCols = lower.shape
+        childRows, childCols = (rows[:, None] * k + np.arange(k))[:, :, None], (cols[:, None] * k + np.arange(k))[:, None, :]
+        valid = (childRows < lowRows) & (childCols < lowCols)
+        values = lower[np.minimum(childRows, lowRows - 1), np.minimum(childCols, lowCols - 1)].astype(np.int64)
+        return np.where(valid, values, 0).sum(axis=(1, 2))
+
+    @staticmethod
+    def childSides(lower: np.ndarray, borders: np.ndarray, spans: np.ndarray, lowBorders: int, lowSpans: int) -> np.ndarray:
+        # whether any side of the level below along the given block sides is a road, borders across and spans along the sides
+        k = LodPyramid.BLOCK
+        childSpans = spans[:, None] * k + np.arange(k)
+        values = lower[np.minimum(borders * k, lowBorders)[:, None], np.minimum(childSpans, lowSpans - 1)]
+        return (values & (childSpans < lowSpans)).any(axis=1)
+
+    def footprints(self, level: int, rows: np.ndarray, cols: np.ndarray) -> tuple:
+        # x0, y0, x1, y1 of the given blocks, the last ones cut by the border
+        span, (gridRows, gridCols) = LodPyramid.BLOCK ** level * Lot.LOT_SIZE, self.shapes[0]
+        baseX, baseY = self.grid.basePos
+        return (
+            baseX + cols * span, baseY + rows * span,
+            baseX + np.minimum((cols + 1) * span, gridCols * Lot.LOT_SIZE), baseY + np.minimum((rows + 1) * span, gridRows * Lot.LOT_SIZE)
+        )
+
+    def reaches(self, footprints: tuple, camera: Camera) -> np.ndarray:
+        # whether anything as high as the tallest building on each footprint may show on the canvas
+        x0, y0, x1, y1 = footprints
+        corners = np.stack(np.broadcast_arrays(
+            np.where(np.arange(8) & 1, x1[:, None], x0[:, None]),
+            np.where(np.arange(8) & 2, y1[:, None], y0[:, None]),
+            np.where(np.arange(8) & 4, 2 * Lot.LOT_SIZE, 0),
+            1
+        ), axis=-1)
+        clip = (corners.reshape(-1, 4) @ buildViewMat4(camera).T).T.reshape(4, len(x0), 8)
+        # a box entirely behind the eye never shows, one reaching behind it may show anywhere
+        behind = clip[3] >= 0
+        across = behind.any(axis=1) & ~behind.all(axis=1)
+        clip[3][behind] = -1
+        points = toCanvas(clip, camera)[0]
+        low, high = points.min(axis=1), points.max(axis=1)
+        return across | (~behind.any(axis=1) & np.all(high >= 0, axis=-1) & (low[:, 0] < camera.width) & (low[:, 1] < camera.height))
+
+    @profiled('lod.select')
+    def select(self, camera: Camera) -> list:
+        # (level, rows, cols) of the blocks to draw from the top level down, a block is split while it may span more than
+        # LOD_PIXELS and may show on the canvas, None when every lot would be drawn, at full detail then
+        k, eye = LodPyramid.BLOCK, eyePosition(camera)
+        focal = camera.near * camera.width / (camera.right - camera.left)
+        rows, cols = np.zeros(1, dtype=int), np.zeros(1, dtype=int)
+        picked, whole = list(), True
+        for level in range(len(self.shapes) - 1, 0, -1):
+            footprints = self.footprints(level, rows, cols)
+            x0, y0, x1, y1 = footprints
+            # distance from the eye to the nearest point the block may take up
+            dis = np.sqrt(
+                np.maximum(np.maximum(x0 - eye[0], eye[0] - x1), 0) ** 2 + np.maximum(np.maximum(y0 - eye[1], eye[1] - y1), 0) ** 2 +
+                max(eye[2] - 2 * Lot.LOT_SIZE, 0) ** 2
+            )
+            shows = self.reaches(footprints, camera)
+            split = shows & (k ** level * Lot.LOT_SIZE * focal > LodPyramid.LOD_PIXELS * dis)
+            whole &= bool(split.all())
+            picked.append((level, rows[shows & ~split], cols[shows & ~split]))
+            # the children of the split blocks inside the grid
+            lowRows, lowCols = self.shapes[level - 1]
+            rows, cols = (ids.reshape(-1) for ids in np.broadcast_arrays(
+                (rows[split, None] * k + np.arange(k))[:, :, None], (cols[split, None] * k + np.arange(k))[:, None, :]
+            ))
+            inside = (rows < lowRows) & (cols < lowCols)
+            rows, cols = rows[inside], cols[inside]
+        picked.append((0, rows, cols))
+        return None if whole else picked
+
+    def surfaces(self, picked: list, showLot: bool, showRoad: bool, camera: Camera) -> tuple:
+        # shown quads of the picked blocks like buildSurfaces, owners index the blocks, with the drawing rank of each block
+        footprints, populations, roads = list(), list(), list()
+        for level, rows, cols in picked:
+            x0, y0, x1, y1 = self.footprints(level, rows, cols)
+            lots = (x1 - x0) * (y1 - y0) // Lot.LOT_SIZE ** 2
+            hor, ver = self.hor[level], self.ver[level]
+            footprints.append(np.stack((x0, y0, x1, y1)))
+            populations.append(self.sums[level][rows, cols].astype(np.int64) // np.maximum(lots, 1))
+            roads.append(np.stack((ver[rows, cols + 1], hor[rows, cols], ver[rows, cols], hor[rows + 1, cols]), axis=-1))
+        footprints, populations, roads = np.concatenate(footprints, axis=1), np.concatenate(populations), np.concatenate(roads)
+        slots, shown = extrudeSlots(*footprints, populations, roads, showLot, showRoad)
+        owners, kinds = np.nonzero(shown)
+        ranks = np.concatenate([self.ranks(level, rows, cols, camera) for level, rows, cols in picked])
+        return (slots[shown].astype(float), populations[owners], owners, kinds, ranks)
+
+    def ranks(self, level: int, rows: np.ndarray, cols: np.ndarray, camera: Camera) -> np.ndarray:
+        # back to front rank of the given blocks among blocks that split no block of one another, as select picks them:
+        # the children of a block are split apart by vertical planes, and nothing beyond a plane from the eye covers what is
+        # on the eye side, so children further from the eye child by lots (the child the eye is over, or the closest one)
+        # come first; the rank holds that digit for every block above, from the top, digits of lower levels left 0
+        k, eye = LodPyramid.BLOCK, eyePosition(camera)
+        digits = 2 * k - 1
+        baseX, baseY = self.grid.basePos
+        rank = np.zeros(len(rows), dtype=np.int64)
+        for upper in range(level, len(self.shapes) - 1):
+            span = k ** upper * Lot.LOT_SIZE
+            aboveRows, aboveCols = rows // k ** (upper - level), cols // k ** (upper - level)
+            eyeRows = np.clip(np.floor((eye[1] - baseY) / span - aboveRows // k * k), 0, k - 1)
+            eyeCols = np.clip(np.floor((eye[0] - baseX) / span - aboveCols // k * k), 0, k - 1)
+            apart = np.abs(aboveRows % k - eyeRows) + np.abs(aboveCols % k - eyeCols)
+            rank += (2 * (k - 1) - apart).astype(np.int64) * digits ** upper
+        return rank
+
+def blockOrder(owners: np.ndarray, kinds: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    # roads first as they lie flat on the ground, then the blocks back to front, the faces of a block facing the eye never overlap
+    return np.lexsort((ranks[owners], kinds < len(FACE_CORNERS)))
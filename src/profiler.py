@@ -0,0 +1,100 @@
+# profiler
+
+import csv
+import json
+from threading import Lock
+from functools import wraps
+from contextlib import contextmanager
+from time import perf_counter
+
+class Profiler(object):
+
+    # named timers (calls, total, max and last duration, inclusive of nested timers) and counters,
+    # recording nothing but a flag check while disabled, timers may run in the render worker too
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.timers = dict()
+            self.counters = dict()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                self.timers[name] = [1, seconds, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+                stats[3] = seconds
+
+    def count(self, name: str, amount: int=1) -> None:
+        if not self.enabled: return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def rows(self) -> list:
+        # one row per timer, slowest in total first, then one per counter
+        with self.lock:
+            timers = sorted(self.timers.items(), key=lambda item: -item[1][1])
+            counters = sorted(self.counters.items())
+        return [
+            {'name': name, 'kind': 'timer', 'calls': calls, 'total_ms': total * 1000, 'mean_ms': total / calls * 1000, 'max_ms': peak * 1000, 'last_ms': last * 1000, 'count': None}
+            for name, (calls, total, peak, last) in timers
+        ] + [
+            {'name': name, 'kind': 'counter', 'calls': None, 'total_ms': None, 'mean_ms': None, 'max_ms': None, 'last_ms': None, 'count': value}
+            for name, value in counters
+        ]
+
+    def overlay(self, lines: int=8) -> str:
+        # the timers costing the most so far and every counter, short enough for the info label
+        rows = self.rows()
+        timers = [row for row in rows if row['kind'] == 'timer'][:lines]
+        counters = [row for row in rows if row['kind'] == 'counter']
+        return '\n'.join(
+            [f'{row["name"]} {row["calls"]}x {row["mean_ms"]:.2f}ms (max {row["max_ms"]:.2f})' for row in timers] +
+            [f'{row["name"]} {row["count"]}' for row in counters]
+        )
+
+    def export(self, filename: str) -> None:
+        # csv for a .csv file name, json otherwise
+        rows = self.rows()
+        with open(filename, 'w', newline='') as f:
+            if filename.endswith('.csv'):
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['name'])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, f, indent=1)
+
+# the profiler the app and the grid report to
+PROFILER = Profiler()
+
+def profiled(name: str):
+    # decorator timing every call of a function under name while the profiler is enabled
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled: return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, perf_counter() - start)
+        return wrapper
+    return decorate
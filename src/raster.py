@@ -0,0 +1,154 @@
+# offscreen rasterizer
+
+import struct
+import zlib
+import numpy as np
+
+from src.lod import LodPyramid, blockOrder
+from src.lot import Lot
+from src.sec import Sec
+from src.scene import Camera, DepthOrder, buildRects, buildSurfaces, cullSurfaces
+
+WHITE, BLACK, GREY, MAGENTA = (255, 255, 255), (0, 0, 0), (190, 190, 190), (255, 0, 255)
+DEPTH_ORDER = DepthOrder()
+
+class Raster(object):
+
+    CHUNK_PIXELS = 1 << 22 # pixels of rectangles listed at a time
+
+    # an RGB image the views can be drawn into without a display
+    def __init__(self, width: int, height: int, background: tuple=WHITE) -> None:
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels[:] = background
+
+    @property
+    def size(self) -> tuple:
+        return (self.pixels.shape[1], self.pixels.shape[0])
+
+    def fillRects(self, rects: np.ndarray, colors: np.ndarray) -> None:
+        # rects (K, 4) as (x1, y1, x2, y2) with both corners included, painted in order; rects of the same size share the
+        # offsets of their pixels from the corner, so those are spread over a chunk of them at once
+        width, height = self.size
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        x0, y0 = (np.clip(np.floor(rects[:, axis]), 0, limit).astype(int) for axis, limit in ((0, width), (1, height)))
+        x1, y1 = (np.clip(np.ceil(rects[:, axis]) + 1, 0, limit).astype(int) for axis, limit in ((2, width), (3, height)))
+        sizes = np.stack((np.maximum(x1 - x0, 0), np.maximum(y1 - y0, 0)), axis=1)
+        painted = np.full(width * height, -1, dtype=np.int32)
+        sizeKeys = sizes[:, 0] * (height + 1) + sizes[:, 1]
+        order = np.argsort(sizeKeys, kind='stable')
+        for members in np.split(order, np.flatnonzero(np.diff(sizeKeys[order])) + 1):
+            spanX, spanY = sizes[members[0]].tolist() if len(members) else (0, 0)
+            if not spanX * spanY: continue
+            offsets = (np.arange(spanY)[:, None] * width + np.arange(spanX)).ravel()
+            for chunk in np.array_split(members, max(len(members) * len(offsets) // Raster.CHUNK_PIXELS, 1)):
+                pixels = (y0[chunk] * width + x0[chunk])[:, None] + offsets
+                np.maximum.at(painted, pixels.ravel(), np.repeat(chunk.astype(np.int32), len(offsets)))
+        self.paint(painted, colors)
+
+    def paint(self, painted: np.ndarray, palette: np.ndarray) -> None:
+        # painted holds the palette index of the last thing painted on every pixel, -1 where nothing was
+        pixels = np.flatnonzero(painted >= 0)
+        keys = painted[pixels]
+        for channel in range(3):
+            self.pixels.reshape(-1, 3)[:, channel][pixels] = palette[:, channel][keys]
+
+    def spread(self, counts: np.ndarray) -> tuple:
+        # owner and running index of every item when item i repeats counts[i] times
+        owners = np.repeat(np.arange(len(counts)), counts)
+        return (owners, np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts))
+
+    def fillPolygons(self, polygons: np.ndarray, colors: np.ndarray, outlines: np.ndarray) -> None:
+        # polygons (S, N, 2) painted in order, each filled and then outlined one pixel wide like a canvas polygon
+        width, height = self.size
+        corners = polygons.shape[1]
+        # scanlines crossing every convex polygon, at the pixel centers
+        top = np.clip(np.floor(polygons[..., 1].min(axis=1)), 0, height).astype(int)
+        bottom = np.clip(np.ceil(polygons[..., 1].max(axis=1)) + 1, 0, height).astype(int)
+        owners, index = self.spread(np.maximum(bottom - top, 0))
+        ys = top[owners] + index
+        left, right = np.full(len(owners), np.inf), np.full(len(owners), -np.inf)
+        for corner in range(corners):
+            start, end = polygons[owners, corner], polygons[owners, (corner + 1) % corners]
+            rise = end[:, 1] - start[:, 1]
+            crossing = ((start[:, 1] - ys - 0.5) * (end[:, 1] - ys - 0.5) <= 0) & (rise != 0)
+            x = start[:, 0] + (ys + 0.5 - start[:, 1]) * (end[:, 0] - start[:, 0]) / np.where(rise != 0, rise, 1)
+            left = np.where(crossing, np.minimum(left, x), left)
+            right = np.where(crossing, np.maximum(right, x), right)
+        # pixels whose centers lie inside the spans
+        first = np.clip(np.ceil(left - 0.5), 0, width).astype(int)
+        last = np.clip(np.floor(right - 0.5), -1, width - 1).astype(int)
+        spans, index = self.spread(np.maximum(last - first + 1, 0))
+        fillPixels, fillKeys = ys[spans] * width + first[spans] + index, 2 * owners[spans]
+        # outline every edge, sampled once per pixel along its longer axis
+        starts = polygons.reshape(-1, 2)
+        ends = np.roll(polygons, -1, axis=1).reshape(-1, 2)
+        steps = np.abs(ends - starts).max(axis=1).astype(int) + 1
+        segments, index = self.spread(steps)
+        t = (index / np.maximum(steps[segments] - 1, 1))[:, None]
+        xs, ys = np.moveaxis(np.floor(starts[segments] + (ends[segments] - starts[segments]) * t).astype(int), -1, 0)
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        linePixels, lineKeys = ys[inside] * width + xs[inside], 2 * (segments[inside] // corners) + 1
+        # the last thing painted on a pixel wins
+        painted = np.full(width * height, -1, dtype=np.int32)
+        np.maximum.at(painted, np.concatenate((fillPixels, linePixels)), np.concatenate((fillKeys, lineKeys)).astype(np.int32))
+        self.paint(painted, np.stack((np.asarray(colors, dtype=np.uint8), np.asarray(outlines, dtype=np.uint8)), axis=1).reshape(-1, 3))
+
+    def ppm(self) -> bytes:
+        width, height = self.size
+        return b'P6 %d %d 255\n' % (width, height) + self.pixels.tobytes()
+
+    def png(self) -> bytes:
+        width, height = self.size
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+        rows = np.concatenate((np.zeros((height, 1), dtype=np.uint8), self.pixels.reshape(height, -1)), axis=1)
+        return b''.join((
+            b'\x89PNG\r\n\x1a\n',
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+            chunk(b'IEND', b'')
+        ))
+
+    def save(self, filename: str) -> None:
+        # PNG or, for a .ppm name, binary PPM
+        with open(filename, 'wb') as f:
+            f.write(self.ppm() if filename.lower().endswith('.ppm') else self.png())
+
+def greys(populations: np.ndarray) -> np.ndarray:
+    return np.repeat(255 - np.asarray(populations, dtype=np.uint8)[:, None], 3, axis=1)
+
+def render2d(grid, showLot: bool=True, showRoad: bool=True, scale: float=1.0, maxPixels: int=None) -> Raster:
+    # same picture as View2d scaled down by scale, further when it would take more than maxPixels, the raster covers the
+    # grid with the same margin on every side and every rectangle keeps at least a pixel
+    baseX, baseY = grid.basePos
+    width, height = 2 * baseX + grid.shape[1] * Lot.LOT_SIZE, 2 * baseY + grid.shape[0] * Lot.LOT_SIZE
+    if maxPixels: scale = min(scale, (maxPixels / (width * height)) ** 0.5)
+    raster = Raster(max(int(width * scale), 1), max(int(height * scale), 1))
+    # the included far corners as the last pixel the scaled rectangle starts on
+    scaled = lambda rects: np.concatenate((rects[:, :2] * scale, (rects[:, 2:] + 1) * scale - 1), axis=1)
+    rows, cols = (ids.ravel() for ids in np.indices(grid.shape))
+    bodyRects, roadRects = buildRects(grid, rows, cols)
+    if showLot:
+        raster.fillRects(scaled(bodyRects), greys(grid.population[rows, cols]))
+    if showRoad:
+        states = grid.roadStates(rows, cols)
+        raster.fillRects(scaled(roadRects[states != 0]), np.where((states[states != 0] == Sec.FOCUSED)[:, None], MAGENTA, BLACK))
+    return raster
+
+def render3d(grid, camera: Camera=Camera(), showLot: bool=True, showRoad: bool=True) -> Raster:
+    # same picture as View3d, the surfaces left after culling painted back to front, distant lots merged into blocks
+    raster = Raster(camera.width, camera.height)
+    pyramid = LodPyramid(grid, listen=False)
+    picked = pyramid.select(camera)
+    if picked is None:
+        surfaces, populations, owners, kinds = buildSurfaces(grid, showLot, showRoad)
+        kept, points, depths = cullSurfaces(surfaces, kinds, camera)
+        order = DEPTH_ORDER.order(grid, owners[kept], kinds[kept], populations[kept], depths, camera)
+    else:
+        surfaces, populations, owners, kinds, ranks = pyramid.surfaces(picked, showLot, showRoad, camera)
+        kept, points, depths = cullSurfaces(surfaces, kinds, camera)
+        order = blockOrder(owners[kept], kinds[kept], ranks)
+    populations = populations[kept][order]
+    outlines = np.where((populations < Lot.POPULATION_MAX * 0.618)[:, None], BLACK, GREY)
+    raster.fillPolygons(points[order], greys(populations), outlines)
+    return raster
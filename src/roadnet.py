@@ -0,0 +1,268 @@
+# road network
+
+from collections import deque
+from time import perf_counter
+import numpy as np
+
+from src.change import Change
+from src.sec import Sec
+from src.profiler import profiled
+
+def labelComponents(hor: np.ndarray, ver: np.ndarray) -> np.ndarray:
+    # smallest flat sec index of the component of every sec: secs joined along a row are one run from the start,
+    # then the runs joined across rows hook roots onto smaller roots until stable, roads already inside one component
+    # are dropped after every round; every run points straight at a root between rounds, so only the hooked roots
+    # jump pointers before one more jump brings the rest along
+    shape = (hor.shape[0], ver.shape[1])
+    starts = np.ones(shape, dtype=bool)
+    starts[:, 1:] = ~hor
+    runStarts = np.flatnonzero(starts)
+    runs = np.cumsum(starts, axis=None, dtype=np.int32) - 1
+    # of the roads between the same two runs only the first is kept
+    joins = ver.copy()
+    joins[:, 1:] &= ~(ver[:, :-1] & hor[:-1] & hor[1:])
+    joins = np.flatnonzero(joins)
+    u, v = runs[joins], runs[joins + shape[1]]
+    parent = np.arange(len(runStarts), dtype=np.int32)
+    while True:
+        pu, pv = parent[u], parent[v]
+        differ = pu != pv
+        if not differ.any(): break
+        u, v, pu, pv = u[differ], v[differ], pu[differ], pv[differ]
+        high = np.maximum(pu, pv)
+        np.minimum.at(parent, high, np.minimum(pu, pv))
+        hooked = np.zeros(len(parent), dtype=bool)
+        hooked[high] = True
+        moving = np.flatnonzero(hooked)
+        while len(moving):
+            parent[moving] = grand = parent[parent[moving]]
+            moving = moving[parent[grand] != grand]
+        parent = parent[parent]
+    return runStarts[parent[runs]].reshape(shape)
+
+class DistanceField(object):
+
+    PENDING = -1 # what reach returns when the deadline passed before the search met the goal
+
+    # road distances from one sec, found one breadth-first level at a time over the whole frontier, only as far as queries need
+    # east and south hold whether a road leaves each sec that way, the west and north roads are those of the previous sec,
+    # which wraps around to the last col or row where no road leaves; they are shared with the network, not copied
+    def __init__(self, east: np.ndarray, south: np.ndarray, start: tuple) -> None:
+        width = east.shape[1]
+        east, south = east.ravel(), south.ravel()
+        self.width = width
+        self.steps = ((east, 0, 1), (south, -width, -width), (east, -1, -1), (south, 0, width))
+        self.distances = np.full(east.shape, -1, dtype=np.int32)
+        self.frontier = np.array([start[0] * width + start[1]])
+        self.distances[self.frontier] = self.level = 0
+
+    def reach(self, goal: tuple, deadline: float=None) -> int:
+        # distance to the goal, None when the search ran out without meeting it, PENDING when it is still going at the deadline
+        goal = goal[0] * self.width + goal[1]
+        while self.distances[goal] < 0 and len(self.frontier):
+            if deadline is not None and perf_counter() > deadline: return DistanceField.PENDING
+            self.level += 1
+            frontier = np.concatenate([self.frontier[mask[self.frontier + road]] + offset for mask, road, offset in self.steps])
+            self.frontier = np.unique(frontier[self.distances[frontier] < 0])
+            self.distances[self.frontier] = self.level
+        return None if self.distances[goal] < 0 else int(self.distances[goal])
+
+class RoadNetwork(object):
+
+    # connected components of the roads (secs joined by roads drawn on both ends) and the lots they serve,
+    # kept up to date from the changes the grid reports instead of relabelling the whole grid:
+    # a new road relabels the smaller of the components it joins, a removed road searches from both of its ends at once
+    # and relabels the side that runs out first, so the work follows the smaller side
+    # the main network is the one of the border roads, which are always active, a lot is served when a road of it runs along one of its sides
+    # the whole grid is only labelled on the first query after a full change, until then the network is stale and follows no changes
+    def __init__(self, grid) -> None:
+        self.grid = grid
+        self.version = 0
+        self.stale = True
+        self.field = None
+        grid.subscribe(self.gridChanged)
+
+    def current(self):
+        if self.stale: self.rebuild()
+        return self
+
+    def rebuild(self) -> None:
+        rows, cols = self.grid.shape
+        roads = np.asarray(self.grid.roads)
+        # hor[row, col] joins sec (row, col) to (row, col + 1), ver[row, col] joins it to (row + 1, col),
+        # both are views of sec sized arrays whose last col or row has no road, which distance fields read directly
+        self.east, self.south = np.zeros((rows + 1, cols + 1), dtype=bool), np.zeros((rows + 1, cols + 1), dtype=bool)
+        self.hor, self.ver = self.east[:, :-1], self.south[:-1, :]
+        self.hor[:] = (roads[:, :-1, Sec.E] & roads[:, 1:, Sec.W]) != 0
+        self.ver[:] = (roads[:-1, :, Sec.S] & roads[1:, :, Sec.N]) != 0
+        self.labels = labelComponents(self.hor, self.ver)
+        # labels of later components are handed out past the sec indices, the size table doubles when they run out
+        self.sizes = np.bincount(self.labels.ravel(), minlength=2 * (rows + 1) * (cols + 1))
+        self.nextLabel = (rows + 1) * (cols + 1)
+        self.networks = int((self.sizes > 1).sum())
+        self.main = int(self.labels[0, 0])
+        # as serves does for every lot at once, both ends of a road share a label so its first end tells the network
+        onMain = self.labels == self.main
+        hor, ver = self.hor & onMain[:, :-1], self.ver & onMain[:-1, :]
+        self.served = hor[:-1] | hor[1:] | ver[:, :-1] | ver[:, 1:]
+        self.cutOff = int((~self.served).sum())
+        self.field = None
+        self.stale = False
+        self.version += 1
+
+    def serves(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # whether a road of the main network runs along the n, s, w or e side of the given lots
+        labels, main = self.labels, self.main
+        return (
+            self.hor[rows, cols] & (labels[rows, cols] == main) |
+            self.hor[rows + 1, cols] & (labels[rows + 1, cols] == main) |
+            self.ver[rows, cols] & (labels[rows, cols] == main) |
+            self.ver[rows, cols + 1] & (labels[rows, cols + 1] == main)
+        )
+
+    def present(self, axis: int, row: int, col: int) -> bool:
+        roads = self.grid.roads
+        if axis == 0: return bool(roads[row, col, Sec.E] & roads[row, col + 1, Sec.W])
+        return bool(roads[row, col, Sec.S] & roads[row + 1, col, Sec.N])
+
+    def neighbours(self, row: int, col: int) -> list:
+        # secs joined to the given one, e/n/w/s
+        rows, cols = self.grid.shape
+        found = list()
+        if col < cols and self.hor[row, col]: found.append((row, col + 1))
+        if row > 0 and self.ver[row - 1, col]: found.append((row - 1, col))
+        if col > 0 and self.hor[row, col - 1]: found.append((row, col - 1))
+        if row < rows and self.ver[row, col]: found.append((row + 1, col))
+        return found
+
+    def touchedRoads(self, change: Change) -> set:
+        # (axis, row, col) of the roads with a changed end, as indexed in hor (axis 0) and ver (axis 1)
+        rows, cols = self.grid.shape
+        touched = set()
+        for row, col, direction in change.edges:
+            if direction == Sec.E and col < cols: touched.add((0, row, col))
+            elif direction == Sec.W and col > 0: touched.add((0, row, col - 1))
+            elif direction == Sec.S and row < rows: touched.add((1, row, col))
+            elif direction == Sec.N and row > 0: touched.add((1, row - 1, col))
+        return touched
+
+    @profiled('roadnet.gridChanged')
+    def gridChanged(self, change: Change) -> None:
+        if change.full or self.stale:
+            self.stale, self.field = True, None
+            return
+        removed, added = list(), list()
+        for axis, row, col in sorted(self.touchedRoads(change)):
+            present = self.present(axis, row, col)
+            if present != (self.hor if axis == 0 else self.ver)[row, col]:
+                (added if present else removed).append((axis, row, col))
+        if not removed and not added: return
+        # removals first, so the labels always match the roads applied so far
+        touched = set()
+        for axis, row, col in removed:
+            (self.hor if axis == 0 else self.ver)[row, col] = False
+            ends = ((row, col), (row, col + 1) if axis == 0 else (row + 1, col))
+            touched.update(ends)
+            touched.update(self.split(*ends))
+        for axis, row, col in added:
+            (self.hor if axis == 0 else self.ver)[row, col] = True
+            ends = ((row, col), (row, col + 1) if axis == 0 else (row + 1, col))
+            touched.update(ends)
+            touched.update(self.join(*ends))
+        # lots around the touched secs, or all of them when the main network itself was relabelled
+        if int(self.labels[0, 0]) != self.main:
+            self.main = int(self.labels[0, 0])
+            lotRows, lotCols = (ids.ravel() for ids in np.indices(self.grid.shape))
+        else:
+            secs = np.array(sorted(touched), dtype=int).reshape(-1, 2)
+            lots = np.unique(np.concatenate([secs - offset for offset in ((0, 0), (0, 1), (1, 0), (1, 1))]), axis=0)
+            rows, cols = self.grid.shape
+            lots = lots[(lots[:, 0] >= 0) & (lots[:, 0] < rows) & (lots[:, 1] >= 0) & (lots[:, 1] < cols)]
+            lotRows, lotCols = lots[:, 0], lots[:, 1]
+        before = self.served[lotRows, lotCols]
+        after = self.serves(lotRows, lotCols)
+        self.served[lotRows, lotCols] = after
+        self.cutOff += int(before.sum()) - int(after.sum())
+        self.version += 1
+
+    def relabel(self, members: list, label: int) -> None:
+        rows, cols = np.array(members, dtype=int).reshape(-1, 2).T
+        self.labels[rows, cols] = label
+
+    def newLabel(self) -> int:
+        if self.nextLabel == len(self.sizes):
+            self.sizes = np.concatenate((self.sizes, np.zeros_like(self.sizes)))
+        self.nextLabel += 1
+        return self.nextLabel - 1
+
+    def split(self, a: tuple, b: tuple) -> list:
+        # after the road between a and b went away, search from both ends in turn until they meet or one side runs out
+        seen, queues = ({a}, {b}), (deque([a]), deque([b]))
+        while True:
+            for side in (0, 1):
+                if not queues[side]:
+                    return self.separate(list(seen[side]), len(seen[side]))
+                for node in self.neighbours(*queues[side].popleft()):
+                    if node in seen[1 - side]: return []
+                    if node not in seen[side]:
+                        seen[side].add(node)
+                        queues[side].append(node)
+
+    def separate(self, members: list, size: int) -> list:
+        # give the side that ran out a component of its own
+        old = int(self.labels[members[0]])
+        label = self.newLabel()
+        self.relabel(members, label)
+        self.networks -= int(self.sizes[old] > 1)
+        self.sizes[old] -= size
+        self.sizes[label] = size
+        self.networks += int(self.sizes[old] > 1) + int(size > 1)
+        return members
+
+    def join(self, a: tuple, b: tuple) -> list:
+        # after a road between a and b appeared, move the smaller of their components over to the larger one
+        labelA, labelB = int(self.labels[a]), int(self.labels[b])
+        if labelA == labelB: return []
+        if self.sizes[labelA] > self.sizes[labelB]: a, b, labelA, labelB = b, a, labelB, labelA
+        members, queue = {a}, deque([a])
+        while queue:
+            for node in self.neighbours(*queue.popleft()):
+                if node not in members and self.labels[node] == labelA:
+                    members.add(node)
+                    queue.append(node)
+        members = list(members)
+        self.relabel(members, labelB)
+        self.networks -= int(self.sizes[labelA] > 1) + int(self.sizes[labelB] > 1)
+        self.sizes[labelB] += self.sizes[labelA]
+        self.sizes[labelA] = 0
+        self.networks += 1
+        return members
+
+    def nearestSec(self, base: tuple) -> tuple:
+        # the nearest corner with a road of the lot under the given canvas position, None when it has none
+        rows, cols = self.grid.shape
+        baseX, baseY = self.grid.basePos
+        size = self.grid.size
+        x, y = (base[0] - baseX) / size, (base[1] - baseY) / size
+        row, col = min(max(int(np.floor(y)), 0), rows - 1), min(max(int(np.floor(x)), 0), cols - 1)
+        corners = sorted(((r - y) ** 2 + (c - x) ** 2, (r, c)) for r in (row, row + 1) for c in (col, col + 1))
+        return next((sec for _, sec in corners if self.neighbours(*sec)), None)
+
+    def lotServed(self, lotId: tuple) -> bool:
+        return bool(self.current().served[lotId])
+
+    @profiled('roadnet.roadDistance')
+    def roadDistance(self, source: tuple, target: tuple, deadline: float=None) -> int:
+        # roads on a shortest route between the secs nearest to two canvas positions, None when no route joins them,
+        # DistanceField.PENDING when the search has not met the target by the deadline, the next call carries on
+        # the distances from a source are kept until the roads change, so moving the target only extends them
+        self.current()
+        start, goal = self.nearestSec(source), self.nearestSec(target)
+        if start is None or goal is None or self.labels[start] != self.labels[goal]: return None
+        if self.field is None or self.field[0] != (start, self.version):
+            self.field = ((start, self.version), DistanceField(self.east, self.south, start))
+        return self.field[1].reach(goal, deadline)
+
+    def __repr__(self) -> str:
+        if self.stale: return 'RoadNetwork(stale)'
+        return f'RoadNetwork({self.networks} networks, {self.cutOff} lots cut off)'
@@ -0,0 +1,268 @@
+# 3d scene
+
+from threading import Lock
+from collections import namedtuple, OrderedDict
+import numpy as np
+
+from src.lot import Lot
+from src.util import buildProjectionMat4, buildRotationMat4, buildTranslationMat4, extend2homo
+from src.profiler import profiled
+
+Camera = namedtuple('Camera', ['viewAngle', 'near', 'far', 'bottom', 'top', 'left', 'right', 'width', 'height'],
+    defaults=(5.58, 3200, 4000, 600, 1400, -520, 520, 800, 800))
+
+# corners of the building faces (left, right, front, back, top), each vertex picks (east, south, roof)
+FACE_CORNERS = np.array([
+    [(0, 0, 0), (0, 1, 0), (0, 1, 1), (0, 0, 1)],
+    [(1, 0, 0), (1, 1, 0), (1, 1, 1), (1, 0, 1)],
+    [(0, 1, 0), (1, 1, 0), (1, 1, 1), (0, 1, 1)],
+    [(0, 0, 0), (1, 0, 0), (1, 0, 1), (0, 0, 1)],
+    [(0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+], dtype=bool)
+# ends of the roads around a lot (e, n, w, s), each vertex picks (east, south), a road is a flat quad
+ROAD_CORNERS = np.array([
+    [(1, 0), (1, 0), (1, 1), (1, 1)],
+    [(0, 0), (0, 0), (1, 0), (1, 0)],
+    [(0, 0), (0, 0), (0, 1), (0, 1)],
+    [(0, 1), (0, 1), (1, 1), (1, 1)]
+], dtype=bool)
+# the two ends of the road rectangles around a lot in 2d (e, n, w, s)
+ROAD_ENDS = ROAD_CORNERS[:, 1:3]
+COLORS = [Lot.colorOf(population) for population in range(Lot.POPULATION_MAX + 1)]
+
+def extrudeSlots(x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray, population: np.ndarray, roads: np.ndarray, showLot: bool, showRoad: bool) -> np.ndarray:
+    # every possible quad of the footprints [x0, x1) x [y0, y1), building faces as high as the population then roads (e, n, w, s),
+    # with a mask of the shown ones
+    margin = Lot.LOT_MARGIN
+    x0, y0, x1, y1 = (ends[:, None, None] for ends in (x0, y0, x1, y1))
+    # building faces
+    height = (2 * Lot.LOT_SIZE * population // Lot.POPULATION_MAX)[:, None, None]
+    faces = np.stack(np.broadcast_arrays(
+        np.where(FACE_CORNERS[..., 0], x1 - margin - 1, x0 + margin),
+        np.where(FACE_CORNERS[..., 1], y1 - margin - 1, y0 + margin),
+        np.where(FACE_CORNERS[..., 2], height, 0)
+    ), axis=-1)
+    # road quads on the ground
+    roadQuads = np.stack(np.broadcast_arrays(
+        np.where(ROAD_CORNERS[..., 0], x1 - 1, x0),
+        np.where(ROAD_CORNERS[..., 1], y1 - 1, y0),
+        0
+    ), axis=-1)
+    # mark the visible ones
+    shown = np.concatenate((
+        np.full((len(population), len(FACE_CORNERS)), showLot),
+        roads.astype(bool) & showRoad
+    ), axis=1)
+    return (np.concatenate((faces, roadQuads), axis=1), shown)
+
+def buildSlots(grid, showLot: bool, showRoad: bool, rows: np.ndarray, cols: np.ndarray) -> tuple:
+    # every possible quad of the given lots, building faces then roads, with a mask of the shown ones
+    baseX, baseY = grid.basePos
+    size = Lot.LOT_SIZE
+    x, y = baseX + cols * size, baseY + rows * size
+    population = grid.population[rows, cols].astype(np.int64)
+    slots, shown = extrudeSlots(x, y, x + size, y + size, population, grid.roadStates(rows, cols), showLot, showRoad)
+    return (slots, shown, population)
+
+def buildSurfaces(grid, showLot: bool, showRoad: bool, rows: np.ndarray=None, cols: np.ndarray=None) -> tuple:
+    # shown quads of the given lots (all by default) in lot order, with their population, owner index and slot
+    if rows is None: rows, cols = (ids.ravel() for ids in np.indices(grid.shape))
+    slots, shown, population = buildSlots(grid, showLot, showRoad, rows, cols)
+    owners, kinds = np.nonzero(shown)
+    return (slots[shown].astype(float), population[owners], owners, kinds)
+
+def buildRects(grid, rows: np.ndarray, cols: np.ndarray) -> tuple:
+    # 2d rectangles (x0, y0, x1, y1) of the given lots, a body per lot and a road per edge
+    baseX, baseY = grid.basePos
+    margin, size = Lot.LOT_MARGIN, Lot.LOT_SIZE
+    x, y = (baseX + cols * size)[:, None], (baseY + rows * size)[:, None]
+    bodyRects = np.hstack((x + margin, y + margin, x + size - margin - 1, y + size - margin - 1))
+    roadRects = np.stack(np.broadcast_arrays(
+        np.where(ROAD_ENDS[..., 0], x[..., None] + size - 1, x[..., None]),
+        np.where(ROAD_ENDS[..., 1], y[..., None] + size - 1, y[..., None])
+    ), axis=-1).reshape(-1, 4, 4)
+    return (bodyRects, roadRects)
+
+class MeshCache(object):
+
+    BAND_ROWS = 16
+
+    # quads cached per lot in bands of rows, a lot is rebuilt when its population or roads change; every frame drawn at
+    # full detail takes every band, so the cache holds the bands of one frame, no more, and is cleared with the layout
+    def __init__(self) -> None:
+        self.bands = dict()
+        self.layout = None
+        self.rebuilt = 0
+
+    @staticmethod
+    def signature(grid, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # population and the 4 road states packed in one integer per lot
+        states = grid.roadStates(rows, cols).astype(np.int64)
+        return grid.population[rows, cols].astype(np.int64) | (states << np.array([8, 10, 12, 14])).sum(axis=-1)
+
+    def band(self, grid, showLot: bool, showRoad: bool, row: int) -> tuple:
+        rows, cols = (ids.ravel() for ids in np.indices((min(MeshCache.BAND_ROWS, grid.shape[0] - row), grid.shape[1])))
+        rows = rows + row
+        signature = MeshCache.signature(grid, rows, cols)
+        if row in self.bands:
+            cached = self.bands[row]
+            stale = np.flatnonzero(cached[0] != signature)
+            if not len(stale): return cached
+            # rebuild the stale lots only
+            slots, shown, population = cached[1].copy(), cached[2].copy(), cached[3].copy()
+            slots[stale], shown[stale], population[stale] = buildSlots(grid, showLot, showRoad, rows[stale], cols[stale])
+        else:
+            stale = rows
+            slots, shown, population = buildSlots(grid, showLot, showRoad, rows, cols)
+            slots = slots.astype(np.float32)
+        self.rebuilt += len(stale)
+        owners, kinds = np.nonzero(shown)
+        cached = (signature, slots, shown, population, slots[shown], population[owners], owners + row * grid.shape[1], kinds)
+        self.bands[row] = cached
+        return cached
+
+    @profiled('scene.build')
+    def build(self, grid, showLot: bool, showRoad: bool) -> tuple:
+        # same result as buildSurfaces over the whole grid
+        layout = (id(grid), grid.shape, grid.basePos, Lot.LOT_SIZE, Lot.LOT_MARGIN, showLot, showRoad)
+        if layout != self.layout:
+            self.bands.clear()
+            self.layout = layout
+        self.rebuilt = 0
+        bands = [self.band(grid, showLot, showRoad, row) for row in range(0, grid.shape[0], MeshCache.BAND_ROWS)]
+        return tuple(np.concatenate([band[index] for band in bands]) for index in (4, 5, 6, 7))
+
+def buildCameraMat4(camera: Camera) -> np.ndarray:
+    # rotate around the canvas center, switch y and z and move in front of the camera, the eye ends up at the origin
+    centerX, centerY = camera.width // 2, camera.height // 2
+    rotate = buildTranslationMat4(centerX, centerY, 0) @ buildRotationMat4(-camera.viewAngle) @ buildTranslationMat4(-centerX, -centerY, 0)
+    switchYZ = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
+    trans = buildTranslationMat4(-camera.width // 2, -camera.top * 0.618, -(camera.near + camera.height))
+    return trans @ switchYZ @ rotate
+
+def buildViewMat4(camera: Camera) -> np.ndarray:
+    # camera transform and projection, all in one
+    project = buildProjectionMat4(camera.near, camera.far, camera.bottom, camera.top, camera.left, camera.right)
+    return project @ buildCameraMat4(camera)
+
+def eyePosition(camera: Camera) -> np.ndarray:
+    # where the eye stands in grid space (x, y, height)
+    return np.linalg.inv(buildCameraMat4(camera))[:3, 3]
+
+def clipSurfaces(surfaces: np.ndarray, camera: Camera) -> np.ndarray:
+    # homogeneous clip coordinates (4, S, 4) of the quad corners, x, y, z and w first, in one flat product
+    clip = extend2homo(surfaces.reshape(-1, 3)) @ buildViewMat4(camera).T
+    return clip.T.reshape(4, *surfaces.shape[:2])
+
+def toCanvas(clip: np.ndarray, camera: Camera) -> tuple:
+    # canvas coordinates (S, 4, 2) and average depth (S,) from clip coordinates
+    x, y, z, w = clip
+    points = np.stack((
+        -x / w * (camera.width // 2) + camera.width // 2,
+        y / w * (camera.height // 2) + camera.bottom
+    ), axis=-1)
+    return (points, (z / w).mean(axis=-1))
+
+def projectSurfaces(surfaces: np.ndarray, camera: Camera) -> tuple:
+    # canvas coordinates (S, 4, 2) and average depth (S,) of the quads
+    return toCanvas(clipSurfaces(surfaces, camera), camera)
+
+# the axis each slot faces along (x, y, height) and in which direction
+FACING_AXES = np.array([0, 0, 1, 1, 2, 2, 2, 2, 2])
+FACING_SIGNS = np.array([-1, 1, 1, -1, 1, 1, 1, 1, 1])
+
+def cornerBounds(values: np.ndarray) -> tuple:
+    # lowest and highest of the 4 corners of each quad, pairwise as reducing such a short axis is several times slower
+    return (
+        np.minimum(np.minimum(values[:, 0], values[:, 1]), np.minimum(values[:, 2], values[:, 3])),
+        np.maximum(np.maximum(values[:, 0], values[:, 1]), np.maximum(values[:, 2], values[:, 3]))
+    )
+
+@profiled('scene.cullSurfaces')
+def cullSurfaces(surfaces: np.ndarray, kinds: np.ndarray, camera: Camera) -> tuple:
+    # indices of the quads worth drawing with their canvas coordinates and average depth
+    # a quad is dropped when it faces away from the eye (any wall the eye is not in front of, tops and roads seen from below),
+    # when it has no area (the walls of empty lots), when any corner is behind the eye or when it lies entirely off the canvas
+    eye = eyePosition(camera)
+    axes = FACING_AXES[kinds]
+    corners = surfaces[np.arange(len(surfaces)), 0, axes]
+    kept = FACING_SIGNS[kinds] * (eye[axes] - corners) > 0
+    kept &= (kinds >= len(FACE_CORNERS) - 1) | (surfaces[:, 2, 2] > 0)
+    kept = np.flatnonzero(kept)
+    # only the facing quads are projected, the camera looks down its negative z axis so w is negative in front of the eye
+    clip = clipSurfaces(surfaces[kept], camera)
+    front = cornerBounds(clip[3])[1] < 0
+    kept, clip = kept[front], clip[:, front]
+    points, depths = toCanvas(clip, camera)
+    low, high = cornerBounds(points)
+    shown = np.all(high >= 0, axis=-1) & (low[:, 0] < camera.width) & (low[:, 1] < camera.height)
+    return (kept[shown], points[shown], depths[shown])
+
+class DepthOrder(object):
+
+    CAPACITY = 16 # eye cells
+    SLOTS = len(FACE_CORNERS) + len(ROAD_CORNERS)
+    ROADS = np.arange(len(FACE_CORNERS), SLOTS)
+
+    # back-to-front order of the quads of a grid worked out from the cell the eye stands over instead of sorting depths:
+    # roads lie flat on the ground and go first, then the lots stepping towards the eye along rows and then cols
+    # (a lot can only be hidden by lots no further from the eye on both axes), each with its far walls, near walls and top
+    def __init__(self, capacity: int=CAPACITY) -> None:
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.lock = Lock()
+        self.sorted = 0
+
+    @staticmethod
+    def towards(count: int, eye: int) -> np.ndarray:
+        # indices in [0, count) from the furthest to the one the eye is over, from both ends when the eye is inside
+        if eye <= 0: return np.arange(count)[::-1]
+        if eye >= count - 1: return np.arange(count)
+        near, far = np.arange(eye), np.arange(count - 1, eye, -1)
+        merged = np.empty(count - 1, dtype=int)
+        # the longer side leads until both sides are as far from the eye
+        lead = len(far) - len(near)
+        merged[:abs(lead)] = far[:lead] if lead > 0 else near[:-lead]
+        rest = np.stack((far[max(lead, 0):], near[max(-lead, 0):]), axis=1).ravel()
+        merged[abs(lead):] = rest
+        return np.append(merged, eye)
+
+    def layout(self, shape: tuple, eyeRow: int, eyeCol: int) -> np.ndarray:
+        # (lot, slot) positions in drawing order for an eye over the given cell, outside the grid that is one per quadrant
+        key = (shape, eyeRow, eyeCol)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        rows, cols = shape
+        lots = (DepthOrder.towards(rows, eyeRow)[:, None] * cols + DepthOrder.towards(cols, eyeCol)).ravel()
+        # the west wall is the far one when the eye is further east, and the north wall when it is further south
+        farX = (np.sign(eyeCol - lots % cols) < 0).astype(int)
+        farY = np.where(np.sign(eyeRow - lots // cols) < 0, 2, 3)
+        faces = np.stack((farX, farY, 1 - farX, 5 - farY, np.full_like(farX, 4)), axis=1)
+        dtype = np.int32 if rows * cols * DepthOrder.SLOTS < 1 << 31 else np.int64
+        positions = np.concatenate((
+            (np.arange(rows * cols)[:, None] * DepthOrder.SLOTS + DepthOrder.ROADS).ravel(),
+            (lots[:, None] * DepthOrder.SLOTS + faces).ravel()
+        )).astype(dtype)
+        with self.lock:
+            self.cache[key] = positions
+            while len(self.cache) > self.capacity: self.cache.popitem(last=False)
+        return positions
+
+    @profiled('scene.order')
+    def order(self, grid, owners: np.ndarray, kinds: np.ndarray, populations: np.ndarray, depths: np.ndarray, camera: Camera) -> np.ndarray:
+        # indices of the quads back to front, sorting the depths only when the eye is not above every roof
+        eye = eyePosition(camera)
+        if eye[2] <= 2 * Lot.LOT_SIZE * int(populations.max(initial=0)) // Lot.POPULATION_MAX:
+            self.sorted += 1
+            return np.argsort(depths, kind='stable')
+        rows, cols = grid.shape
+        baseX, baseY = grid.basePos
+        eyeRow = min(max(int(np.floor((eye[1] - baseY) / Lot.LOT_SIZE)), -1), rows)
+        eyeCol = min(max(int(np.floor((eye[0] - baseX) / Lot.LOT_SIZE)), -1), cols)
+        positions = self.layout(grid.shape, eyeRow, eyeCol)
+        index = np.full(rows * cols * DepthOrder.SLOTS, -1, dtype=positions.dtype)
+        index[owners * DepthOrder.SLOTS + kinds] = np.arange(len(owners), dtype=positions.dtype)
+        order = index[positions]
+        return order[order >= 0]
@@ -0,0 +1,44 @@
+# draw scheduler
+
+from time import perf_counter
+
+from src.profiler import profiled
+
+class Scheduler(object):
+
+    # runs draw calls for a list of items in order on the Tk loop, as many per tick as fit in the time budget
+    # starting a new run or cancelling drops whatever the current run has not drawn yet
+    def __init__(self, widget, budget: float=0.008, interval: int=16) -> None:
+        self.widget = widget
+        self.budget = budget
+        self.interval = interval
+        self.job = None
+        self.items, self.draw, self.done, self.index = list(), None, None, 0
+
+    @property
+    def running(self) -> bool:
+        return self.job is not None
+
+    def start(self, items: list, draw, done=None) -> None:
+        # draw(item) for every item, then done()
+        self.cancel()
+        self.items, self.draw, self.done, self.index = items, draw, done, 0
+        self.job = self.widget.after(0, self.tick)
+
+    @profiled('scheduler.tick')
+    def tick(self) -> None:
+        deadline = perf_counter() + self.budget
+        while self.index < len(self.items):
+            self.draw(self.items[self.index])
+            self.index += 1
+            if perf_counter() > deadline: break
+        if self.index < len(self.items):
+            self.job = self.widget.after(self.interval, self.tick)
+        else:
+            done = self.done
+            self.job, self.items, self.draw, self.done = None, list(), None, None
+            if done: done()
+
+    def cancel(self) -> None:
+        if self.job is not None: self.widget.after_cancel(self.job)
+        self.job, self.items, self.draw, self.done = None, list(), None, None
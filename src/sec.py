@@ -2,21 +2,35 @@
 
 from collections import namedtuple
 
+def edgeProperty(direction: int) -> property:
+    # read and write one direction of the intersection straight from the grid array
+    def getter(self) -> int:
+        return int(self.grid.roads[self.info.id + (direction,)])
+    def setter(self, state: int) -> None:
+        self.grid.roads[self.info.id + (direction,)] = state
+    return property(getter, setter)
+
 class Sec(object):
 
     BLOCKED, ACTIVE, FOCUSED = 0, 1, 2
     NOT_CONNECTED, HOR_CONNECTED, VER_CONNECTED = 0, 1, 2
+    E, N, W, S = 0, 1, 2, 3
+    STEPS = ((0, 1), (-1, 0), (0, -1), (1, 0)) # (row, col) offsets of the neighbours at e/n/w/s
     Info = namedtuple('Info', ['id', 'x', 'y'])
+    __slots__ = ('grid', 'info')
 
-    def __init__(self, id: tuple, x: int, y: int) -> None:
-        self.set(Sec.ACTIVE, Sec.ACTIVE, Sec.ACTIVE, Sec.ACTIVE)
+    # a sec is a view over grid.roads[row, col], which holds the states of e/n/w/s
+    def __init__(self, grid, id: tuple, x: int, y: int) -> None:
+        self.grid = grid
         self.info = Sec.Info(id, x, y)
-    
+
+    e, n, w, s = edgeProperty(E), edgeProperty(N), edgeProperty(W), edgeProperty(S)
+
     def set(self, e: int, n: int, w: int, s: int) -> None:
-        self.e, self.n, self.w, self.s = e, n, w, s
+        self.grid.roads[self.info.id] = (e, n, w, s)
     
     def get(self) -> tuple:
-        return (self.e, self.n, self.w, self.s)
+        return tuple(int(state) for state in self.grid.roads[self.info.id])
     
     @staticmethod
     def comb(secA, secB) -> tuple:
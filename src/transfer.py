@@ -0,0 +1,45 @@
+# population transfer
+
+import numpy as np
+
+from src.lot import Lot
+
+def roundRobin(buffers: np.ndarray, capacities: np.ndarray) -> None:
+    # the pairing of the original deques, leaving in place what every lot has left: the heads of both queues swap as much
+    # as the smaller of the two holds, and whichever still holds some goes to the back of its queue, until one runs empty;
+    # sources and targets play alike, so a round pairs each lot of the shorter queue with one of the longer queue
+    amounts, queues = (buffers, capacities), [np.arange(len(buffers)), np.arange(len(capacities))]
+    while len(queues[0]) and len(queues[1]):
+        short = int(len(queues[1]) < len(queues[0]))
+        long, width = 1 - short, len(queues[short])
+        shortIds, longIds = queues[short], queues[long]
+        left = amounts[short][shortIds]
+        # rounds that every lot of the shorter queue outlasts keep both queues in order, so run them all at once
+        rows = len(longIds) // width
+        taken = np.cumsum(amounts[long][longIds[:rows * width]].reshape(rows, width), axis=0)
+        outlast = (taken < left).all(axis=1)
+        whole = rows if outlast.all() else int(np.argmin(outlast))
+        if whole:
+            amounts[short][shortIds] = left - taken[whole - 1]
+            amounts[long][longIds[:whole * width]] = 0
+            queues[long] = longIds[whole * width:]
+            continue
+        # then one round pair by pair, the rest of either lot going to the back of its queue
+        pairIds = longIds[:width]
+        moved = np.minimum(left, amounts[long][pairIds])
+        amounts[short][shortIds] = left - moved
+        amounts[long][pairIds] -= moved
+        queues[short] = shortIds[amounts[short][shortIds] > 0]
+        queues[long] = np.concatenate((longIds[width:], pairIds[amounts[long][pairIds] > 0]))
+
+def transfer(population: np.ndarray, srcIds: tuple, tarIds: tuple, amount: int) -> None:
+    # move amount% of every source into the targets, both given as disjoint index arrays in distance order
+    srcPop = population[srcIds].astype(np.int64)
+    tarPop = population[tarIds].astype(np.int64)
+    # prepare buffer
+    buffers = srcPop * amount // 100
+    left, capacities = buffers.copy(), Lot.POPULATION_MAX - tarPop
+    # transfer population, whatever is not taken from the buffer stays with its source
+    roundRobin(left, capacities)
+    population[srcIds] = srcPop - buffers + left
+    population[tarIds] = Lot.POPULATION_MAX - capacities
@@ -0,0 +1,71 @@
+# ubfile
+
+import io
+import os
+import struct
+import pickle
+import numpy as np
+
+from src.lot import Lot
+
+# version 1 layout, little endian:
+#   header      magic, version, rows, cols, padded to 16 bytes
+#   lots        rows * cols population as uint8, row-major
+#   secs        (rows + 1) * (cols + 1) * 4 edge states as bits (e/n/w/s of every sec, row-major), packed big-endian
+# focused roads are a transient mark of the 2d view and are stored as active
+MAGIC, VERSION = b'UBRS', 1
+HEADER = struct.Struct('<4sHxxII')
+HEADER_SIZE = 16
+
+def blockSizes(rows: int, cols: int) -> tuple:
+    return (rows * cols, ((rows + 1) * (cols + 1) * 4 + 7) // 8)
+
+def read(filename: str, mmap: bool=False) -> dict:
+    # binary files in bulk, optionally with the population mapped instead of read; anything else is taken as a legacy pickle
+    with open(filename, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+        if not head.startswith(MAGIC):
+            f.seek(0)
+            return readLegacy(f)
+        magic, version, rows, cols = HEADER.unpack(head[:HEADER.size])
+        if version > VERSION:
+            raise ValueError(f'{filename} has version {version}, this build reads up to {VERSION}')
+        lotBytes, secBytes = blockSizes(rows, cols)
+        if os.fstat(f.fileno()).st_size < HEADER_SIZE + lotBytes + secBytes:
+            raise ValueError(f'{filename} is truncated')
+        if mmap:
+            lots = np.memmap(filename, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(rows, cols))
+            f.seek(HEADER_SIZE + lotBytes)
+        else:
+            lots = np.frombuffer(f.read(lotBytes), dtype=np.uint8)
+        packed = np.frombuffer(f.read(secBytes), dtype=np.uint8)
+    secs = np.unpackbits(packed, count=(rows + 1) * (cols + 1) * 4).reshape(rows + 1, cols + 1, 4)
+    return {'lots': lots.reshape(rows, cols), 'secs': secs}
+
+def write(filename: str, infoDict: dict) -> None:
+    lots = np.asarray(infoDict['lots'], dtype=np.uint8)
+    secs = np.asarray(infoDict['secs'], dtype=np.uint8)
+    rows, cols = lots.shape
+    if secs.shape != (rows + 1, cols + 1, 4):
+        raise ValueError(f'secs of shape {secs.shape} do not match lots of shape {lots.shape}')
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, cols).ljust(HEADER_SIZE, b'\x00'))
+        f.write(np.ascontiguousarray(lots).tobytes())
+        f.write(np.packbits(secs != 0).tobytes())
+
+class LegacyUnpickler(pickle.Unpickler):
+
+    # old files only hold dicts, lists, tuples and ints, so any class lookup means the file is not one of ours
+    def find_class(self, module: str, name: str) -> None:
+        raise pickle.UnpicklingError(f'refusing to load {module}.{name} from a .ub file')
+
+def readLegacy(f: io.BufferedIOBase) -> dict:
+    infoDict = LegacyUnpickler(f).load()
+    if not isinstance(infoDict, dict) or not {'lots', 'secs'} <= infoDict.keys():
+        raise ValueError('not an urban brush file')
+    # populations over the maximum were saved by the old overlapping drag, they are read wide and capped
+    lots = np.clip(np.array(infoDict['lots'], dtype=np.int64), 0, Lot.POPULATION_MAX).astype(np.uint8)
+    secs = np.array(infoDict['secs'], dtype=np.uint8)
+    if lots.ndim != 2 or secs.shape != (lots.shape[0] + 1, lots.shape[1] + 1, 4):
+        raise ValueError('not an urban brush file')
+    return {'lots': lots, 'secs': secs}
@@ -1,25 +1,17 @@
 # utils
 
+from math import sqrt
 import numpy as np
 
 def distance(u: tuple, v: tuple) -> float:
-    return sum((a - b) ** 2 for a, b in zip(u, v)) ** 0.5
+    return sqrt(sum((a - b) ** 2 for a, b in zip(u, v)))
 
-def flatten(multiList: list) -> list:
-    if not multiList: return []
-    if isinstance(multiList[0], list):
-        flattened = flatten(multiList[0])
-    else:
-        flattened = multiList[:1]
-    return flattened + flatten(multiList[1:])
+def distances(base: tuple, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    # vectorized distance, rounds exactly like distance
+    return np.sqrt((xs - base[0]) ** 2 + (ys - base[1]) ** 2)
 
-def extend2homo(posList: list) -> list:
-    if not posList: return []
-    if isinstance(posList[0], list):
-        extended = [extend2homo(posList[0])]
-    else:
-        extended = [np.array((*posList[0], 1))]
-    return extended + extend2homo(posList[1:])
+def extend2homo(posArray: np.ndarray) -> np.ndarray:
+    return np.concatenate((posArray, np.ones(posArray.shape[:-1] + (1,))), axis=-1)
 
 def buildRotationMat4(deg: float) -> np.ndarray:
     return np.array([
@@ -1,113 +1,354 @@
 # 2d view
 
 from random import shuffle
+from math import hypot
+from time import perf_counter
+import numpy as np
 import tkinter as tk
 
-from src.util import flatten
+from src.change import Change
+from src.sec import Sec
+from src.roadnet import DistanceField
+from src.scene import COLORS, buildRects
+from src.viewport import Viewport
+from src.profiler import PROFILER, profiled
 
 class View2d(object):
 
+    STROKE_TICK = 33 # ms between the stamps of a held brush
+    STROKE_STAMPS = 8 # most stamps per tick, a fast stroke spaces them further apart
+    WINDOW_MARGIN = 0.25 # canvases of items created around the visible ones, a pan within them only moves items
+    INFO_TICK = 16 # ms from a mouse move to the readout, moves in between share it
+    INFO_BUDGET = 0.008 # seconds a readout may spend on the road distance, a longer search carries on in the next tick
+
     def __init__(self, master) -> None:
         self.master = master
         self.leftClickPos = None
         self.rightClickPos = None
+        self.routeStart = self.infoPos = None
+        self.infoStale = False
+        self.infoJob = None
         self.roadBuffer = list()
+        self.strokePos = self.strokeTarget = self.strokeJob = None
+        self.panPos = None
+        self.lotItems = self.roadItems = self.window = None
+        self.pending = Change()
+        self.viewport = Viewport(self.master.grid, self.master.CANVAS_W, self.master.CANVAS_H)
+        self.master.grid.subscribe(self.gridChanged)
 
     def activate(self) -> None:
         self.master.canvas.bind('<Motion>', self.mouseMove)
         self.master.canvas.bind('<Button-1>', self.leftClick)
-        self.master.canvas.bind('<ButtonRelease-1>', lambda _:_)
+        self.master.canvas.bind('<B1-Motion>', self.leftDrag)
+        self.master.canvas.bind('<ButtonRelease-1>', self.leftRelease)
         self.master.canvas.bind('<Button-2>', self.rightClick)
+        self.master.canvas.bind('<MouseWheel>', lambda event: self.zoom(event, event.delta > 0))
+        self.master.canvas.bind('<Button-4>', lambda event: self.zoom(event, True))
+        self.master.canvas.bind('<Button-5>', lambda event: self.zoom(event, False))
 
+    @profiled('view2d.render')
     def render(self) -> None:
+        canvas = self.master.canvas
+        if self.master.showAnimation.get():
+            self.renderAnimated()
+        elif self.lotItems is None or not self.lotItems.size or not canvas.type(int(self.lotItems.flat[0])) or not self.covers():
+            self.createItems()
+        else:
+            self.updateItems()
+
+    @profiled('view2d.renderAnimated')
+    def renderAnimated(self) -> None:
         canvas = self.master.canvas
         canvas.delete('all')
-        lotList = flatten(self.master.grid.lots)
+        self.lotItems = self.roadItems = None
+        grid, toCanvas = self.master.grid, lambda rect: self.viewport.toCanvasRects(rect).tolist()
+        row0, row1, col0, col1 = self.viewport.visibleLots()
+        lotList = [grid.lot(row, col) for row in range(row0, row1) for col in range(col0, col1)]
         def drawPolygon(lot) -> None:
             if self.master.showLot.get():
-                canvas.create_rectangle(lot.bodyRect, fill=lot.color, width=0)
+                canvas.create_rectangle(toCanvas(lot.bodyRect), fill=lot.color, width=0)
+                PROFILER.count('canvas.items')
             if self.master.showRoad.get():
                 for roadRect, focused in lot.roadRect:
-                    canvas.create_rectangle(roadRect, fill='magenta' if focused else 'black', width=0)
-        def renderJob() -> None:
-            if lotList:
-                drawPolygon(lotList.pop())
-                canvas.after(1, renderJob)
-            else:
-                canvas.after_cancel(job)
-        if self.master.showAnimation.get():
-            shuffle(lotList)
-            job = canvas.after(1, renderJob)
+                    canvas.create_rectangle(toCanvas(roadRect), fill='magenta' if focused else 'black', width=0)
+                    PROFILER.count('canvas.items')
+        shuffle(lotList)
+        self.master.scheduler.start(lotList, drawPolygon)
+
+    @profiled('view2d.createItems')
+    def createItems(self) -> None:
+        # create a body item per lot and a road item per lot edge of the window around the visible lots, closed roads stay hidden
+        canvas = self.master.canvas
+        canvas.delete('all')
+        grid = self.master.grid
+        row0, row1, col0, col1 = self.window = self.viewport.visibleLots(View2d.WINDOW_MARGIN)
+        shape = (row1 - row0, col1 - col0)
+        rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
+        self.drawnPopulation = grid.population[row0:row1, col0:col1].copy()
+        self.drawnRoads = grid.roadStates(rows, cols).reshape(shape + (4,))
+        self.pending = Change()
+        self.shown = (self.master.showLot.get(), self.master.showRoad.get())
+        # compute rectangles
+        bodyRects, roadRects = (self.viewport.toCanvasRects(rects).tolist() for rects in buildRects(grid, rows, cols))
+        # create items
+        lotState = tk.NORMAL if self.shown[0] else tk.HIDDEN
+        lotItems, roadItems = list(), list()
+        for bodyRect, roadRect, population, roads in zip(bodyRects, roadRects, self.drawnPopulation.ravel().tolist(), self.drawnRoads.reshape(-1, 4).tolist()):
+            lotItems.append(canvas.create_rectangle(bodyRect, fill=COLORS[population], width=0, state=lotState, tags='lot'))
+            for rect, state in zip(roadRect, roads):
+                roadItems.append(canvas.create_rectangle(rect, width=0, **self.roadStyle(state)))
+        self.lotItems = np.array(lotItems, dtype=int).reshape(shape)
+        self.roadItems = np.array(roadItems, dtype=int).reshape(shape + (4,))
+        PROFILER.count('canvas.items', len(lotItems) + len(roadItems))
+
+    @profiled('view2d.updateItems')
+    def updateItems(self) -> None:
+        # reconfigure only the items whose lot or road changed since they were drawn
+        canvas = self.master.canvas
+        grid = self.master.grid
+        # switch the item states when a checkbox changed, closed roads stay hidden
+        shown = (self.master.showLot.get(), self.master.showRoad.get())
+        if shown[0] != self.shown[0]:
+            canvas.itemconfigure('lot', state=tk.NORMAL if shown[0] else tk.HIDDEN)
+        if shown[1] != self.shown[1]:
+            canvas.itemconfigure('road', state=tk.NORMAL if shown[1] else tk.HIDDEN)
+            canvas.itemconfigure('closed', state=tk.HIDDEN)
+        self.shown = shown
+        # only look at the lots of the window the grid reported since the last render
+        row0, row1, col0, col1 = self.window
+        if self.pending.full:
+            rows, cols = (ids.ravel() for ids in np.mgrid[row0:row1, col0:col1])
         else:
-            for lot in lotList:
-                drawPolygon(lot)
+            rows, cols = np.array(sorted(self.pending.touchedLots(grid.shape)), dtype=int).reshape(-1, 2).T
+            inside = (rows >= row0) & (rows < row1) & (cols >= col0) & (cols < col1)
+            rows, cols = rows[inside], cols[inside]
+        self.pending = Change()
+        itemRows, itemCols = rows - row0, cols - col0
+        population = grid.population[rows, cols]
+        changed = np.flatnonzero(population != self.drawnPopulation[itemRows, itemCols])
+        for item, population in zip(self.lotItems[itemRows[changed], itemCols[changed]].tolist(), population[changed].tolist()):
+            canvas.itemconfigure(item, fill=COLORS[population])
+        self.drawnPopulation[itemRows, itemCols] = grid.population[rows, cols]
+        roads = grid.roadStates(rows, cols)
+        changed, directions = np.nonzero(roads != self.drawnRoads[itemRows, itemCols])
+        items = self.roadItems[itemRows[changed], itemCols[changed], directions]
+        for item, state in zip(items.tolist(), roads[changed, directions].tolist()):
+            canvas.itemconfigure(item, **self.roadStyle(state))
+        self.drawnRoads[itemRows, itemCols] = roads
+
+    def covers(self) -> bool:
+        # whether the items created hold every visible lot
+        row0, row1, col0, col1 = self.window
+        visRow0, visRow1, visCol0, visCol1 = self.viewport.visibleLots()
+        return row0 <= visRow0 and visRow1 <= row1 and col0 <= visCol0 and visCol1 <= col1
+
+    def pan(self, dx: float, dy: float) -> None:
+        # items already created move along, new ones are only created once the view leaves them
+        dx, dy = self.viewport.pan(dx, dy)
+        if dx or dy:
+            self.master.canvas.move('all', dx, dy)
+            self.render()
+
+    def zoom(self, event: tk.Event, zoomIn: bool) -> None:
+        factor, (dx, dy) = self.viewport.zoom(Viewport.ZOOM_STEP if zoomIn else 1 / Viewport.ZOOM_STEP, (event.x, event.y))
+        if factor != 1: self.master.canvas.scale('all', event.x, event.y, factor, factor)
+        if dx or dy: self.master.canvas.move('all', dx, dy)
+        if factor != 1 or dx or dy:
+            self.render()
+            self.mouseMove(event)
+
+    def gridChanged(self, change: Change) -> None:
+        self.pending.merge(change)
+        self.infoStale = True
+
+    def roadStyle(self, state: int) -> dict:
+        return {
+            'fill': 'magenta' if state == Sec.FOCUSED else 'black',
+            'state': tk.NORMAL if state and self.master.showRoad.get() else tk.HIDDEN,
+            'tags': ('road',) if state else ('road', 'closed')
+        }
     
+    def gridPos(self, event: tk.Event) -> tuple:
+        # grid position under the mouse, which every brush and query takes
+        return self.viewport.toGrid((event.x, event.y))
+
     def mouseMove(self, event: tk.Event) -> None:
-        self.master.infoLabel.set(f'mouse at {event.x}, {event.y}')
+        # the readout waits for the next info tick instead of being built in the event handler
+        self.infoPos = self.gridPos(event)
+        self.scheduleInfo()
+        self.drawCircles(event)
+
+    def scheduleInfo(self) -> None:
+        self.infoStale = True
+        if self.infoJob is None: self.infoJob = self.master.canvas.after(View2d.INFO_TICK, self.infoTick)
+
+    def infoTick(self) -> None:
+        self.infoJob = None
+        self.showInfo()
+        # a road distance still being searched for goes on in the next tick
+        if self.infoStale: self.scheduleInfo()
+
+    def showInfo(self) -> None:
+        # info marks the readout stale again when it left the road distance unfinished
+        self.infoStale = False
+        if self.infoPos is not None: self.master.infoLabel.set(self.info(self.infoPos))
+        self.infoJob = None
+
+    def drawCircles(self, event: tk.Event) -> None:
         brushType = self.master.brushType.get()
         canvas = self.master.canvas
         if brushType < 0: return
         # plot the inner circle
         canvas.delete('innerCircle')
-        innerRadius = self.master.innerRadius.get() * self.master.LOT_SIZE
-        x, y = self.rightClickPos if brushType == self.master.BRUSH_TYPE_DRAG and self.rightClickPos else (event.x, event.y)
+        innerRadius = self.master.innerRadius.get() * self.master.grid.size * self.viewport.scale
+        x, y = self.viewport.toCanvas(self.rightClickPos) if brushType == self.master.BRUSH_TYPE_DRAG and self.rightClickPos else (event.x, event.y)
         canvas.create_oval(x - innerRadius, y - innerRadius, x + innerRadius, y + innerRadius, outline='#3583f7', width=3, dash=(3, 6), tags='innerCircle')
         # plot the outer circle
         canvas.delete('outerCircle')
         if brushType == self.master.BRUSH_TYPE_BREAK: return
-        outerRadius = self.master.outerRadius.get() * self.master.LOT_SIZE
+        outerRadius = self.master.outerRadius.get() * self.master.grid.size * self.viewport.scale
         x, y = (event.x, event.y)
         canvas.create_oval(x - outerRadius, y - outerRadius, x + outerRadius, y + outerRadius, outline='#3583f7', width=3, dash=(3, 9), tags='outerCircle')
     
+    @profiled('view2d.info')
+    def info(self, pos: tuple) -> str:
+        # mouse position, population under the brush and in the district, road networks and the road distance from the last right click
+        network, populationIndex = self.master.network, self.master.populationIndex
+        lines = [f'mouse at {pos[0]:.0f}, {pos[1]:.0f}']
+        brushType = self.master.brushType.get()
+        if brushType >= 0:
+            # the same regions the brush would change, around the same centers as the circles
+            innerRadius = self.master.innerRadius.get() * self.master.grid.size
+            outerRadius = self.master.outerRadius.get() * self.master.grid.size
+            dragging = brushType == self.master.BRUSH_TYPE_DRAG and self.rightClickPos
+            lines.append(self.readout('inner', populationIndex.regionSum(self.rightClickPos if dragging else pos, 0, innerRadius)))
+            if brushType != self.master.BRUSH_TYPE_BREAK:
+                outer = populationIndex.regionSum(pos, 0 if dragging else innerRadius, outerRadius)
+                if dragging:
+                    # the drag leaves the lots inside both circles out of its targets
+                    shared = populationIndex.overlapSum(self.rightClickPos, innerRadius, pos, outerRadius)
+                    outer = (outer[0] - shared[0], outer[1] - shared[1])
+                lines.append(self.readout('outer', outer))
+        if district := populationIndex.districtOf(pos):
+            lines.append(f'district population {populationIndex.rectSum(*district)}')
+        # the network is only labelled again by a query, which the right click starts
+        distance = None if self.routeStart is None else network.roadDistance(self.routeStart, pos, perf_counter() + View2d.INFO_BUDGET)
+        lines.append('road networks are counted on the next right click' if network.stale else f'{network.networks} road networks, {network.cutOff} lots cut off')
+        if distance == DistanceField.PENDING:
+            self.infoStale = True
+            lines.append('measuring the road distance from the right click')
+        elif self.routeStart is not None:
+            lines.append('no road route from the right click' if distance is None else f'{distance} roads from the right click')
+        return '\n'.join(lines)
+
+    def readout(self, name: str, region: tuple) -> str:
+        total, lots = region
+        return f'{name} population {total} in {lots} lots, mean {total / lots:.1f}' if lots else f'{name} region has no lots'
+
     def leftClick(self, event: tk.Event) -> None:
-        self.leftClickPos = (event.x, event.y)
+        # with no brush selected dragging pans the view
+        if self.master.brushType.get() < 0:
+            self.panPos = (event.x, event.y)
+            return
+        self.leftClickPos = self.gridPos(event)
+        self.applyBrush(self.leftClickPos, self.rightClickPos)
+        self.render()
+        self.rightClickPos = None
+        # keep painting along the path while the button is held
+        self.strokePos = self.strokeTarget = self.leftClickPos
+        if self.master.brushType.get() >= 0 and self.strokeJob is None:
+            self.strokeJob = self.master.canvas.after(View2d.STROKE_TICK, self.strokeTick)
+
+    def leftDrag(self, event: tk.Event) -> None:
+        if self.panPos is not None:
+            self.pan(event.x - self.panPos[0], event.y - self.panPos[1])
+            self.panPos = (event.x, event.y)
+            return
+        # motion events only move the target and the circles, the next tick paints up to wherever it is by then and updates the readout
+        self.drawCircles(event)
+        self.strokeTarget = self.infoPos = self.gridPos(event)
+        self.infoStale = True
+
+    def leftRelease(self, event: tk.Event) -> None:
+        if self.panPos is not None:
+            self.panPos = None
+            return
+        if self.strokeJob is not None:
+            self.master.canvas.after_cancel(self.strokeJob)
+            self.strokeJob = None
+            self.strokeTarget = self.infoPos = self.gridPos(event)
+            self.strokeStep()
+            self.showInfo()
+        # a whole stroke is one step of the history
+        self.master.history.commit()
+
+    def strokeTick(self) -> None:
+        self.strokeStep()
+        if self.infoStale: self.showInfo()
+        self.strokeJob = self.master.canvas.after(View2d.STROKE_TICK, self.strokeTick)
+
+    @profiled('view2d.strokeStep')
+    def strokeStep(self) -> None:
+        # stamp the brush along the path since the last stamp, all stamps of a tick share one consistency pass and one redraw
+        (x0, y0), (x1, y1) = self.strokePos, self.strokeTarget
+        spacing = max(self.master.innerRadius.get() * self.master.grid.size / 2, 1)
+        stamps = min(int(hypot(x1 - x0, y1 - y0) // spacing), View2d.STROKE_STAMPS)
+        if not stamps: return
+        with self.master.grid.batch():
+            for index in range(1, stamps + 1):
+                pos = (round(x0 + (x1 - x0) * index / stamps), round(y0 + (y1 - y0) * index / stamps))
+                self.applyBrush(pos, self.strokePos)
+                self.strokePos = pos
+        self.render()
+
+    def applyBrush(self, pos: tuple, fromPos: tuple) -> None:
+        # the brush at pos, drag moves population from fromPos to pos
         brushType = self.master.brushType.get()
         if brushType == self.master.BRUSH_TYPE_REPULSE:
             self.master.grid.repulseLots(
-                self.leftClickPos,
-                self.master.innerRadius.get() * self.master.LOT_SIZE,
-                self.master.outerRadius.get() * self.master.LOT_SIZE,
+                pos,
+                self.master.innerRadius.get() * self.master.grid.size,
+                self.master.outerRadius.get() * self.master.grid.size,
                 self.master.brushAmount.get()
             )
         elif brushType == self.master.BRUSH_TYPE_ATTRACT:
             self.master.grid.attractLots(
-                self.leftClickPos,
-                self.master.innerRadius.get() * self.master.LOT_SIZE,
-                self.master.outerRadius.get() * self.master.LOT_SIZE,
+                pos,
+                self.master.innerRadius.get() * self.master.grid.size,
+                self.master.outerRadius.get() * self.master.grid.size,
                 self.master.brushAmount.get()
             )
         elif brushType == self.master.BRUSH_TYPE_DRAG:
-            if self.rightClickPos:
+            if fromPos:
                 self.master.grid.dragLots(
-                    self.rightClickPos,
-                    self.leftClickPos,
-                    self.master.innerRadius.get() * self.master.LOT_SIZE,
-                    self.master.outerRadius.get() * self.master.LOT_SIZE,
+                    fromPos,
+                    pos,
+                    self.master.innerRadius.get() * self.master.grid.size,
+                    self.master.outerRadius.get() * self.master.grid.size,
                     self.master.brushAmount.get()
                 )
         elif brushType == self.master.BRUSH_TYPE_BREAK:
             self.master.grid.breakRoads(
-                self.leftClickPos,
-                self.master.innerRadius.get() * self.master.LOT_SIZE,
+                pos,
+                self.master.innerRadius.get() * self.master.grid.size,
                 self.roadBuffer
             )
         elif brushType == self.master.BRUSH_TYPE_CONNECT:
             self.master.grid.connectRoads(
-                self.leftClickPos,
-                self.master.innerRadius.get() * self.master.LOT_SIZE,
-                self.master.outerRadius.get() * self.master.LOT_SIZE,
+                pos,
+                self.master.innerRadius.get() * self.master.grid.size,
+                self.master.outerRadius.get() * self.master.grid.size,
                 self.roadBuffer
             )
         self.roadBuffer.clear()
-        self.render()
-        self.rightClickPos = None
 
     def rightClick(self, event: tk.Event) -> None:
-        self.rightClickPos = (event.x, event.y)
+        self.rightClickPos = self.routeStart = self.gridPos(event)
         brushType = self.master.brushType.get()
         if brushType in (self.master.BRUSH_TYPE_BREAK, self.master.BRUSH_TYPE_CONNECT):
             self.roadBuffer.extend(self.master.grid.markRoads(self.rightClickPos))
         else:
             lot = self.master.grid.getNearestLot(self.rightClickPos)
-            self.master.infoLabel.set(f'population of Lot{lot.info.id} is {lot.population}')
+            served = '' if self.master.network.lotServed(lot.info.id) else ', cut off from the roads'
+            self.master.infoLabel.set(f'population of Lot{lot.info.id} is {lot.population}{served}')
         self.render()
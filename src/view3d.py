@@ -1,10 +1,15 @@
 # 3d view
 
 from math import degrees
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import tkinter as tk
 
-from src.util import buildProjectionMat4, buildTranslationMat4, distance, flatten
+from src.lot import Lot
+from src.lod import LodPyramid, blockOrder
+from src.scene import COLORS, Camera, DepthOrder, MeshCache, cullSurfaces
+from src.util import distance
+from src.profiler import PROFILER, profiled
 
 class View3d(object):
 
@@ -13,80 +18,144 @@ class View3d(object):
     BOTTOM_LEN, TOP_LEN = 600, 1400
     LEFT_LEN, RIGHT_LEN = -520, 520
     VIEW_ANGLE = 5.58 # 320 degrees
+    RENDER_POLL = 10 # ms between checks for a prepared frame
 
     def __init__(self, master) -> None:
         self.master = master
         self.leftClickPos = None
         self.rightClickPos = None
+        self.meshCache = MeshCache()
+        self.depthOrder = DepthOrder()
+        self.pyramid = LodPyramid(self.master.grid)
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.generation = 0
+        self.mousePos = (0, 0)
+        self.drawn = self.culled = 0
+        self.blocks = None
     
     def activate(self) -> None:
         self.master.canvas.bind('<Motion>', self.mouseMove)
         self.master.canvas.bind('<Button-1>', self.leftButtonClick)
+        self.master.canvas.bind('<B1-Motion>', self.leftButtonDrag)
         self.master.canvas.bind('<ButtonRelease-1>', self.leftButtonRelease)
         self.master.canvas.bind('<Button-2>', lambda _:_)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'): self.master.canvas.bind(sequence, lambda _:_)
     
+    @profiled('view3d.render')
     def render(self) -> None:
+        if self.master.showAnimation.get():
+            self.renderAnimated()
+            return
+        # snapshot the surfaces here, then cull, project and sort them in the worker
+        self.generation += 1
+        surfaces, populations, owners, kinds, ranks = self.buildSurfaces(self.camera)
+        future = self.worker.submit(self.prepare, surfaces, populations, owners, kinds, ranks, self.camera, self.generation)
+        self.master.scheduler.cancel()
+        self.master.canvas.after(View3d.RENDER_POLL, self.drawFrame, future, self.generation)
+
+    @profiled('view3d.prepare')
+    def prepare(self, surfaces: np.ndarray, populations: np.ndarray, owners: np.ndarray, kinds: np.ndarray, ranks: np.ndarray, camera: Camera, generation: int) -> tuple:
+        # runs in the worker, a newer render makes this one stale
+        if generation != self.generation: return None
+        meshes = self.buildMeshes(surfaces, populations, owners, kinds, ranks, camera)
+        if generation != self.generation: return None
+        return (meshes, len(surfaces) - len(meshes))
+
+    def buildSurfaces(self, camera: Camera) -> tuple:
+        # every lot from the mesh cache, rebuilding only the changed ones, when all would be drawn at full detail,
+        # the blocks the pyramid picks for the camera otherwise, with their drawing ranks
+        showLot, showRoad = self.master.showLot.get(), self.master.showRoad.get()
+        picked = self.pyramid.select(camera)
+        self.blocks = None if picked is None else (sum(len(rows) for level, rows, _ in picked if level), sum(len(rows) for _, rows, _ in picked))
+        if picked is None: return self.meshCache.build(self.master.grid, showLot, showRoad) + (None,)
+        return self.pyramid.surfaces(picked, showLot, showRoad, camera)
+
+    def buildMeshes(self, surfaces: np.ndarray, populations: np.ndarray, owners: np.ndarray, kinds: np.ndarray, ranks: np.ndarray, camera: Camera) -> list:
+        # coords and population of the surfaces left after culling, back to front
+        kept, points, depths = cullSurfaces(surfaces, kinds, camera)
+        populations = populations[kept]
+        if ranks is None:
+            order = self.depthOrder.order(self.master.grid, owners[kept], kinds[kept], populations, depths, camera)
+        else:
+            order = blockOrder(owners[kept], kinds[kept], ranks)
+        return list(zip(points[order].reshape(-1, 8).tolist(), populations[order].tolist()))
+
+    def drawFrame(self, future: Future, generation: int) -> None:
+        # once prepared, draw the frame over the current one and drop the old items when it is complete
+        canvas = self.master.canvas
+        if generation != self.generation: return
+        if not future.done():
+            canvas.after(View3d.RENDER_POLL, self.drawFrame, future, generation)
+            return
+        prepared = future.result()
+        if prepared is None: return
+        meshes, culled = prepared
+        self.showStats(len(meshes), culled)
+        canvas.addtag_all('stale')
+        self.master.scheduler.start(meshes, lambda mesh: self.drawPolygon(*mesh), lambda: canvas.delete('stale'))
+
+    def cancel(self) -> None:
+        # forget any render in flight along with what it has drawn so far
+        self.generation += 1
+        self.master.canvas.delete('surface')
+
+    def drawPolygon(self, coords: list, population: int) -> None:
+        self.master.canvas.create_polygon(
+            *coords, fill=COLORS[population], width=1,
+            outline='black' if population < Lot.POPULATION_MAX * 0.618 else 'grey', tags='surface'
+        )
+        PROFILER.count('canvas.items')
+
+    @profiled('view3d.renderAnimated')
+    def renderAnimated(self) -> None:
         # prepare canvas
+        self.generation += 1
         canvas = self.master.canvas
         canvas.delete('all')
-        # calculate matrixes
-        switchYZ = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]])
-        trans = buildTranslationMat4(
-            -View3d.CANVAS_W // 2,
-            -View3d.TOP_LEN * 0.618,
-            -(View3d.NEAR_LEN + View3d.CANVAS_H))
-        project = buildProjectionMat4(
-            View3d.NEAR_LEN, View3d.FAR_LEN,
-            View3d.BOTTOM_LEN, View3d.TOP_LEN,
-            View3d.LEFT_LEN, View3d.RIGHT_LEN
-        )
-        # iterate lots
-        meshes = list()
-        for lot in flatten(self.master.grid.lots):
-            mesh = [[
-                project.dot(trans.dot(switchYZ.dot(v))) for v in surface
-            ] for surface in lot.mesh(
-                View3d.VIEW_ANGLE, (View3d.CANVAS_W // 2, View3d.CANVAS_H // 2),
-                self.master.showLot.get(), self.master.showRoad.get()
-            )]
-            # project back to canvas
-            meshes.extend([(
-                [(
-                    -x / w * (View3d.CANVAS_W // 2) + View3d.CANVAS_W // 2,
-                    y / w * (View3d.CANVAS_H // 2) + View3d.BOTTOM_LEN
-                ) for (x, y, _, w) in surface],
-                sum(z / w for (_, _, z, w) in surface) / len(surface),
-                lot.population, lot.color
-            ) for surface in mesh])
+        # fetch the surfaces and cull and transform them in one pass
+        surfaces, populations, owners, kinds, ranks = self.buildSurfaces(self.camera)
+        meshes = self.buildMeshes(surfaces, populations, owners, kinds, ranks, self.camera)
+        self.showStats(len(meshes), len(surfaces) - len(meshes))
         # render
-        def drawPolygon(v1: tuple, v2: tuple, v3: tuple, v4: tuple, population: int, color: str) -> None:
-            canvas.create_polygon(
-                *v1, *v2, *v3, *v4, fill=color, width=1,
-                outline='black' if population < lot.POPULATION_MAX * 0.618 else 'grey'
-            )
-        def renderJob() -> None:
-            if meshes:
-                (v1, v2, v3, v4), _, population, color = meshes.pop()
-                drawPolygon(v1, v2, v3, v4, population, color)
-                canvas.after(1, renderJob)
-            else:
-                canvas.after_cancel(job)
-        meshes.sort(key=lambda x: x[1], reverse=self.master.showAnimation.get())
-        if self.master.showAnimation.get():
-            job = canvas.after(1, renderJob)
-        else:
-            for (v1, v2, v3, v4), _, population, color in meshes:
-                drawPolygon(v1, v2, v3, v4, population, color)
+        self.master.scheduler.start(meshes, lambda mesh: self.drawPolygon(*mesh))
+
+    @property
+    def camera(self) -> Camera:
+        return Camera(
+            View3d.VIEW_ANGLE, View3d.NEAR_LEN, View3d.FAR_LEN,
+            View3d.BOTTOM_LEN, View3d.TOP_LEN, View3d.LEFT_LEN, View3d.RIGHT_LEN,
+            View3d.CANVAS_W, View3d.CANVAS_H
+        )
+
+    def showStats(self, drawn: int, culled: int) -> None:
+        self.drawn, self.culled = drawn, culled
+        PROFILER.count('view3d.culled', culled)
+        self.showInfo()
+
+    def showInfo(self) -> None:
+        x, y = self.mousePos
+        self.master.infoLabel.set(
+            f'mouse at {x}, {y}\nview angle is {degrees(View3d.VIEW_ANGLE):.2f}\n'
+            f'{self.drawn} surfaces drawn, {self.culled} culled' +
+            (f'\n{self.blocks[0]} distant blocks and {self.blocks[1] - self.blocks[0]} lots in detail' if self.blocks else '')
+        )
 
     def mouseMove(self, event: tk.Event) -> None:
-        self.master.infoLabel.set(f'mouse at {event.x}, {event.y}\nview angle is {degrees(View3d.VIEW_ANGLE):.2f}')
+        self.mousePos = (event.x, event.y)
+        self.showInfo()
     
     def leftButtonClick(self, event: tk.Event) -> None:
         self.leftClickPos = (event.x, event.y)
 
+    def leftButtonDrag(self, event: tk.Event) -> None:
+        # rotate while dragging, every move replaces the render still in flight
+        self.leftButtonRelease(event)
+
     def leftButtonRelease(self, event: tk.Event) -> None:
+        if self.leftClickPos is None or self.leftClickPos == (event.x, event.y): return
         prevX, prevY = self.leftClickPos
         currX, currY = event.x, event.y
+        self.leftClickPos = (currX, currY)
         # update view angle basing on horizontal distance
         absRadian = distance((prevX, 0), (currX, 0)) / (View3d.CANVAS_W // 2)
         signX = 1 if currX > prevX else -1
@@ -97,6 +166,7 @@ class View3d(object):
         View3d.NEAR_LEN = min(max(View3d.NEAR_LEN + 5 * signY * absDis, 1600), 8000)
         View3d.FAR_LEN = View3d.NEAR_LEN + max(View3d.CANVAS_W, View3d.CANVAS_H)
         # update info
-        self.master.infoLabel.set(f'mouse at {currX}, {currY}\nview angle is {degrees(View3d.VIEW_ANGLE):.2f}')
+        self.mousePos = (currX, currY)
+        self.showInfo()
         # rerender canvas
         self.render()
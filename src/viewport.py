@@ -0,0 +1,75 @@
+# viewport
+
+import numpy as np
+
+class Viewport(object):
+
+    ZOOM_STEP = 1.25
+    MAX_SCALE = 8
+    MAX_LOTS = 64 # most lots across the canvas when zoomed out, the items of more would take too long to create
+
+    # pan and zoom of the 2d view, grid positions (the unzoomed canvas pixels grid queries take) map to the canvas as
+    # canvas = (grid - origin) * scale
+    def __init__(self, grid, width: int, height: int) -> None:
+        self.grid = grid
+        self.width, self.height = width, height
+        self.reset()
+
+    def reset(self) -> None:
+        # the whole grid from the top left corner when it fits, as zoomed out as the item budget allows otherwise
+        self.scale = self.minScale
+        self.origin = (0.0, 0.0)
+
+    @property
+    def minScale(self) -> float:
+        rows, cols = self.grid.shape
+        size = self.grid.size
+        fit = min(self.width / (cols * size), self.height / (rows * size))
+        return min(1.0, max(fit, max(self.width, self.height) / (Viewport.MAX_LOTS * size)))
+
+    def toGrid(self, pos: tuple) -> tuple:
+        return (pos[0] / self.scale + self.origin[0], pos[1] / self.scale + self.origin[1])
+
+    def toCanvas(self, pos: tuple) -> tuple:
+        return ((pos[0] - self.origin[0]) * self.scale, (pos[1] - self.origin[1]) * self.scale)
+
+    def toCanvasRects(self, rects: np.ndarray) -> np.ndarray:
+        # rectangles (..., 4) of x0, y0, x1, y1 in grid positions
+        return (np.asarray(rects, dtype=float) - np.tile(self.origin, 2)) * self.scale
+
+    def visibleLots(self, margin: float=0) -> tuple:
+        # (row0, row1, col0, col1) of the lots overlapping the canvas grown by margin canvases on every side
+        rows, cols = self.grid.shape
+        baseX, baseY = self.grid.basePos
+        size = self.grid.size
+        (x0, y0), (x1, y1) = self.toGrid((-margin * self.width, -margin * self.height)), self.toGrid(((1 + margin) * self.width, (1 + margin) * self.height))
+        row0, row1 = int(np.floor((y0 - baseY) / size)), int(np.floor((y1 - baseY) / size)) + 1
+        col0, col1 = int(np.floor((x0 - baseX) / size)), int(np.floor((x1 - baseX) / size)) + 1
+        return (min(max(row0, 0), rows), min(max(row1, 0), rows), min(max(col0, 0), cols), min(max(col1, 0), cols))
+
+    def pan(self, dx: float, dy: float) -> tuple:
+        # move the view by canvas pixels, the center stays over the grid, returns how far it actually moved
+        originX, originY = self.origin
+        self.origin = (originX - dx / self.scale, originY - dy / self.scale)
+        self.clamp()
+        return ((originX - self.origin[0]) * self.scale, (originY - self.origin[1]) * self.scale)
+
+    def clamp(self) -> None:
+        # bring the center of the canvas back over the grid
+        rows, cols = self.grid.shape
+        baseX, baseY = self.grid.basePos
+        size = self.grid.size
+        halfW, halfH = self.width / 2 / self.scale, self.height / 2 / self.scale
+        self.origin = (
+            min(max(self.origin[0], baseX - halfW), baseX + cols * size - halfW),
+            min(max(self.origin[1], baseY - halfH), baseY + rows * size - halfH)
+        )
+
+    def zoom(self, factor: float, anchor: tuple) -> tuple:
+        # zoom around a canvas position, which keeps showing the same grid position unless zooming out would take the
+        # center off the grid, returns the factor applied and how far the view moved after it to keep the center over the grid
+        scale = min(max(self.scale * factor, self.minScale), Viewport.MAX_SCALE)
+        factor, (x, y) = scale / self.scale, self.toGrid(anchor)
+        self.scale = scale
+        self.origin = (x - anchor[0] / scale, y - anchor[1] / scale)
+        return (factor, self.pan(0, 0))